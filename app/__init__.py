@@ -4,19 +4,44 @@ from flask_migrate import Migrate
 from dotenv import load_dotenv
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
-from flask_socketio import SocketIO
 import os
+from app.utils.db_routing import RoutingSession
+from app.utils.socket_state import MeteredSocketIO
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 jwt = JWTManager()
-socketio = SocketIO(cors_allowed_origins="*", async_mode='eventlet', logger=True, engineio_logger=True)
+socketio = MeteredSocketIO(cors_allowed_origins="*", async_mode='eventlet')
 
 def create_app():
     load_dotenv()
     app = Flask(__name__)
     app.config.from_object('app.config.config.Config')
 
+    from app.utils.logging_config import configure_logging
+    configure_logging(app)
+
+    from app.utils.json_provider import init_json
+    init_json(app)
+
+    from app.utils.http_cache import init_compression
+    init_compression(app)
+
+    from app.utils.media_store import init_media
+    init_media(app)
+
+    from app.utils.static_delivery import init_static_delivery
+    init_static_delivery(app)
+
+    from app.utils.db_pool import init_db_pool
+    init_db_pool(app)
+
+    from app.utils.db_routing import init_db_routing
+    init_db_routing(app)
+
+    from app.utils.sql_metrics import init_sql_metrics
+    init_sql_metrics(app)
+
     # CORS for frontend origins
     CORS(app, origins=[
         "http://95.216.112.177:5555",
@@ -29,7 +54,11 @@ def create_app():
     db.init_app(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
-    socketio.init_app(app)
+    socketio.init_app(
+        app,
+        logger=app.config['SOCKETIO_LOGGER'],
+        engineio_logger=app.config['ENGINEIO_LOGGER']
+    )
 
     # Import models
     from app.models.user import User
@@ -41,12 +70,17 @@ def create_app():
     from app.models.transaction_paye import TransactionPaye
     from app.models.transaction_impaye import TransactionImpaye
     from app.models.visible_item import VisibleItem
+    from app.models.hidden_item import HiddenItem
     from app.models.historique import Historique
     from app.models.return_request import ReturnRequest
     from app.models.panier import Panier  # ✅ NEW
     from app.models.commande_boutique import CommandeBoutique   # ✅ NEW
     from app.models.gest_prix import GestPrix   # ✅ NEW table import
     from app.models.commande_produit import CommandeProduit   # ✅ NEW
+    from app.models.pending_count import PendingCount
+    from app.models.table_version import TableVersion
+    from app.models.media_file import MediaFile
+    from app.utils import produit_prices  # keeps Produit.min_prix / max_prix in sync
 
 
 
@@ -99,4 +133,7 @@ def create_app():
     app.register_blueprint(historique_bp, url_prefix='/api/historique')
     app.register_blueprint(statistics_bp, url_prefix='/api/statistics')
 
+    from app.utils.metrics import init_metrics
+    init_metrics(app)
+
     return app
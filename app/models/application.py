@@ -1,6 +1,7 @@
 
 # -*- coding: utf-8 -*-
 from .. import db
+from ..utils import media_store
 
 class Application(db.Model):
     __tablename__ = 'applications'
@@ -15,6 +16,7 @@ class Application(db.Model):
         return {
             "id": self.id,
             "logo": self.logo,
+            "logo_variants": media_store.variants(self.logo),
             "nom": self.nom,
             "lien": self.lien
         }
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from .. import db
+from ..utils import media_store
 from .boutique import Boutique
 
 class Article(db.Model):
@@ -22,6 +23,7 @@ class Article(db.Model):
         return {
             "id": self.id,
             "photo": self.photo,
+            "photo_variants": media_store.variants(self.photo),
             "boutique": self.boutique.nom if self.boutique else None,
             "nom": self.nom,
             "description": self.description,
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from .. import db
+from ..utils import media_store
 
 class Boutique(db.Model):
     __tablename__ = 'boutiques'
@@ -13,5 +14,6 @@ class Boutique(db.Model):
         return {
             "id": self.id,
             "photo": self.photo,
+            "photo_variants": media_store.variants(self.photo),
             "nom": self.nom
         }
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from .. import db
+from ..utils import media_store
 
 class Category(db.Model):
     __tablename__ = 'categories'
@@ -14,5 +15,6 @@ class Category(db.Model):
             "id": self.id,
             "nom": self.nom,
             "photo": self.photo,
+            "photo_variants": media_store.variants(self.photo),
             "etat": self.etat
         }
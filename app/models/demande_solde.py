@@ -12,6 +12,10 @@ class DemandeSolde(db.Model):
     etat = db.Column(db.Enum('en cours', 'annulé', 'confirmé'), default='en cours', nullable=False)
     preuve = db.Column(db.String(255), nullable=True)  # Path to the proof image (optional)
 
+    __table_args__ = (
+        db.Index('ix_demandes_solde_envoyee_par_etat_date', 'envoyee_par', 'etat', 'date_demande'),
+    )
+
     user = db.relationship('User', backref=db.backref('demandes_solde', lazy=True))
 
     def to_dict(self):
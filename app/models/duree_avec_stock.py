@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
+from sqlalchemy.orm import column_property
 from .. import db
 from .product import Produit
 from .stock import Stock
@@ -8,7 +9,8 @@ class DureeAvecStock(db.Model):
     __tablename__ = 'duree_avec_stock'
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    produit_id = db.Column(db.Integer, db.ForeignKey('produits.id'), nullable=False)
+    # active_history: moving a duree to another product keeps the old produit_id in the flush history
+    produit_id = column_property(db.Column(db.Integer, db.ForeignKey('produits.id'), nullable=False), active_history=True)
     duree = db.Column(db.String(50), nullable=False)
     
     moyenne = db.Column(db.Float, nullable=True)  # Weighted average
@@ -22,6 +24,10 @@ class DureeAvecStock(db.Model):
     note = db.Column(db.Text, nullable=True)
     date_ajout = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_duree_avec_stock_produit_duree', 'produit_id', 'duree'),
+    )
+
     produit = db.relationship('Produit', backref=db.backref('duree_avec_stock', lazy=True))
 
     def update_quantite(self):
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+from sqlalchemy.orm import column_property
 from .. import db
 from .product import Produit
 from datetime import datetime
@@ -7,7 +8,8 @@ class DureeSansStock(db.Model):
     __tablename__ = 'duree_sans_stock'
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    produit_id = db.Column(db.Integer, db.ForeignKey('produits.id'), nullable=False)
+    # active_history: moving a duree to another product keeps the old produit_id in the flush history
+    produit_id = column_property(db.Column(db.Integer, db.ForeignKey('produits.id'), nullable=False), active_history=True)
     duree = db.Column(db.String(50), nullable=False)  # VARCHAR instead of ENUM
     prix_1 = db.Column(db.Float, nullable=False)
     prix_2 = db.Column(db.Float, nullable=False)
@@ -1,9 +1,19 @@
 # -*- coding: utf-8 -*-
 from .. import db
 from datetime import datetime
+from sqlalchemy.orm import validates
+
+
+def normalize_key(s: str) -> str:
+    return (s or "").strip().lower()
+
 
 class GestPrix(db.Model):
     __tablename__ = 'gest_prix'
+    __table_args__ = (
+        # One snapshot per (produit, duree), whatever the case or spacing of the names
+        db.UniqueConstraint('produit_key', 'duree_key', name='uq_gest_prix_key'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
 
@@ -11,6 +21,10 @@ class GestPrix(db.Model):
     produit_name = db.Column(db.String(255), nullable=False)
     duree = db.Column(db.String(50), nullable=False)
 
+    # Normalized lookup keys, kept in sync with produit_name / duree
+    produit_key = db.Column(db.String(255), nullable=False)
+    duree_key = db.Column(db.String(50), nullable=False)
+
     # Prices
     prix_achat = db.Column(db.Float, nullable=False)   # set from prix_1 / prix_2 / prix_3
     prix_vente = db.Column(db.Float, nullable=False)   # input manually by admin
@@ -18,6 +32,20 @@ class GestPrix(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
+    @validates('produit_name')
+    def _set_produit_key(self, key, value):
+        self.produit_key = normalize_key(value)
+        return value
+
+    @validates('duree')
+    def _set_duree_key(self, key, value):
+        self.duree_key = normalize_key(value)
+        return value
+
+    @classmethod
+    def find(cls, produit_name, duree):
+        return cls.query.filter_by(produit_key=normalize_key(produit_name), duree_key=normalize_key(duree)).first()
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from .. import db
+from datetime import datetime
+from sqlalchemy import Enum
+from .visible_item import ItemType
+
+
+class HiddenItem(db.Model):
+    """
+    Catalog items are visible to every user by default; a row here hides one
+    item from one user.
+    """
+    __tablename__ = 'hidden_items'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'item_type', 'item_id', name='uq_hidden_items_user_item'),
+        db.Index('ix_hidden_items_item', 'item_type', 'item_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    item_id = db.Column(db.Integer, nullable=False)
+    item_type = db.Column(Enum(ItemType), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "item_id": self.item_id,
+            "item_type": self.item_type.value,
+            "created_at": self.created_at.strftime('%Y-%m-%d %H:%M:%S')
+        }
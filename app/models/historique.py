@@ -19,6 +19,11 @@ class Historique(db.Model):
 
     date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_historiques_user_date', 'user_id', 'date'),
+        db.Index('ix_historiques_date', 'date'),
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
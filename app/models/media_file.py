@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from .. import db
+from datetime import datetime
+
+
+class MediaFile(db.Model):
+    """
+    Processing state of a stored upload (app/utils/media_store.py), one row per content hash.
+    'pending' until a media worker has validated it and written its variants.
+    """
+    __tablename__ = 'media_files'
+
+    digest = db.Column(db.String(64), primary_key=True)
+    path = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.Enum('pending', 'ready', 'failed', name='media_status'), nullable=False, default='pending')
+    error = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (db.Index('ix_media_files_status', 'status'),)
+
+    def to_dict(self):
+        return {
+            "digest": self.digest,
+            "path": self.path,
+            "size": self.size,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None,
+            "processed_at": self.processed_at.strftime('%Y-%m-%d %H:%M:%S') if self.processed_at else None
+        }
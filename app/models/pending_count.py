@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from .. import db
+from datetime import datetime
+
+
+class PendingCount(db.Model):
+    """
+    Number of 'en cours' demandes waiting for an approver scope.
+    scope is 'managers' for admin requests, or 'admin:<id>' for the revendeurs of an admin.
+    """
+    __tablename__ = 'pending_counts'
+
+    scope = db.Column(db.String(32), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "scope": self.scope,
+            "count": self.count,
+            "updated_at": self.updated_at.strftime('%Y-%m-%d %H:%M:%S') if self.updated_at else None
+        }
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from .. import db
+from ..utils import media_store
 from .category import Category
 from .sous_category import SousCategory
 
@@ -20,6 +21,16 @@ class Produit(db.Model):
     affichage = db.Column(db.Integer, nullable=True)
     etat_commande = db.Column(db.Enum('instantané', 'sur commande'), nullable=False, default='instantané')
     add_status = db.Column(db.Enum('confirmé', 'annulé', 'en cours'), nullable=False, default='confirmé')
+    # Lowest / highest DureeAvecStock.prix_1, maintained by app/utils/produit_prices.py
+    min_prix = db.Column(db.Float, nullable=True)
+    max_prix = db.Column(db.Float, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_produits_sous_category_min_prix', 'sous_category_id', 'min_prix'),
+        db.Index('ix_produits_sous_category_max_prix', 'sous_category_id', 'max_prix'),
+        db.Index('ix_produits_min_prix', 'min_prix'),
+        db.Index('ix_produits_max_prix', 'max_prix'),
+    )
 
     category = db.relationship('Category', backref=db.backref('produits', lazy=True))
     sous_category = db.relationship('SousCategory', backref=db.backref('produits', lazy=True))
@@ -29,6 +40,7 @@ class Produit(db.Model):
         return {
             "id": self.id,
             "photo": self.photo,
+            "photo_variants": media_store.variants(self.photo),
             "name": self.name,
             "category_nom": self.category.nom if self.category else None,
             "sous_category_name": self.sous_category.name if self.sous_category else None,
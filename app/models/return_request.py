@@ -12,3 +12,7 @@ class ReturnRequest(db.Model):
     reviewed_by   = db.Column(db.Integer, db.ForeignKey("users.id"))
     reviewed_at   = db.Column(db.DateTime)
     created_at    = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_return_requests_historique_status_created', 'historique_id', 'status', 'created_at'),
+    )
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from .. import db
+from ..utils import media_store
 from .category import Category
 
 class SousCategory(db.Model):
@@ -18,6 +19,7 @@ class SousCategory(db.Model):
             "id": self.id,
             "name": self.name,
             "photo": self.photo,
+            "photo_variants": media_store.variants(self.photo),
             "category_name": self.category.nom if self.category else None,
             "etat": self.etat
         }
@@ -17,6 +17,10 @@ class Stock(db.Model):
     date_ajout = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     canceled_by = db.Column(db.String(100), nullable=True)  # New column
 
+    __table_args__ = (
+        db.Index('ix_stock_produit_duree', 'produit_id', 'duree'),
+    )
+
     produit = db.relationship('Produit', backref=db.backref('stock', lazy=True))
 
     def to_dict(self):
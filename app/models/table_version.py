@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from .. import db
+from datetime import datetime
+
+
+class TableVersion(db.Model):
+    """
+    Change counter of a table, bumped after every commit that writes to it.
+    Used to build the ETags of the catalog endpoints (app/utils/http_cache.py).
+    """
+    __tablename__ = 'table_versions'
+
+    table_name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "table_name": self.table_name,
+            "version": self.version,
+            "updated_at": self.updated_at.strftime('%Y-%m-%d %H:%M:%S') if self.updated_at else None
+        }
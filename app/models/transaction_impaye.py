@@ -13,6 +13,11 @@ class TransactionImpaye(db.Model):
     etat = db.Column(db.Enum('impaye', name='etat_impaye'), default='impaye', nullable=False)
     duree = db.Column(db.String(20), nullable=False)  # Added duree column, non-nullable
 
+    __table_args__ = (
+        db.Index('ix_transaction_impaye_recue_par_date', 'recue_par', 'date_transaction'),
+        db.Index('ix_transaction_impaye_envoyee_par_date', 'envoyee_par', 'date_transaction'),
+    )
+
     sender = db.relationship('User', foreign_keys=[envoyee_par], backref=db.backref('transactions_impaye_envoyees', lazy=True))
     receiver = db.relationship('User', foreign_keys=[recue_par], backref=db.backref('transactions_impaye_recues', lazy=True))
 
@@ -14,6 +14,11 @@ class TransactionPaye(db.Model):
     date_paiement = db.Column(db.DateTime, default=datetime.utcnow)
     etat = db.Column(db.Enum('paye', name='etat_paye'), default='paye', nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_transaction_paye_recue_par_date', 'recue_par', 'date_transaction'),
+        db.Index('ix_transaction_paye_envoyee_par_date', 'envoyee_par', 'date_transaction'),
+    )
+
     sender = db.relationship('User', foreign_keys=[envoyee_par], backref=db.backref('transactions_envoyees', lazy=True))
     receiver = db.relationship('User', foreign_keys=[recue_par], backref=db.backref('transactions_recues', lazy=True))
 
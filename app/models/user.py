@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from .. import db
 from werkzeug.security import generate_password_hash, check_password_hash
+from ..utils import green
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -24,13 +25,19 @@ class User(db.Model):
 
     responsable = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
 
+    __table_args__ = (
+        db.Index('ix_users_responsable_role', 'responsable', 'role'),
+        db.Index('ix_users_role', 'role'),
+    )
+
     responsable_user = db.relationship('User', remote_side=[id], backref=db.backref('subordinates', lazy=True))
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        # Hashing is CPU-bound: keep it off the event loop
+        self.password_hash = green.offload(generate_password_hash, password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return green.offload(check_password_hash, self.password_hash, password)
 
     def to_dict(self):
         return {
@@ -2,25 +2,16 @@
 import os
 from flask import Blueprint, request, jsonify, current_app
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import HTTPException
 from ..models.application import Application
-from ..models.user import User
-from ..models.visible_item import VisibleItem, ItemType
+from ..models.visible_item import ItemType
+from .visible_items import forget_catalog_item
+from ..utils import visibility_state, http_cache, media_store, socket_guard
 from .. import db
 from sqlalchemy.exc import SQLAlchemyError
 
 applications_bp = Blueprint('applications', __name__)
 
-def add_application_to_all_users_visible_items(application_id):
-    users = User.query.all()
-    for user in users:
-        visible_item = VisibleItem(
-            user_id=user.id,
-            item_id=application_id,
-            item_type=ItemType.application
-        )
-        db.session.add(visible_item)
-    db.session.commit()
-
 @applications_bp.route('/add_application', methods=['POST'])
 def add_application():
     """Create a new application with optional logo upload."""
@@ -32,38 +23,24 @@ def add_application():
         if not nom or not lien:
             return jsonify({"error": "Fields 'nom' and 'lien' are required"}), 400
 
-        clean_nom = nom.strip().lower().replace(" ", "_")
-        new_application = Application(nom=nom.strip(), lien=lien.strip())
+        # Stored before anything is written, so a rejected upload leaves no row behind
+        logo = media_store.save(logo_file) if logo_file and logo_file.filename else None
+        new_application = Application(nom=nom.strip(), lien=lien.strip(), logo=logo)
         db.session.add(new_application)
-        db.session.flush()  # Get the new application ID before commit
-
-        if logo_file and logo_file.filename:
-            folder = os.path.join(
-                current_app.root_path,
-                'static',
-                'applications_logos',
-                clean_nom
-            )
-            os.makedirs(folder, exist_ok=True)
-            filename = secure_filename(f"{new_application.id}.png")
-            save_path = os.path.join(folder, filename)
-
-            if os.path.exists(save_path):
-                os.remove(save_path)
-
-            logo_file.save(save_path)
-            new_application.logo = os.path.relpath(save_path, current_app.root_path)
-
         db.session.commit()
 
-        # Add the new application to all users' visible items
-        add_application_to_all_users_visible_items(new_application.id)
-        print(f"[SUCCESS] Added application {new_application.id} to all users' visible items")
+        # New catalog items are visible to everyone; clients refetch their visibility snapshot
+        visibility_state.reset()
+        socket_guard.invalidate('get_visible_items')
 
         return jsonify({
             "message": "Application added successfully",
             "application": new_application.to_dict()
         }), 201
+    except HTTPException:
+        # e.g. a rejected upload: the client gets its 413, not a 500
+        db.session.rollback()
+        raise
     except SQLAlchemyError as e:
         db.session.rollback()
         return jsonify({"error": "Database error", "details": str(e)}), 500
@@ -71,6 +48,7 @@ def add_application():
         return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
 
 @applications_bp.route('/get_applications', methods=['GET'])
+@http_cache.versioned(Application)
 def get_all_applications():
     """
     Retrieve applications with optional pagination, filtering, and search.
@@ -149,32 +127,23 @@ def update_application(id):
         lien = request.form.get('lien', application.lien)
         logo_file = request.files.get('logo')
 
-        clean_nom = nom.strip().lower().replace(" ", "_")
         application.nom = nom.strip()
         application.lien = lien.strip()
 
         if logo_file and logo_file.filename:
-            folder = os.path.join(
-                current_app.root_path,
-                'static',
-                'applications_logos',
-                clean_nom
-            )
-            os.makedirs(folder, exist_ok=True)
-            filename = secure_filename(f"{application.id}.png")
-            save_path = os.path.join(folder, filename)
-
-            if os.path.exists(save_path):
-                os.remove(save_path)
-
-            logo_file.save(save_path)
-            application.logo = os.path.relpath(save_path, current_app.root_path)
+            application.logo = media_store.save(logo_file)
 
         db.session.commit()
+        visibility_state.reset()
+        socket_guard.invalidate('get_visible_items')
         return jsonify({
             "message": "Application updated successfully",
             "application": application.to_dict()
         }), 200
+    except HTTPException:
+        # e.g. a rejected upload: the client gets its 413, not a 500
+        db.session.rollback()
+        raise
     except SQLAlchemyError as e:
         db.session.rollback()
         return jsonify({"error": "Database error", "details": str(e)}), 500
@@ -189,17 +158,14 @@ def delete_application(id):
         if not application:
             return jsonify({"message": "Application not found"}), 404
 
-        # Delete associated logo if it exists
-        if application.logo:
-            logo_path = os.path.join(current_app.root_path, application.logo)
-            if os.path.isfile(logo_path):
-                try:
-                    os.remove(logo_path)
-                except Exception as e:
-                    print(f"[WARNING] Failed to delete logo: {e}")
+        # Stored images can be shared by several rows; `flask media gc` removes unreferenced ones
+
+        forget_catalog_item(ItemType.application, application.id)
 
         db.session.delete(application)
         db.session.commit()
+        visibility_state.reset()
+        socket_guard.invalidate('get_visible_items')
         return jsonify({"message": "Application deleted successfully"}), 200
     except SQLAlchemyError as e:
         db.session.rollback()
@@ -5,9 +5,11 @@ from werkzeug.utils import secure_filename
 from .. import db
 from ..models.article import Article
 from ..models.boutique import Boutique
+from ..utils import loading_profiles, http_cache, media_store
 articles_bp = Blueprint('articles', __name__, url_prefix='/articles')
 
 @articles_bp.route('/get_articles', methods=['GET'])
+@http_cache.versioned(Article, Boutique)
 def get_all_articles():
     """
     Retrieve paginated articles, sorted by ID descending,
@@ -19,7 +21,7 @@ def get_all_articles():
         per_page = request.args.get('per_page', type=int, default=20)
         etat = request.args.get('etat', type=str, default="").strip().lower()
 
-        query = Article.query
+        query = Article.query.options(*loading_profiles.load('article'))
 
         # Apply etat filter
         if etat in ['actif', 'inactif']:
@@ -67,7 +69,7 @@ def get_articles_by_category(boutique_id):
         etat = request.args.get('etat', type=str, default="").strip().lower()
 
         # Base query filtering by Article.boutique_id
-        query = Article.query.filter(Article.boutique_id == boutique_id)
+        query = Article.query.options(*loading_profiles.load('article')).filter(Article.boutique_id == boutique_id)
 
         # Apply etat filter
         if etat in ['actif', 'inactif']:
@@ -133,27 +135,10 @@ def add_article():
         prix_3=prix_3,
         etat=etat
     )
-    db.session.add(new_article)
-    db.session.flush()  # Get new_article.id before saving file
-
+    # Stored before anything is written, so a rejected upload leaves no row behind
     if photo_file and photo_file.filename:
-        folder = os.path.join(
-            current_app.root_path,
-            'static',
-            'articles_images',
-            nom.lower().replace(" ", "_")
-        )
-        os.makedirs(folder, exist_ok=True)
-
-        filename = f"{new_article.id}.png"
-        save_path = os.path.join(folder, filename)
-
-        if os.path.exists(save_path):
-            os.remove(save_path)
-
-        photo_file.save(save_path)
-        new_article.photo = os.path.relpath(save_path, current_app.root_path)
-
+        new_article.photo = media_store.save(photo_file)
+    db.session.add(new_article)
     db.session.commit()
     return jsonify(new_article.to_dict()), 201
 
@@ -187,22 +172,7 @@ def update_article(article_id):
     article.etat = etat
 
     if photo_file and photo_file.filename:
-        folder = os.path.join(
-            current_app.root_path,
-            'static',
-            'articles_images',
-            nom.lower().replace(" ", "_")
-        )
-        os.makedirs(folder, exist_ok=True)
-
-        filename = f"{article.id}.png"
-        save_path = os.path.join(folder, filename)
-
-        if os.path.exists(save_path):
-            os.remove(save_path)
-
-        photo_file.save(save_path)
-        article.photo = os.path.relpath(save_path, current_app.root_path)
+        article.photo = media_store.save(photo_file)
 
     db.session.commit()
     return jsonify(article.to_dict()), 200
@@ -3,24 +3,15 @@ from flask import Blueprint, jsonify, request, current_app
 from werkzeug.utils import secure_filename
 from .. import db
 from ..models.boutique import Boutique
-from ..models.user import User
-from ..models.visible_item import VisibleItem, ItemType
+from ..models.visible_item import ItemType
+from .visible_items import forget_catalog_item
+from ..utils import visibility_state, http_cache, media_store, socket_guard
 import os
 
 boutiques_bp = Blueprint('boutiques', __name__, url_prefix='/boutiques')
 
-def add_boutique_to_all_users_visible_items(boutique_id):
-    users = User.query.all()
-    for user in users:
-        visible_item = VisibleItem(
-            user_id=user.id,
-            item_id=boutique_id,
-            item_type=ItemType.boutique
-        )
-        db.session.add(visible_item)
-    db.session.commit()
-
 @boutiques_bp.route('/get_boutiques', methods=['GET'])
+@http_cache.versioned(Boutique)
 def get_all_boutiques():
     """
     Retrieve boutiques, sorted by ID descending, with optional filtering, search, and pagination.
@@ -92,35 +83,16 @@ def add_boutique():
     if Boutique.query.filter_by(nom=nom).first():
         return jsonify({"error": "Boutique with this name already exists"}), 400
 
+    # Stored before anything is written, so a rejected upload leaves no row behind
     new_boutique = Boutique(nom=nom)
-    db.session.add(new_boutique)
-    db.session.flush()  # Get new_boutique.id before commit
-
-    # Save photo if provided
     if photo_file and photo_file.filename:
-        folder = os.path.join(
-            current_app.root_path,
-            'static',
-            'boutiques_images',
-            nom.lower().replace(" ", "_")
-        )
-        os.makedirs(folder, exist_ok=True)
-
-        filename = f"{new_boutique.id}.png"
-        save_path = os.path.join(folder, filename)
-
-        if os.path.exists(save_path):
-            os.remove(save_path)
-
-        photo_file.save(save_path)
-        relative_path = os.path.relpath(save_path, current_app.root_path)
-        new_boutique.photo = relative_path
-
+        new_boutique.photo = media_store.save(photo_file)
+    db.session.add(new_boutique)
     db.session.commit()
 
-    # Add the new boutique to all users' visible items
-    add_boutique_to_all_users_visible_items(new_boutique.id)
-    print(f"[SUCCESS] Added boutique {new_boutique.id} to all users' visible items")
+    # New catalog items are visible to everyone; clients refetch their visibility snapshot
+    visibility_state.reset()
+    socket_guard.invalidate('get_visible_items')
 
     return jsonify(new_boutique.to_dict()), 201
 
@@ -136,24 +108,11 @@ def update_boutique(boutique_id):
     boutique.nom = nom
 
     if photo_file and photo_file.filename:
-        folder = os.path.join(
-            current_app.root_path,
-            'static',
-            'boutiques_images',
-            nom.lower().replace(" ", "_")
-        )
-        os.makedirs(folder, exist_ok=True)
-
-        filename = f"{boutique.id}.png"
-        save_path = os.path.join(folder, filename)
-
-        if os.path.exists(save_path):
-            os.remove(save_path)
-
-        photo_file.save(save_path)
-        boutique.photo = os.path.relpath(save_path, current_app.root_path)
+        boutique.photo = media_store.save(photo_file)
 
     db.session.commit()
+    visibility_state.reset()
+    socket_guard.invalidate('get_visible_items')
     return jsonify(boutique.to_dict()), 200
 
 @boutiques_bp.route('/delete_boutique/<int:boutique_id>', methods=['DELETE'])
@@ -163,7 +122,11 @@ def delete_boutique(boutique_id):
     if not boutique:
         return jsonify({"error": f"Boutique with id {boutique_id} not found"}), 404
 
+    forget_catalog_item(ItemType.boutique, boutique.id)
+
     db.session.delete(boutique)
     db.session.commit()
+    visibility_state.reset()
+    socket_guard.invalidate('get_visible_items')
 
     return jsonify({"message": f"Boutique with id {boutique_id} has been deleted"}), 200
\ No newline at end of file
@@ -1,27 +1,20 @@
 # -*- coding: utf-8 -*-
 from flask import Blueprint, request, jsonify, current_app
 from ..models.category import Category
-from ..models.user import User
-from ..models.visible_item import VisibleItem, ItemType
+from ..models.visible_item import ItemType
+from .visible_items import forget_catalog_item
+from ..utils import visibility_state, serializers, http_cache, media_store, socket_guard
 from .. import db
 from werkzeug.utils import secure_filename
 from datetime import datetime
 import os 
+import logging
 from ..models.product import Produit  # make sure this import is correct
 
 
-categories_bp = Blueprint('categories', __name__)
+logger = logging.getLogger(__name__)
 
-def add_category_to_all_users_visible_items(category_id):
-    users = User.query.all()
-    for user in users:
-        visible_item = VisibleItem(
-            user_id=user.id,
-            item_id=category_id,
-            item_type=ItemType.category
-        )
-        db.session.add(visible_item)
-    db.session.commit()
+categories_bp = Blueprint('categories', __name__)
 
 @categories_bp.route('/add_category', methods=['POST'])
 def add_category():
@@ -29,50 +22,28 @@ def add_category():
     etat = request.form.get('etat', 'actif')
     photo_file = request.files.get('photo')
 
-    print(f"[DEBUG] Received nom: {nom}")
-    print(f"[DEBUG] Received etat: {etat}")
-    print(f"[DEBUG] Received file: {photo_file.filename if photo_file else 'No file'}")
+    logger.debug("Received nom: %s", nom)
+    logger.debug("Received etat: %s", etat)
+    logger.debug("Received file: %s", photo_file.filename if photo_file else 'No file')
 
     if not nom:
-        print("[ERROR] No category name provided.")
+        logger.warning("No category name provided.")
         return jsonify({"error": "Category name is required"}), 400
 
-    # Create category to get ID first
-    new_category = Category(nom=nom, etat=etat)
-    db.session.add(new_category)
-    db.session.flush()  # Retrieve ID before commit
-    print(f"[DEBUG] Created new category with temporary ID: {new_category.id}")
-
+    # Stored before anything is written, so a rejected upload leaves no row behind
     img_path = None
     if photo_file and photo_file.filename:
-        folder = os.path.join(
-            current_app.root_path,
-            'static',
-            'categories_images',
-            nom.lower().replace(" ", "_")
-        )
-        print(f"[DEBUG] Saving image to folder: {folder}")
-        os.makedirs(folder, exist_ok=True)
-
-        filename = f"{new_category.id}.png"
-        save_path = os.path.join(folder, filename)
-        print(f"[DEBUG] Final save path: {save_path}")
-
-        if os.path.exists(save_path):
-            print(f"[INFO] Existing file found. Removing: {save_path}")
-            os.remove(save_path)
-
-        photo_file.save(save_path)
-        img_path = os.path.relpath(save_path, current_app.root_path)
-        print(f"[DEBUG] Image saved at: {img_path}")
-
-    new_category.photo = img_path
+        img_path = media_store.save(photo_file)
+        logger.debug("Image saved at: %s", img_path)
+
+    new_category = Category(nom=nom, etat=etat, photo=img_path)
+    db.session.add(new_category)
     db.session.commit()
-    print(f"[SUCCESS] Category added and committed with ID: {new_category.id}")
+    logger.debug("Category added and committed with ID: %s", new_category.id)
 
-    # Add the new category to all users' visible items
-    add_category_to_all_users_visible_items(new_category.id)
-    print(f"[SUCCESS] Added category {new_category.id} to all users' visible items")
+    # New catalog items are visible to everyone; clients refetch their visibility snapshot
+    visibility_state.reset()
+    socket_guard.invalidate('get_visible_items')
 
     return jsonify({
         "message": "Category added successfully",
@@ -81,6 +52,7 @@ def add_category():
 
 
 @categories_bp.route('/get_category', methods=['GET'])
+@http_cache.versioned(Category)
 def get_all_categories():
     """
     Retrieve categories, sorted by ID descending, with optional pagination, filtering, and search.
@@ -108,10 +80,10 @@ def get_all_categories():
 
         # If no pagination parameters are provided, return all results
         if page is None and limit is None:
-            categories = query.order_by(Category.id.desc()).all()
+            categories = serializers.CATEGORY.fetch(query.order_by(Category.id.desc()))
             return jsonify({
                 "total": len(categories),
-                "categories": [category.to_dict() for category in categories]
+                "categories": categories
             }), 200
 
         # Apply pagination if parameters are provided
@@ -151,24 +123,11 @@ def update_category(id):
     category.etat = etat
 
     if photo_file and photo_file.filename:
-        folder = os.path.join(
-            current_app.root_path,
-            'static',
-            'categories_images',
-            nom.lower().replace(" ", "_")
-        )
-        os.makedirs(folder, exist_ok=True)
-
-        filename = f"{category.id}.png"
-        save_path = os.path.join(folder, filename)
-
-        if os.path.exists(save_path):
-            os.remove(save_path)
-
-        photo_file.save(save_path)
-        category.photo = os.path.relpath(save_path, current_app.root_path)
+        category.photo = media_store.save(photo_file)
 
     db.session.commit()
+    visibility_state.reset()
+    socket_guard.invalidate('get_visible_items')
     return jsonify({"message": "Category updated successfully", "category": category.to_dict()}), 200
 
 
@@ -177,38 +136,25 @@ def update_category(id):
 
 @categories_bp.route('/delete_category/<int:id>', methods=['DELETE'])
 def delete_category(id):
-    print(f"[DEBUG] Attempting to delete category with ID: {id}")
+    logger.debug("Attempting to delete category with ID: %s", id)
 
     category = Category.query.get(id)
     if not category:
-        print(f"[ERROR] Category with ID {id} not found.")
+        logger.warning("Category with ID %s not found.", id)
         return jsonify({"message": "Category not found"}), 404
 
-    # Delete associated image if it exists
-    if category.photo:
-        photo_path = os.path.join(current_app.root_path, category.photo)
-        print(f"[DEBUG] Attempting to delete image at: {photo_path}")
-        if os.path.isfile(photo_path):
-            try:
-                os.remove(photo_path)
-                print(f"[SUCCESS] Image deleted: {photo_path}")
-            except Exception as e:
-                print(f"[WARNING] Failed to delete image: {e}")
-        else:
-            print(f"[INFO] Image file not found at: {photo_path}")
-    else:
-        print("[INFO] No image associated with this category.")
+    # Stored images can be shared by several rows; `flask media gc` removes unreferenced ones
 
     # Delete all products associated with the category
     try:
         products = Produit.query.filter_by(category_id=id).all()
-        print(f"[DEBUG] Found {len(products)} products with category_id {id}")
+        logger.debug("Found %s products with category_id %s", len(products), id)
         for product in products:
             db.session.delete(product)
-        print(f"[SUCCESS] Deleted {len(products)} products associated with category_id {id}")
+        logger.debug("Deleted %s products associated with category_id %s", len(products), id)
     except Exception as e:
         db.session.rollback()
-        print(f"[ERROR] Failed to delete products: {e}")
+        logger.error("Failed to delete products: %s", e)
         return jsonify({
             "error": "Failed to delete associated products",
             "details": str(e)
@@ -216,13 +162,16 @@ def delete_category(id):
 
     # Delete the category
     try:
+        forget_catalog_item(ItemType.category, category.id)
         db.session.delete(category)
         db.session.commit()
-        print(f"[SUCCESS] Category with ID {id} deleted from database.")
+        visibility_state.reset()
+        socket_guard.invalidate('get_visible_items')
+        logger.debug("Category with ID %s deleted from database.", id)
         return jsonify({"message": "Category deleted successfully"}), 200
     except Exception as e:
         db.session.rollback()
-        print(f"[ERROR] Failed to delete category from DB: {e}")
+        logger.error("Failed to delete category from DB: %s", e)
         return jsonify({
             "error": "Failed to delete category",
             "details": str(e)
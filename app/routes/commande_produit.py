@@ -13,6 +13,7 @@ from ..models.commande_produit import (
 from ..models.product import Produit
 from ..models.user import User
 from ..models.duree_sans_stock import DureeSansStock
+from ..utils import loading_profiles
 import uuid
 
 commande_produit_bp = Blueprint('commande_produit', __name__, url_prefix='/commande_produit')
@@ -178,7 +179,7 @@ def my_commandes():
         produit_id = request.args.get('produit_id', type=int)
         etat = request.args.get('etat')
 
-        q = CommandeProduit.query.filter_by(user_id=user_id)
+        q = CommandeProduit.query.options(*loading_profiles.load('commande_produit')).filter_by(user_id=user_id)
 
         if produit_id:
             q = q.filter(CommandeProduit.produit_id == produit_id)
@@ -236,7 +237,7 @@ def get_all_commandes():
         produit_id = request.args.get('produit_id', type=int)
         etat = request.args.get('etat')
 
-        q = CommandeProduit.query
+        q = CommandeProduit.query.options(*loading_profiles.load('commande_produit'))
 
         if produit_id:
             q = q.filter(CommandeProduit.produit_id == produit_id)
@@ -6,6 +6,7 @@ from .. import db
 from ..models.commande_boutique import CommandeBoutique, CommandeEtat, CommandePaiement
 from ..models.article import Article
 from ..models.user import User
+from ..utils import loading_profiles
 import uuid
 
 commandes_bp = Blueprint('commandes', __name__, url_prefix='/commandes')
@@ -71,7 +72,7 @@ def my_commandes():
         article_id = request.args.get('article_id', type=int, default=None)
 
         # Base query filtering by user_id
-        query = CommandeBoutique.query.filter_by(user_id=user_id)
+        query = CommandeBoutique.query.options(*loading_profiles.load('commande_boutique')).filter_by(user_id=user_id)
 
         # Apply article_id filter
         if article_id is not None:
@@ -131,7 +132,7 @@ def get_all_commandes():
         article_id = request.args.get('article_id', type=int, default=None)
 
         # Base query
-        query = CommandeBoutique.query
+        query = CommandeBoutique.query.options(*loading_profiles.load('commande_boutique'))
 
         # Apply article_id filter
         if article_id is not None:
@@ -9,6 +9,8 @@ from app.models.demande_solde import DemandeSolde
 from app.models.transaction_paye import TransactionPaye
 from app.models.transaction_impaye import TransactionImpaye
 from app.utils.socket_state import connected_users
+from app.utils import pending_counters, socket_guard, media_store, metrics
+from sqlalchemy.orm import contains_eager
 
 demande_solde_bp = Blueprint('demande_solde', __name__, url_prefix='/demande_solde')
 
@@ -31,16 +33,19 @@ def handle_disconnect():
     if user_id:
         del connected_users[user_id]
         print(f"User {user_id} disconnected")
+    socket_guard.forget_connection(request.sid)
 
 @socketio.on("get_en_cours_count")
+@socket_guard.guarded("get_en_cours_count", key=lambda data: str(data.get("user_id")))
 def socket_get_en_cours_count(data):
     user_id = data.get("user_id")
     user = User.query.get(user_id)
     if user:
         count = get_en_cours_count(user)
-        socketio.emit("en_cours_count", {"user_id": user_id, "count": count}, room=request.sid)
+        return [("en_cours_count", {"user_id": user_id, "count": count})]
 
 @socketio.on("get_weekly_confirmed_and_cancelled")
+@socket_guard.guarded("get_weekly_confirmed_and_cancelled", key=lambda data: str(data.get("user_id")))
 def socket_get_weekly_updates(data):
     user_id = data.get("user_id")
     user = User.query.get(user_id)
@@ -58,25 +63,10 @@ def socket_get_weekly_updates(data):
     confirmed = [d.to_dict() for d in demandes if d.etat == "confirmé"]
     cancelled = [d.to_dict() for d in demandes if d.etat == "annulé"]
 
-    socketio.emit(
-        "weekly_confirmed_and_cancelled",
-        {"user_id": user_id, "confirmed": confirmed, "cancelled": cancelled},
-        room=request.sid
-    )
+    return [("weekly_confirmed_and_cancelled", {"user_id": user_id, "confirmed": confirmed, "cancelled": cancelled})]
 
 def get_en_cours_count(user):
-    if user.role in ["manager", "admin_boss"]:
-        return DemandeSolde.query.join(User).filter(
-            User.role == "admin",
-            DemandeSolde.etat == "en cours"
-        ).count()
-    elif user.role == "admin":
-        return DemandeSolde.query.join(User).filter(
-            User.role == "revendeur",
-            User.responsable == user.id,
-            DemandeSolde.etat == "en cours"
-        ).count()
-    return 0
+    return pending_counters.get_count(user)
 
 def emit_user_updated(user, exclude_user_id=None):
     """Helper function to emit user_updated event to relevant users."""
@@ -92,6 +82,7 @@ def emit_user_updated(user, exclude_user_id=None):
         'etat': user.etat,
         'responsable': user.responsable
     }
+    socket_guard.invalidate('get_user_data', str(user.id))
 
     sid = connected_users.get(str(user.id))
     if sid:
@@ -130,20 +121,14 @@ def create_demande_solde():
     if user.role == "revendeur" and montant < 150.0:
         return jsonify({"error": "Revendeurs must request at least 150.0"}), 400
 
-    new_request = DemandeSolde(envoyee_par=user.id, montant=montant)
+    # Stored before anything is written, so a rejected upload leaves no row behind
+    preuve = media_store.save(photo_file) if photo_file and photo_file.filename else None
+    new_request = DemandeSolde(envoyee_par=user.id, montant=montant, preuve=preuve)
     db.session.add(new_request)
-    db.session.flush()
-
-    if photo_file and photo_file.filename:
-        folder = os.path.join(current_app.root_path, 'static', 'demande_solde', 'preuves')
-        os.makedirs(folder, exist_ok=True)
-        ext = os.path.splitext(photo_file.filename)[1] or '.png'
-        filename = f"{new_request.id}{ext}"
-        save_path = os.path.join(folder, filename)
-        photo_file.save(save_path)
-        new_request.preuve = os.path.relpath(save_path, current_app.root_path)
 
+    pending_counters.adjust(user, 1)
     db.session.commit()
+    socket_guard.invalidate("get_en_cours_count")
 
     managers = User.query.filter_by(role='manager').all()
     for manager in managers:
@@ -201,6 +186,7 @@ def get_all_demandes():
         query = DemandeSolde.query.join(User).filter(User.responsable == user.id)
     else:
         return jsonify({"error": "Unauthorized access"}), 403
+    query = query.options(contains_eager(DemandeSolde.user))
 
     if search_query:
         query = query.filter(
@@ -254,6 +240,9 @@ def update_demande(demande_id):
     if approver.role == "admin" and etat == "confirmé" and demande.montant > approver.solde:
         return jsonify({"error": "Insufficient solde"}), 400
 
+    if demande.etat == "en cours":
+        pending_counters.adjust(requester, -1)
+
     demande.etat = etat
     demande.date_traitement = datetime.utcnow()
     demande.traitee_par = approver.id
@@ -284,7 +273,12 @@ def update_demande(demande_id):
         print(f"Database commit failed for demande {demande_id}: {str(e)}")
         return jsonify({"error": "Database error occurred"}), 500
 
+    socket_guard.invalidate("get_en_cours_count")
+    socket_guard.invalidate("get_weekly_confirmed_and_cancelled", str(requester.id))
+
     if etat == "confirmé":
+        metrics.count('topups')
+        metrics.count('topup_amount', float(demande.montant))
         db.session.refresh(requester)
         if approver.role == "admin":
             db.session.refresh(approver)
@@ -1,11 +1,13 @@
 # -*- coding: utf-8 -*-
 from flask import Blueprint, jsonify, request
 from .. import db
+from ..utils import db_routing
 from ..models.duree_avec_stock import DureeAvecStock
 from ..models.stock import Stock
 from ..models.product import Produit
 from sqlalchemy import func
 from sqlalchemy import func, cast, String, or_
+from sqlalchemy.orm import contains_eager
 
 duree_avec_stock_bp = Blueprint('duree_avec_stock', __name__)
 
@@ -88,7 +90,9 @@ def get_all_duree_avec_stock():
         etat = request.args.get('etat', type=str, default="").strip().lower()
 
         # Start with base query, joining Produit for produit_name
-        query = DureeAvecStock.query.join(Produit, DureeAvecStock.produit_id == Produit.id)
+        query = DureeAvecStock.query.join(Produit, DureeAvecStock.produit_id == Produit.id).options(
+            contains_eager(DureeAvecStock.produit)
+        )
 
         # Apply search across all fields
         if search_query:
@@ -211,6 +215,7 @@ def recalculate_all_moyenne():
 
 # ===================== GET FILTER OPTIONS ===================== #
 @duree_avec_stock_bp.route('/get_filter_options', methods=['GET'])
+@db_routing.read_replica
 def get_filter_options():
     try:
         # Fetch unique produit names with IDs
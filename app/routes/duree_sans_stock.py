@@ -1,10 +1,12 @@
 # -*- coding: utf-8 -*-
 from flask import Blueprint, jsonify, request
 from .. import db
+from ..utils import db_routing
 from ..models.duree_sans_stock import DureeSansStock
 from ..models.product import Produit
 from datetime import datetime
 from sqlalchemy import func, cast, String, or_
+from sqlalchemy.orm import contains_eager
 
 duree_sans_stock_bp = Blueprint('duree_sans_stock', __name__)
 
@@ -20,7 +22,9 @@ def get_all_duree_sans_stock():
         etat = request.args.get('etat', type=str, default="").strip().lower()
         fournisseur = request.args.get('fournisseur', type=str, default="").strip().lower()
 
-        query = DureeSansStock.query.join(Produit, DureeSansStock.produit_id == Produit.id)
+        query = DureeSansStock.query.join(Produit, DureeSansStock.produit_id == Produit.id).options(
+            contains_eager(DureeSansStock.produit)
+        )
 
         if search_query:
             query = query.filter(
@@ -148,6 +152,7 @@ def delete_duree_sans_stock(record_id):
     return jsonify({"message": f"Record with id {record_id} has been deleted"}), 200
 
 @duree_sans_stock_bp.route('/get_filter_options', methods=['GET'])
+@db_routing.read_replica
 def get_filter_options():
     """Fetch unique produit names with IDs, duree, and fournisseur values for filtering."""
     try:
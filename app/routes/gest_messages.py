@@ -1,17 +1,17 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import HTTPException
 import os
 from .. import db
 from ..models.gest_message import GestMessage
 from ..models.user import User
 from app import socketio
 from app.utils.socket_state import connected_users
+from app.utils import media_store
 from sqlalchemy import or_
 import logging
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 gest_message_bp = Blueprint('gest_message', __name__, url_prefix='/api/gest_message')
@@ -27,11 +27,11 @@ def emit_message_update(message, event_type):
                 sid = connected_users.get(str(target_user.id))
                 if sid:
                     socketio.emit(event_type, payload, room=sid)
-                    logger.debug(f"Emitted {event_type} to user {target_user.id} for message {message.id}")
+                    logger.debug("Emitted %s to user %s for message %s", event_type, target_user.id, message.id)
                 else:
-                    logger.debug(f"No socket connection for user {target_user.id} for message {message.id}")
+                    logger.debug("No socket connection for user %s for message %s", target_user.id, message.id)
     except Exception as e:
-        logger.error(f"Error emitting {event_type} for message {message.id}: {str(e)}")
+        logger.error("Error emitting %s for message %s: %s", event_type, message.id, e)
 
 # ===================== ADD MESSAGE ===================== #
 @gest_message_bp.route('/add', methods=['POST'])
@@ -42,7 +42,7 @@ def add_message():
         user = User.query.get(current_user_id)
 
         if not user or user.role not in ["manager", "admin_boss"]:
-            logger.warning(f"Access denied for user_id={current_user_id}, role={user.role if user else 'None'}")
+            logger.warning("Access denied for user_id=%s, role=%s", current_user_id, user.role if user else 'None')
             return jsonify({"error": "Only managers can add messages."}), 403
 
         text = request.form.get('text')
@@ -52,30 +52,24 @@ def add_message():
         if not text or to not in ['admin', 'revendeur', 'all']:
             return jsonify({"error": "Missing 'text' or invalid 'to' value."}), 400
 
-        new_msg = GestMessage(text=text, to=to, etat=etat)
-        db.session.add(new_msg)
-        db.session.flush()  # Get new_msg.id before saving files
-
-        folder = os.path.join(current_app.root_path, 'static', 'messages')
-        os.makedirs(folder, exist_ok=True)
-
+        # Stored before anything is written, so a rejected upload leaves no row behind
         img_file = request.files.get('img')
-        if img_file and img_file.filename:
-            filename = f"{new_msg.id}.png"
-            save_path = os.path.join(folder, filename)
-            if os.path.exists(save_path):
-                os.remove(save_path)
-            img_file.save(save_path)
-            new_msg.img_path = os.path.relpath(save_path, current_app.root_path)
+        img_path = media_store.save(img_file) if img_file and img_file.filename else None
 
+        new_msg = GestMessage(text=text, to=to, etat=etat, img_path=img_path)
+        db.session.add(new_msg)
         db.session.commit()
 
         # Emit new message to relevant users
         emit_message_update(new_msg, 'new_message')
 
         return jsonify(new_msg.to_dict()), 201
+    except HTTPException:
+        # e.g. a rejected upload: the client gets its 413, not a 500
+        db.session.rollback()
+        raise
     except Exception as e:
-        logger.error(f"Error in add_message: {str(e)}")
+        logger.error("Error in add_message: %s", e)
         db.session.rollback()
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
@@ -89,27 +83,19 @@ def update_message(id):
         msg = GestMessage.query.get(id)
 
         if not user or user.role not in ["manager", "admin_boss"]:
-            logger.warning(f"Access denied for user_id={current_user_id}, role={user.role if user else 'None'}")
+            logger.warning("Access denied for user_id=%s, role=%s", current_user_id, user.role if user else 'None')
             return jsonify({"error": "Only managers can update messages."}), 403
         if not msg:
-            logger.warning(f"Message not found: id={id}")
+            logger.warning("Message not found: id=%s", id)
             return jsonify({"error": "Message not found"}), 404
 
         msg.text = request.form.get('text', msg.text)
         msg.to = request.form.get('to', msg.to)
         msg.etat = request.form.get('etat', msg.etat)
 
-        folder = os.path.join(current_app.root_path, 'static', 'messages')
-        os.makedirs(folder, exist_ok=True)
-
         img_file = request.files.get('img')
         if img_file and img_file.filename:
-            filename = f"{msg.id}.png"
-            save_path = os.path.join(folder, filename)
-            if os.path.exists(save_path):
-                os.remove(save_path)
-            img_file.save(save_path)
-            msg.img_path = os.path.relpath(save_path, current_app.root_path)
+            msg.img_path = media_store.save(img_file)
 
         db.session.commit()
 
@@ -117,8 +103,12 @@ def update_message(id):
         emit_message_update(msg, 'message_updated')
 
         return jsonify(msg.to_dict()), 200
+    except HTTPException:
+        # e.g. a rejected upload: the client gets its 413, not a 500
+        db.session.rollback()
+        raise
     except Exception as e:
-        logger.error(f"Error in update_message: {str(e)}")
+        logger.error("Error in update_message: %s", e)
         db.session.rollback()
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
@@ -132,15 +122,15 @@ def delete_message(id):
         msg = GestMessage.query.get(id)
 
         if not user or user.role not in ["manager", "admin_boss"]:
-            logger.warning(f"Access denied for user_id={current_user_id}, role={user.role if user else 'None'}")
+            logger.warning("Access denied for user_id=%s, role=%s", current_user_id, user.role if user else 'None')
             return jsonify({"error": "Only managers can delete messages."}), 403
         if not msg:
-            logger.warning(f"Message not found: id={id}")
+            logger.warning("Message not found: id=%s", id)
             return jsonify({"error": "Message not found"}), 404
 
-        # Remove associated files if present
+        # Remove associated files if present; stored images are shared and left to `flask media gc`
         for path in [msg.img_path, msg.video_path, msg.file_path]:
-            if path and os.path.exists(path):
+            if path and not media_store.is_media_path(path) and os.path.exists(path):
                 os.remove(path)
 
         # Emit deletion event to relevant users
@@ -152,14 +142,14 @@ def delete_message(id):
                 sid = connected_users.get(str(target_user.id))
                 if sid:
                     socketio.emit("message_deleted", payload, room=sid)
-                    logger.debug(f"Emitted message_deleted to user {target_user.id} for message {msg.id}")
+                    logger.debug("Emitted message_deleted to user %s for message %s", target_user.id, msg.id)
 
         db.session.delete(msg)
         db.session.commit()
 
         return jsonify({"message": "Message deleted successfully ✅"}), 200
     except Exception as e:
-        logger.error(f"Error in delete_message: {str(e)}")
+        logger.error("Error in delete_message: %s", e)
         db.session.rollback()
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
@@ -172,7 +162,7 @@ def get_all_messages_unfiltered():
         user = User.query.get(current_user_id)
 
         if not user or user.role not in ["manager", "admin_boss"]:
-            logger.warning(f"Access denied for user_id={current_user_id}, role={user.role if user else 'None'}")
+            logger.warning("Access denied for user_id=%s, role=%s", current_user_id, user.role if user else 'None')
             return jsonify({"error": "Only managers can view all messages."}), 403
 
         page = request.args.get('page', 1, type=int)
@@ -199,7 +189,7 @@ def get_all_messages_unfiltered():
             'total_pages': pagination.pages
         }), 200
     except Exception as e:
-        logger.error(f"Error in get_all_messages_unfiltered: {str(e)}")
+        logger.error("Error in get_all_messages_unfiltered: %s", e)
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
 # ===================== GET ONE MESSAGE ===================== #
@@ -212,16 +202,16 @@ def get_message(id):
         msg = GestMessage.query.get(id)
 
         if not msg:
-            logger.warning(f"Message not found: id={id}")
+            logger.warning("Message not found: id=%s", id)
             return jsonify({"error": "Message not found"}), 404
 
         if msg.etat != 'afficher' or (msg.to != user.role and msg.to != 'all'):
-            logger.warning(f"Access denied for user_id={current_user_id} to view message {id}")
+            logger.warning("Access denied for user_id=%s to view message %s", current_user_id, id)
             return jsonify({"error": "You are not allowed to view this message"}), 403
 
         return jsonify(msg.to_dict()), 200
     except Exception as e:
-        logger.error(f"Error in get_message: {str(e)}")
+        logger.error("Error in get_message: %s", e)
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
 # ===================== GET Admin Messages ===================== #
@@ -233,7 +223,7 @@ def get_admin_messages():
         user = User.query.get(current_user_id)
 
         if not user or user.role != "admin":
-            logger.warning(f"Access denied for user_id={current_user_id}, role={user.role if user else 'None'}")
+            logger.warning("Access denied for user_id=%s, role=%s", current_user_id, user.role if user else 'None')
             return jsonify({"error": "Access restricted to admins only."}), 403
 
         page = request.args.get('page', 1, type=int)
@@ -259,7 +249,7 @@ def get_admin_messages():
             'total_pages': pagination.pages
         }), 200
     except Exception as e:
-        logger.error(f"Error in get_admin_messages: {str(e)}")
+        logger.error("Error in get_admin_messages: %s", e)
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
 # ===================== GET Revendeur Messages ===================== #
@@ -271,7 +261,7 @@ def get_revendeur_messages():
         user = User.query.get(current_user_id)
 
         if not user or user.role != "revendeur":
-            logger.warning(f"Access denied for user_id={current_user_id}, role={user.role if user else 'None'}")
+            logger.warning("Access denied for user_id=%s, role=%s", current_user_id, user.role if user else 'None')
             return jsonify({"error": "Access restricted to revendeurs only."}), 403
 
         page = request.args.get('page', 1, type=int)
@@ -297,5 +287,5 @@ def get_revendeur_messages():
             'total_pages': pagination.pages
         }), 200
     except Exception as e:
-        logger.error(f"Error in get_revendeur_messages: {str(e)}")
+        logger.error("Error in get_revendeur_messages: %s", e)
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
\ No newline at end of file
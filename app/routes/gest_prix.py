@@ -1,14 +1,17 @@
 # routes/gest_prix.py
 # -*- coding: utf-8 -*-
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from sqlalchemy import func
+from datetime import datetime
+from sqlalchemy import func, case
+from sqlalchemy.dialects.mysql import insert
 from .. import db
 from ..models.user import User
-from ..models.gest_prix import GestPrix
+from ..models.gest_prix import GestPrix, normalize_key
 from ..models.duree_avec_stock import DureeAvecStock
 from ..models.duree_sans_stock import DureeSansStock
 from ..models.product import Produit
+from ..utils import jobs
 
 gest_prix_bp = Blueprint('gest_prix', __name__)
 
@@ -31,6 +34,33 @@ def prix_achat_for_niveau(row_with_prices, niveau: str) -> float:
 def normalize_duree(s: str) -> str:
     return (s or "").strip().lower()
 
+# Rows per INSERT statement in upsert_gest_prix
+UPSERT_CHUNK_SIZE = 1000
+
+def upsert_gest_prix(rows):
+    """
+    Insert or update GestPrix snapshots with INSERT ... ON DUPLICATE KEY UPDATE
+    on the (produit_key, duree_key) unique index, in chunks.
+    rows: dicts with produit_name, duree, prix_achat, prix_vente.
+    """
+    now = datetime.utcnow()
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        stmt = insert(GestPrix).values([{
+            "produit_name": r["produit_name"],
+            "duree": r["duree"],
+            "produit_key": normalize_key(r["produit_name"]),
+            "duree_key": normalize_key(r["duree"]),
+            "prix_achat": r["prix_achat"],
+            "prix_vente": r["prix_vente"],
+            "created_at": now,
+            "updated_at": now
+        } for r in rows[start:start + UPSERT_CHUNK_SIZE]])
+        db.session.execute(stmt.on_duplicate_key_update(
+            prix_achat=stmt.inserted.prix_achat,
+            prix_vente=stmt.inserted.prix_vente,
+            updated_at=stmt.inserted.updated_at
+        ))
+
 def _find_in_avec_stock_by_name_and_duree(produit_name: str, duree: str):
     pn = (produit_name or "").strip()
     d = normalize_duree(duree)
@@ -70,50 +100,78 @@ def find_any_by_name_and_duree(produit_name: str, duree: str):
         return "sans", row
     return None, None
 
-def _collect_rows(etat_filter: str, search: str):
+def price_column_for_niveau(model, niveau: str):
+    """SQL counterpart of prix_achat_for_niveau: the prix_N column of `model` for this niveau."""
+    n = (niveau or 'niveau1').lower()
+    if n == 'niveau2':
+        return model.prix_2
+    if n == 'niveau3':
+        return model.prix_3
+    return model.prix_1
+
+def _preview_branch(model, source_rank: int, etat_filter: str, search: str, niveau: str):
     """
-    Collect (produit_name, duree, source, row_obj) from both tables, applying etat and search.
-    source: "avec" or "sans"
+    SELECT produit_name, duree, prix_achat for one duree table joined to Produit,
+    with etat and search applied. source_rank keeps DureeAvecStock rows before DureeSansStock.
     """
-    # Base queries
-    q_avec = db.session.query(DureeAvecStock, Produit.name).join(
-        Produit, DureeAvecStock.produit_id == Produit.id
-    )
-    q_sans = db.session.query(DureeSansStock, Produit.name).join(
-        Produit, DureeSansStock.produit_id == Produit.id
+    q = (
+        db.select(
+            Produit.name.label('produit_name'),
+            model.duree.label('duree'),
+            price_column_for_niveau(model, niveau).label('prix_achat'),
+            db.literal(source_rank).label('source_rank'),
+            model.id.label('row_id'),
+        )
+        .join(Produit, model.produit_id == Produit.id)
     )
-
     if etat_filter:
-        q_avec = q_avec.filter(DureeAvecStock.etat == etat_filter)
-        q_sans = q_sans.filter(DureeSansStock.etat == etat_filter)
-
+        q = q.where(model.etat == etat_filter)
     if search:
         like = f"%{search}%"
-        q_avec = q_avec.filter(
-            db.or_(
-                func.lower(Produit.name).like(like),
-                func.lower(DureeAvecStock.duree).like(like),
-            )
-        )
-        q_sans = q_sans.filter(
-            db.or_(
-                func.lower(Produit.name).like(like),
-                func.lower(DureeSansStock.duree).like(like),
-            )
-        )
+        q = q.where(db.or_(
+            func.lower(Produit.name).like(like),
+            func.lower(model.duree).like(like),
+        ))
+    return q
 
-    # Order newest first by id (independently) then merge
-    q_avec = q_avec.order_by(DureeAvecStock.id.desc())
-    q_sans = q_sans.order_by(DureeSansStock.id.desc())
-
-    rows = []
-    for das, pname in q_avec.all():
-        rows.append((pname, das.duree, "avec", das))
-    for dss, pname in q_sans.all():
-        rows.append((pname, dss.duree, "sans", dss))
+def _preview_page(etat_filter: str, search: str, niveau: str, page: int, per_page: int):
+    """
+    One page of the preview and the total, computed in the database.
 
-    # Final combined order: just keep as appended (already desc inside each)
-    return rows
+    Rows are ordered DureeAvecStock first, then DureeSansStock, newest first in each.
+    Every UNION ALL branch is cut to offset + per_page rows before the merge, so the
+    work grows with the page position, not with the catalog; GestPrix is left-joined
+    on its normalized keys for the rows of the page only.
+    """
+    offset = (page - 1) * per_page
+    branches = [
+        _preview_branch(DureeAvecStock, 0, etat_filter, search, niveau),
+        _preview_branch(DureeSansStock, 1, etat_filter, search, niveau),
+    ]
+
+    counts = [db.select(func.count()).select_from(b.subquery()).scalar_subquery() for b in branches]
+    total = db.session.execute(db.select(counts[0] + counts[1])).scalar() or 0
+
+    merged = db.union_all(*[
+        db.select(b.order_by(db.desc('row_id')).limit(offset + per_page).subquery())
+        for b in branches
+    ]).subquery()
+    page_rows = (
+        db.select(merged)
+        .order_by(merged.c.source_rank, merged.c.row_id.desc())
+        .limit(per_page)
+        .offset(offset)
+        .subquery()
+    )
+    rows = db.session.execute(
+        db.select(page_rows.c.produit_name, page_rows.c.duree, page_rows.c.prix_achat, GestPrix.prix_vente)
+        .outerjoin(GestPrix, db.and_(
+            GestPrix.produit_key == func.lower(func.trim(page_rows.c.produit_name)),
+            GestPrix.duree_key == func.lower(func.trim(page_rows.c.duree)),
+        ))
+        .order_by(page_rows.c.source_rank, page_rows.c.row_id.desc())
+    ).all()
+    return rows, total
 
 # ----------------- Endpoints -----------------
 
@@ -143,29 +201,16 @@ def preview_all_from_das():
     page = request.args.get('page', type=int, default=1)
     per_page = request.args.get('per_page', type=int, default=20)
 
-    rows = _collect_rows(etat_filter=etat, search=search)
-
-    # Map existing GestPrix by (produit_name_lower, duree_lower)
-    gp_rows = GestPrix.query.all()
-    gp_map = {(gp.produit_name.strip().lower(), normalize_duree(gp.duree)): gp for gp in gp_rows}
-
-    items = []
-    for produit_name, duree, _source, row in rows:
-        key = (produit_name.strip().lower() if produit_name else "", normalize_duree(duree))
-        prix_achat = prix_achat_for_niveau(row, user.niveau)
-        prix_vente = gp_map.get(key).prix_vente if key in gp_map else None
-        items.append({
-            "produit_name": produit_name,
-            "duree": duree,
-            "prix_achat": prix_achat,
-            "prix_vente": prix_vente
-        })
-
-    # Manual pagination over merged list
-    total = len(items)
-    start = (page - 1) * per_page
-    end = start + per_page
-    paged_items = items[start:end]
+    page = max(page, 1)
+    per_page = max(per_page, 1)
+    rows, total = _preview_page(etat, search, user.niveau, page, per_page)
+
+    paged_items = [{
+        "produit_name": produit_name,
+        "duree": duree,
+        "prix_achat": float(prix_achat),
+        "prix_vente": prix_vente
+    } for produit_name, duree, prix_achat, prix_vente in rows]
 
     return jsonify({
         "page": page,
@@ -210,27 +255,14 @@ def set_price():
 
     prix_achat = prix_achat_for_niveau(row, user.niveau)
 
-    key = (produit_name.strip().lower(), normalize_duree(duree))
-    gp = (
-        GestPrix.query
-        .filter(func.lower(func.trim(GestPrix.produit_name)) == key[0],
-                func.lower(func.trim(GestPrix.duree)) == key[1])
-        .first()
-    )
-
-    if gp:
-        gp.prix_achat = prix_achat
-        gp.prix_vente = float(prix_vente)
-    else:
-        gp = GestPrix(
-            produit_name=produit_name,
-            duree=duree,
-            prix_achat=prix_achat,
-            prix_vente=float(prix_vente)
-        )
-        db.session.add(gp)
-
+    upsert_gest_prix([{
+        "produit_name": produit_name,
+        "duree": duree,
+        "prix_achat": prix_achat,
+        "prix_vente": float(prix_vente)
+    }])
     db.session.commit()
+    gp = GestPrix.find(produit_name, duree)
 
     return jsonify({
         "message": "Prix de vente enregistré.",
@@ -238,6 +270,89 @@ def set_price():
     }), 200
 
 
+def _sync_source(model, niveau: str, default_margin: float, id_from: int, id_to: int):
+    """Active rows of one duree table in [id_from, id_to), shaped as gest_prix columns."""
+    prix_achat = price_column_for_niveau(model, niveau)
+    now = datetime.utcnow()
+    return (
+        db.select(
+            Produit.name.label('produit_name'),
+            model.duree.label('duree'),
+            func.lower(func.trim(Produit.name)).label('produit_key'),
+            func.lower(func.trim(model.duree)).label('duree_key'),
+            prix_achat.label('prix_achat'),
+            (prix_achat + default_margin).label('prix_vente'),
+            db.literal(now).label('created_at'),
+            db.literal(now).label('updated_at'),
+        )
+        .join(Produit, model.produit_id == Produit.id)
+        .where(model.etat == 'actif', model.id >= id_from, model.id < id_to)
+    )
+
+def sync_gest_prix(niveau: str, default_margin: float, progress=None):
+    """
+    Set-based sync: one INSERT ... SELECT ... ON DUPLICATE KEY UPDATE per chunk of
+    GEST_PRIX_SYNC_CHUNK_ROWS ids of each duree table, committed chunk by chunk.
+    DureeSansStock goes first so DureeAvecStock wins when both have the same key.
+    Existing rows keep their prix_vente; only prix_achat (and then updated_at) changes.
+    Returns (created, updated).
+    """
+    chunk = current_app.config.get('GEST_PRIX_SYNC_CHUNK_ROWS', 5000)
+    models = (DureeSansStock, DureeAvecStock)
+    bounds = {
+        model: db.session.query(func.min(model.id), func.max(model.id), func.count(model.id))
+        .filter(model.etat == 'actif').one()
+        for model in models
+    }
+    total = sum(count for _, _, count in bounds.values())
+    count_before = db.session.query(func.count(GestPrix.id)).scalar()
+
+    done, updated = 0, 0
+    for model in models:
+        low, high, _ = bounds[model]
+        if low is None:
+            continue
+        for id_from in range(low, high + 1, chunk):
+            source = _sync_source(model, niveau, default_margin, id_from, id_from + chunk).subquery()
+            updated += db.session.execute(
+                db.select(func.count())
+                .select_from(source)
+                .join(GestPrix, db.and_(
+                    GestPrix.produit_key == source.c.produit_key,
+                    GestPrix.duree_key == source.c.duree_key,
+                ))
+                .where(GestPrix.prix_achat != source.c.prix_achat)
+            ).scalar() or 0
+
+            columns = ['produit_name', 'duree', 'produit_key', 'duree_key',
+                       'prix_achat', 'prix_vente', 'created_at', 'updated_at']
+            stmt = insert(GestPrix).from_select(
+                columns, _sync_source(model, niveau, default_margin, id_from, id_from + chunk)
+            )
+            stmt = stmt.on_duplicate_key_update([
+                # MySQL applies assignments left to right: compare before prix_achat is overwritten
+                ("updated_at", case(
+                    (GestPrix.prix_achat != stmt.inserted.prix_achat, stmt.inserted.updated_at),
+                    else_=GestPrix.updated_at
+                )),
+                ("prix_achat", stmt.inserted.prix_achat),
+            ])
+            db.session.execute(stmt)
+            db.session.commit()
+
+            done = min(total, done + db.session.query(func.count(model.id)).filter(
+                model.etat == 'actif', model.id >= id_from, model.id < id_from + chunk
+            ).scalar())
+            if progress:
+                progress(done, total)
+
+    created = db.session.query(func.count(GestPrix.id)).scalar() - count_before
+    return created, updated
+
+def _sync_job(job, niveau, default_margin):
+    created, updated = sync_gest_prix(niveau, default_margin, progress=job.progress)
+    return {"created": created, "updated": updated}
+
 @gest_prix_bp.route('/sync_all', methods=['POST'])
 @jwt_required()
 def sync_all():
@@ -249,6 +364,8 @@ def sync_all():
     Since prix_vente is NOT NULL, we need a default. You can pass:
       - default_margin: float (optional, default=5), used as prix_vente = prix_achat + default_margin
     Existing rows are left untouched except prix_achat will be refreshed for the current admin's niveau.
+    Catalogs above GEST_PRIX_SYNC_BACKGROUND_ROWS rows are synced in a background job:
+    the response is 202 with the job, follow it with GET /jobs/<job_id> or the 'job_updated' socket event.
     """
     user_id = get_jwt_identity()
     user = User.query.get(user_id)
@@ -258,70 +375,34 @@ def sync_all():
     payload = request.get_json() or {}
     default_margin = float(payload.get("default_margin", 5))
 
-    # Load all active rows from both tables with product names
-    avec_list = (
-        db.session.query(DureeAvecStock, Produit.name)
-        .join(Produit, DureeAvecStock.produit_id == Produit.id)
-        .filter(DureeAvecStock.etat == 'actif')
-        .all()
-    )
-    sans_list = (
-        db.session.query(DureeSansStock, Produit.name)
-        .join(Produit, DureeSansStock.produit_id == Produit.id)
-        .filter(DureeSansStock.etat == 'actif')
-        .all()
+    rows = sum(
+        db.session.query(func.count(model.id)).filter(model.etat == 'actif').scalar()
+        for model in (DureeAvecStock, DureeSansStock)
     )
+    if rows > current_app.config.get('GEST_PRIX_SYNC_BACKGROUND_ROWS', 5000):
+        job = jobs.start('gest_prix_sync', user.id, _sync_job, user.niveau, default_margin)
+        return jsonify({"message": "Sync started", "job": job.to_dict()}), 202
 
-    # Build map of existing GP rows
-    gp_rows = GestPrix.query.all()
-    gp_map = {(gp.produit_name.strip().lower(), normalize_duree(gp.duree)): gp for gp in gp_rows}
+    created, updated = sync_gest_prix(user.niveau, default_margin)
+    return jsonify({"message": "Sync completed", "created": created, "updated": updated}), 200
 
-    created, updated = 0, 0
 
-    # Upsert for DureeAvecStock
-    for row, pname in avec_list:
-        if not pname:
-            continue
-        key = (pname.strip().lower(), normalize_duree(row.duree))
-        prix_achat = prix_achat_for_niveau(row, user.niveau)
-        if key in gp_map:
-            gp = gp_map[key]
-            if gp.prix_achat != prix_achat:
-                gp.prix_achat = prix_achat
-                updated += 1
-        else:
-            gp = GestPrix(
-                produit_name=pname,
-                duree=row.duree,
-                prix_achat=prix_achat,
-                prix_vente=prix_achat + default_margin
-            )
-            db.session.add(gp)
-            created += 1
-
-    # Upsert for DureeSansStock
-    for row, pname in sans_list:
-        if not pname:
-            continue
-        key = (pname.strip().lower(), normalize_duree(row.duree))
-        prix_achat = prix_achat_for_niveau(row, user.niveau)
-        if key in gp_map:
-            gp = gp_map[key]
-            if gp.prix_achat != prix_achat:
-                gp.prix_achat = prix_achat
-                updated += 1
-        else:
-            gp = GestPrix(
-                produit_name=pname,
-                duree=row.duree,
-                prix_achat=prix_achat,
-                prix_vente=prix_achat + default_margin
-            )
-            db.session.add(gp)
-            created += 1
+@gest_prix_bp.route('/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    """
+    ADMIN-ONLY
+    Status and progress of a background sync started by the caller.
+    """
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    if not require_admin(user):
+        return jsonify({"error": "Access denied. Admin only."}), 403
 
-    db.session.commit()
-    return jsonify({"message": "Sync completed", "created": created, "updated": updated}), 200
+    job = jobs.get(job_id)
+    if not job or job.owner_id != user.id:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict()), 200
 
 
 @gest_prix_bp.route('/delete/<int:row_id>', methods=['DELETE'])
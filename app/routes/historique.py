@@ -10,16 +10,30 @@ from ..models.duree_avec_stock import DureeAvecStock
 from ..models.historique import Historique
 from ..models.return_request import ReturnRequest
 from ..routes.users import emit_user_updated
+from ..utils import exports, serializers, db_routing, metrics
 from sqlalchemy.sql import func
+from sqlalchemy.orm import contains_eager
 # NEW: use GestPrix for revendeur pricing
 from ..models.gest_prix import GestPrix
 
 historique_bp = Blueprint('historique', __name__, url_prefix='/api/historique')
 
-# --- helpers for pricing ---
-def _normalize(s: str) -> str:
-    return (s or "").strip().lower()
+def _latest_return_requests(historique_ids):
+    """Latest ReturnRequest of each historique id, in one query: {historique_id: ReturnRequest}."""
+    if not historique_ids:
+        return {}
+    latest = {}
+    rows = (
+        ReturnRequest.query
+        .filter(ReturnRequest.historique_id.in_(historique_ids))
+        .order_by(ReturnRequest.created_at.asc(), ReturnRequest.id.asc())
+        .all()
+    )
+    for rr in rows:
+        latest[rr.historique_id] = rr
+    return latest
 
+# --- helpers for pricing ---
 def _prix_achat_for_admin_niveau(das: DureeAvecStock, admin: User) -> float:
     niveau = (admin.niveau or 'niveau1').lower()
     if niveau == 'niveau2':
@@ -89,15 +103,8 @@ def acheter_produit():
 
         # Try GestPrix by (produit_name, duree) defined by the responsible admin.
         # NOTE: GestPrix rows are global snapshots keyed by produit_name + duree in your design,
-        # so we just match by name+duree (case-insensitive).
-        key_prod = _normalize(produit.name)
-        key_dur = _normalize(duree)
-        gp = (
-            GestPrix.query
-            .filter(func.lower(func.trim(GestPrix.produit_name)) == key_prod)
-            .filter(func.lower(func.trim(GestPrix.duree)) == key_dur)
-            .first()
-        )
+        # so we just match by name+duree (case-insensitive, on the indexed normalized keys).
+        gp = GestPrix.find(produit.name, duree)
 
         if gp and gp.prix_vente and float(gp.prix_vente) > 0:
             prix_unitaire = float(gp.prix_vente)
@@ -138,6 +145,9 @@ def acheter_produit():
         )
         db.session.add(historique)
         db.session.commit()
+        metrics.count('purchases')
+        metrics.count('codes_sold', quantite)
+        metrics.count('purchase_amount', float(total))
 
         # Emit user_updated event for balance change
         emit_user_updated(user, exclude_user_id=user_id)
@@ -161,18 +171,12 @@ def acheter_produit():
 # (get, get_my_history, get_filter_options, get_revendeurs, returns/approve, returns/reject)
 
 
-@historique_bp.route('/get', methods=['GET'])
-@jwt_required()
-def get_historique():
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-
-    if not user:
-        return jsonify({"error": "User not found"}), 404
-
+def _filtered_historique_query(user):
+    """
+    Historique joined to User, restricted to what user may see and filtered by the
+    user_nom, produit, duree and search query arguments; None for other roles.
+    """
     search = request.args.get('search', '').lower()
-    page = request.args.get('page', type=int, default=1)
-    per_page = request.args.get('per_page', type=int, default=20)
     user_nom = request.args.get('user_nom', '').lower()
     produit = request.args.get('produit', '').lower()
     duree = request.args.get('duree', '').lower()
@@ -195,7 +199,7 @@ def get_historique():
         # Revendeur sees only their own historique
         base_query = base_query.filter(Historique.user_id == user.id)
     else:
-        return jsonify({"error": "Unauthorized role"}), 403
+        return None
 
     # Apply filters
     if user_nom:
@@ -213,6 +217,26 @@ def get_historique():
                 Historique.note.ilike(f"%{search}%")
             )
         )
+    return base_query
+
+
+@historique_bp.route('/get', methods=['GET'])
+@jwt_required()
+@db_routing.read_replica
+def get_historique():
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    page = request.args.get('page', type=int, default=1)
+    per_page = request.args.get('per_page', type=int, default=20)
+
+    base_query = _filtered_historique_query(user)
+    if base_query is None:
+        return jsonify({"error": "Unauthorized role"}), 403
+    base_query = base_query.options(contains_eager(Historique.user))
 
     # Query 1: Fetch all Historique records with pending ReturnRequest
     pending_query = base_query.join(ReturnRequest, Historique.id == ReturnRequest.historique_id)\
@@ -239,10 +263,11 @@ def get_historique():
 
     # Process items for response
     items = []
+    latest_returns = _latest_return_requests([h.id for h in paginated_items])
     for h in paginated_items:
         h_dict = h.to_dict()
-        # Fetch the latest ReturnRequest for this historique, if any
-        return_request = ReturnRequest.query.filter_by(historique_id=h.id).order_by(ReturnRequest.created_at.desc()).first()
+        # Latest ReturnRequest for this historique, if any
+        return_request = latest_returns.get(h.id)
         h_dict['return_status'] = return_request.status if return_request else None
         h_dict['return_request_id'] = return_request.id if return_request else None
         h_dict['return_reason'] = return_request.reason if return_request else None
@@ -259,8 +284,31 @@ def get_historique():
         "historiques": items
     }), 200
 
+
+@historique_bp.route('/export', methods=['GET'])
+@jwt_required()
+@db_routing.read_replica
+def export_historique():
+    """Same filters and visibility as /get, streamed as ?format=csv (default) or xlsx, newest first."""
+    user = User.query.get(get_jwt_identity())
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+    if not exports.allowed(user, "imprimer_historique"):
+        return jsonify({"error": "Access denied"}), 403
+
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in exports.formats():
+        return jsonify({"error": f"format must be one of: {', '.join(exports.formats())}"}), 400
+
+    query = _filtered_historique_query(user)
+    if query is None:
+        return jsonify({"error": "Unauthorized role"}), 403
+    query = query.order_by(Historique.date.desc(), Historique.id.desc())
+    return exports.response(serializers.HISTORIQUE, query, 'historique', fmt)
+
 @historique_bp.route('/get_my_history', methods=['GET'])
 @jwt_required()
+@db_routing.read_replica
 def get_my_history():
     user_id = get_jwt_identity()
     user = User.query.get(user_id)
@@ -275,7 +323,9 @@ def get_my_history():
     produit = request.args.get('produit', '').lower()
     duree = request.args.get('duree', '').lower()
 
-    query = Historique.query.filter_by(user_id=user.id).join(User, Historique.user_id == User.id)
+    query = Historique.query.filter_by(user_id=user.id).join(User, Historique.user_id == User.id).options(
+        contains_eager(Historique.user)
+    )
 
     # Apply filters
     if user_nom:
@@ -298,10 +348,11 @@ def get_my_history():
 
     paginated = query.order_by(Historique.date.desc()).paginate(page=page, per_page=per_page, error_out=False)
     items = []
+    latest_returns = _latest_return_requests([h.id for h in paginated.items])
     for h in paginated.items:
         h_dict = h.to_dict()
-        # Fetch the latest ReturnRequest for this historique, if any
-        return_request = ReturnRequest.query.filter_by(historique_id=h.id).order_by(ReturnRequest.created_at.desc()).first()
+        # Latest ReturnRequest for this historique, if any
+        return_request = latest_returns.get(h.id)
         h_dict['return_status'] = return_request.status if return_request else None
         h_dict['return_request_id'] = return_request.id if return_request else None
         h_dict['return_reason'] = return_request.reason if return_request else None  # Add return reason
@@ -317,6 +368,7 @@ def get_my_history():
 
 @historique_bp.route('/get_filter_options', methods=['GET'])
 @jwt_required()
+@db_routing.read_replica
 def get_filter_options():
     user_id = get_jwt_identity()
     user = User.query.get(user_id)
@@ -360,6 +412,7 @@ def get_filter_options():
 
 @historique_bp.route('/get_revendeurs', methods=['GET'])
 @jwt_required()
+@db_routing.read_replica
 def get_revendeurs():
     user_id = get_jwt_identity()
     user = User.query.get(user_id)
@@ -508,6 +561,8 @@ def approve_return(req_id):
         db.session.delete(h)
 
         db.session.commit()
+        metrics.count('returns')
+        metrics.count('return_amount', float(total))
 
         emit_user_updated(buyer, exclude_user_id=reviewer_id)
 
@@ -8,12 +8,17 @@ from ..models.duree_avec_stock import DureeAvecStock
 import os
 from flask import current_app
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import HTTPException
 from sqlalchemy.sql import func, asc, desc
 from sqlalchemy import case,or_
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..models.user import User
-from ..models.gest_prix import GestPrix
 from sqlalchemy import func, case
+from ..utils.logging_config import lazy
+from ..utils import price_matrix, loading_profiles, http_cache, media_store, db_routing
+import logging
+
+logger = logging.getLogger(__name__)
 
 products_bp = Blueprint('products', __name__)
 
@@ -45,29 +50,37 @@ def add_product():
             type=type_value
         )
 
-        db.session.add(new_product)
-        db.session.flush()
-
+        # Stored before anything is written, so a rejected upload leaves no row behind
         if photo_file and photo_file.filename:
-            folder = os.path.join(current_app.root_path, 'static', 'products_images')
-            os.makedirs(folder, exist_ok=True)
-            filename = f"{new_product.id}.png"
-            save_path = os.path.join(folder, secure_filename(filename))
-            if os.path.exists(save_path):
-                os.remove(save_path)
-            photo_file.save(save_path)
-            new_product.photo = os.path.relpath(save_path, current_app.root_path)
-
+            new_product.photo = media_store.save(photo_file)
+        db.session.add(new_product)
         db.session.commit()
         return jsonify({
             "message": "Product added successfully",
             "product": new_product.to_dict()
         }), 201
+    except HTTPException:
+        # e.g. a rejected upload: the client gets its 413, not a 500
+        db.session.rollback()
+        raise
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
+def order_by_price(query, sort):
+    """
+    Sort products by their denormalized DureeAvecStock.prix_1 range, one row per product:
+    price_asc by min_prix, price_desc by max_prix. NULLs sort lowest, so unpriced products
+    come first for price_asc and last for price_desc, as before. The keys are the bare
+    indexed columns (id follows in the same direction) so the (sous_category_id, min_prix)
+    and (sous_category_id, max_prix) indexes give the order without a filesort.
+    """
+    if sort == 'price_asc':
+        return query.order_by(Produit.min_prix.asc(), Produit.id.asc())
+    return query.order_by(Produit.max_prix.desc(), Produit.id.desc())
+
 @products_bp.route('/get_products', methods=['GET'])
+@http_cache.versioned(Produit, DureeAvecStock, Category, SousCategory)
 def get_all_products():
     """Retrieve all products with pagination, filtering, and sorting."""
     try:
@@ -82,7 +95,7 @@ def get_all_products():
         per_page = request.args.get('per_page', type=int, default=20)
         sort = request.args.get('sort', type=str, default='latest')
 
-        query = Produit.query
+        query = Produit.query.options(*loading_profiles.load('produit_with_durees'))
 
         # Apply filters
         if search:
@@ -102,24 +115,8 @@ def get_all_products():
                 query = query.filter(Produit.photo.is_(None))
 
         # Apply sorting
-        if sort == 'price_asc':
-            query = query.outerjoin(DureeAvecStock).order_by(
-                case(
-                    (DureeAvecStock.prix_1.is_(None), 1),
-                    else_=0
-                ).desc(),  # NULLs last
-                DureeAvecStock.prix_1.asc(),
-                Produit.id.asc()  # Secondary sort for stability
-            )
-        elif sort == 'price_desc':
-            query = query.outerjoin(DureeAvecStock).order_by(
-                case(
-                    (DureeAvecStock.prix_1.is_(None), 1),
-                    else_=0
-                ).asc(),  # NULLs first
-                DureeAvecStock.prix_1.desc(),
-                Produit.id.asc()  # Secondary sort for stability
-            )
+        if sort in ('price_asc', 'price_desc'):
+            query = order_by_price(query, sort)
         elif sort == 'name_asc':
             query = query.order_by(Produit.name.asc(), Produit.id.asc())
         elif sort == 'name_desc':
@@ -127,8 +124,7 @@ def get_all_products():
         else:  # latest
             query = query.order_by(Produit.id.desc())
 
-        # Log the query for debugging
-        print("SQL Query:", str(query))
+        logger.debug("SQL query: %s", query)
 
         paginated = query.paginate(page=page, per_page=per_page, error_out=False)
         products = paginated.items
@@ -140,14 +136,13 @@ def get_all_products():
             product_data["duree_avec_stock"] = [d.to_dict() for d in product.duree_avec_stock]
             result.append(product_data)
 
-        # Log results for debugging
-        print("Products:", [
+        logger.debug("Products: %s", lazy(lambda: [
             {
                 "id": p["id"],
                 "name": p["name"],
                 "prix_1": p["duree_avec_stock"][0]["prix_1"] if p["duree_avec_stock"] else None
             } for p in result
-        ])
+        ]))
 
         return jsonify({
             "page": page,
@@ -157,20 +152,9 @@ def get_all_products():
             "records": result
         }), 200
     except Exception as e:
-        print("Error:", str(e))
+        logger.error("Error: %s", e)
         return jsonify({"error": str(e)}), 500
 
-def _normalize(s: str) -> str:
-    return (s or "").strip().lower()
-
-def _prix_achat_for_admin_niveau(das, admin: User) -> float:
-    niveau = (admin.niveau or 'niveau1').lower()
-    if niveau == 'niveau2':
-        return float(das.prix_2)
-    if niveau == 'niveau3':
-        return float(das.prix_3)
-    return float(das.prix_1)
-
 @products_bp.route('/get_products_by_sous_category/<int:sous_category_id>', methods=['GET'])
 @jwt_required()
 def get_products_by_sous_category(sous_category_id):
@@ -181,6 +165,7 @@ def get_products_by_sous_category(sous_category_id):
                        else admin's GestPrix.prix_achat,
                        else admin's prix_achat by niveau (fallback).
     If a product has no DureeAvecStock with stock, fall back to DureeSansStock.
+    Entries are served from the price matrix (app/utils/price_matrix.py).
     """
     try:
         caller_id = get_jwt_identity()
@@ -216,135 +201,32 @@ def get_products_by_sous_category(sous_category_id):
         if search:
             query = query.filter(Produit.name.ilike(f'%{search}%'))
 
-        # Keep your existing sort behavior (based on DureeAvecStock.prix_1); sans-stock items will follow
-        if sort == 'price_asc':
-            query = query.outerjoin(DureeAvecStock).order_by(
-                case((DureeAvecStock.prix_1.is_(None), 1), else_=0).desc(),
-                DureeAvecStock.prix_1.asc(),
-                Produit.id.asc()
-            )
-        elif sort == 'price_desc':
-            query = query.outerjoin(DureeAvecStock).order_by(
-                case((DureeAvecStock.prix_1.is_(None), 1), else_=0).asc(),
-                DureeAvecStock.prix_1.desc(),
-                Produit.id.asc()
-            )
+        # Price sorts use the DureeAvecStock.prix_1 range; sans-stock items follow
+        if sort in ('price_asc', 'price_desc'):
+            query = order_by_price(query, sort)
         else:
             query = query.order_by(Produit.id.desc())
 
-        paginated = query.paginate(page=page, per_page=per_page, error_out=False)
-        products = paginated.items
-
-        # Preload GestPrix for mapping: (produit_name_lower, duree_lower) -> (prix_vente, prix_achat_snapshot)
-        gp_rows = GestPrix.query.all()
-        gp_map = {
-            (_normalize(gp.produit_name), _normalize(gp.duree)): (gp.prix_vente, gp.prix_achat)
-            for gp in gp_rows
-        }
+        paginated = query.with_entities(Produit.id).paginate(page=page, per_page=per_page, error_out=False)
+        produit_ids = [row.id for row in paginated.items]
 
-        result = []
-        for product in products:
-            pdata = product.to_dict()
-
-            # First try duree_avec_stock with quantite > 0
-            das_list = [d for d in product.duree_avec_stock if (d.quantite or 0) > 0]
-
-            if das_list:
-                if caller.role == 'admin':
-                    das_entries = []
-                    for d in das_list:
-                        prix_achat = _prix_achat_for_admin_niveau(d, pricing_admin)
-                        d_full = d.to_dict()
-                        d_full["prix_affiche"] = prix_achat
-                        das_entries.append(d_full)
-                    pdata["duree_avec_stock"] = das_entries
-                else:
-                    das_entries = []
-                    for d in das_list:
-                        key = (_normalize(product.name or ""), _normalize(d.duree))
-                        prix_vente, prix_achat_gp = gp_map.get(key, (None, None))
-
-                        if prix_vente and float(prix_vente) > 0:
-                            prix_affiche = float(prix_vente)
-                        elif prix_achat_gp is not None:
-                            prix_affiche = float(prix_achat_gp)
-                        else:
-                            prix_affiche = _prix_achat_for_admin_niveau(d, pricing_admin)
-
-                        das_entries.append({
-                            "duree": d.duree,
-                            "Quantite": d.quantite,
-                            "prix_affiche": prix_affiche
-                        })
-                    pdata = {
-                        "id": product.id,
-                        "name": product.name,
-                        "photo": product.photo,
-                        "sous_category_id": product.sous_category_id,
-                        "etat": product.etat,
-                        "type": product.type,
-                        "duree_avec_stock": das_entries
-                    }
-
-            else:
-                # Fallback: use duree_sans_stock (only if active entries exist)
-                dss_list = [d for d in product.duree_sans_stock if d.etat == 'actif']
-                if not dss_list:
-                    # No DAS with stock and no DSS → skip this product
-                    continue
-
-                if caller.role == 'admin':
-                    dss_entries = []
-                    for d in dss_list:
-                        prix_achat = _prix_achat_for_admin_niveau(d, pricing_admin)
-                        d_full = d.to_dict()  # contains prix_1/2/3 for admin
-                        d_full["prix_affiche"] = prix_achat
-                        # for UI consistency, add Quantite=None
-                        d_full["Quantite"] = None
-                        dss_entries.append(d_full)
-                    # Put them under the same key; front-end can check Quantite None
-                    pdata["duree_avec_stock"] = dss_entries
-                else:
-                    dss_entries = []
-                    for d in dss_list:
-                        key = (_normalize(product.name or ""), _normalize(d.duree))
-                        prix_vente, prix_achat_gp = gp_map.get(key, (None, None))
-
-                        if prix_vente and float(prix_vente) > 0:
-                            prix_affiche = float(prix_vente)
-                        elif prix_achat_gp is not None:
-                            prix_affiche = float(prix_achat_gp)
-                        else:
-                            prix_affiche = _prix_achat_for_admin_niveau(d, pricing_admin)
-
-                        dss_entries.append({
-                            "duree": d.duree,
-                            "Quantite": None,  # no stock quantity in DSS
-                            "prix_affiche": prix_affiche
-                        })
-
-                    pdata = {
-                        "id": product.id,
-                        "name": product.name,
-                        "photo": product.photo,
-                        "sous_category_id": product.sous_category_id,
-                        "etat": product.etat,
-                        "type": product.type,
-                        "duree_avec_stock": dss_entries  # reuse same key for client
-                    }
-
-            result.append(pdata)
+        # Prices, quantities and fallbacks are precomputed per niveau in the price matrix
+        entries, version = price_matrix.get_entries(
+            produit_ids, caller.role, price_matrix.niveau_of(pricing_admin)
+        )
+        result = [entries[pid] for pid in produit_ids if pid in entries]
 
         return jsonify({
             "page": page,
             "per_page": per_page,
             "total": paginated.total,
             "pages": paginated.pages,
+            "version": version,
             "records": result
         }), 200
 
     except Exception as e:
-        print("Error:", str(e))
+        logger.error("Error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @products_bp.route('/update_product/<int:id>', methods=['PUT'])
@@ -372,20 +254,17 @@ def update_product(id):
         product.type = type_value or product.type
 
         if photo_file and photo_file.filename:
-            folder = os.path.join(current_app.root_path, 'static', 'products_images')
-            os.makedirs(folder, exist_ok=True)
-            filename = f"{product.id}.png"
-            save_path = os.path.join(folder, secure_filename(filename))
-            if os.path.exists(save_path):
-                os.remove(save_path)
-            photo_file.save(save_path)
-            product.photo = os.path.relpath(save_path, current_app.root_path)
+            product.photo = media_store.save(photo_file)
 
         db.session.commit()
         return jsonify({
             "message": "Product updated successfully",
             "product": product.to_dict()
         }), 200
+    except HTTPException:
+        # e.g. a rejected upload: the client gets its 413, not a 500
+        db.session.rollback()
+        raise
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
@@ -396,14 +275,7 @@ def delete_product(id):
         if not product:
             return jsonify({"message": "Product not found"}), 404
 
-        # Delete associated image if it exists
-        if product.photo:
-            photo_path = os.path.join(current_app.root_path, product.photo)
-            if os.path.exists(photo_path):
-                try:
-                    os.remove(photo_path)
-                except Exception as e:
-                    print(f"[WARNING] Failed to delete photo: {e}")
+        # Stored images can be shared by several rows; `flask media gc` removes unreferenced ones
 
         # Delete related DureeAvecStock entries
         from ..models.duree_avec_stock import DureeAvecStock  # adjust if already imported globally
@@ -423,6 +295,7 @@ def delete_product(id):
     
 
 @products_bp.route('/get_filter_options', methods=['GET'])
+@db_routing.read_replica
 def get_filter_options():
     """Retrieve filter options for products including categories, sous-categories, and etat_commande."""
     try:
@@ -453,7 +326,7 @@ def get_filter_options():
             "names": name_options,
         }), 200
     except Exception as e:
-        print("Error in get_filter_options:", str(e))
+        logger.error("Error in get_filter_options: %s", e)
         return jsonify({"error": str(e)}), 500
 
         
\ No newline at end of file
@@ -2,27 +2,19 @@
 from flask import Blueprint, request, jsonify, current_app
 from sqlalchemy.exc import SQLAlchemyError
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import HTTPException
 from datetime import datetime
 import os
 from ..models.sous_category import SousCategory
 from ..models.category import Category
-from ..models.user import User
-from ..models.visible_item import VisibleItem, ItemType
+from ..models.visible_item import ItemType
+from .visible_items import forget_catalog_item
+from ..utils import visibility_state, loading_profiles, http_cache, media_store, db_routing, socket_guard
+from sqlalchemy.orm import contains_eager
 from .. import db
 
 sous_categories_bp = Blueprint('sous_categories', __name__)
 
-def add_sous_category_to_all_users_visible_items(sous_category_id):
-    users = User.query.all()
-    for user in users:
-        visible_item = VisibleItem(
-            user_id=user.id,
-            item_id=sous_category_id,
-            item_type=ItemType.sous_category
-        )
-        db.session.add(visible_item)
-    db.session.commit()
-
 @sous_categories_bp.route('/add_sous_category', methods=['POST'])
 def add_sous_category():
     """Create a new sous category with category_id and upload image."""
@@ -39,44 +31,32 @@ def add_sous_category():
         if not category:
             return jsonify({"message": "Category not found"}), 404
 
+        # Stored before anything is written, so a rejected upload leaves no row behind
+        img_path = None
+        if photo_file and photo_file.filename:
+            img_path = media_store.save(photo_file)
+
         new_sous_category = SousCategory(
             name=name,
             etat=etat,
-            category_id=category.id
+            category_id=category.id,
+            photo=img_path
         )
         db.session.add(new_sous_category)
-        db.session.flush()
-
-        img_path = None
-        if photo_file and photo_file.filename:
-            folder = os.path.join(
-                current_app.root_path,
-                'static',
-                'sous_categories_images',
-                name.lower().replace(" ", "_")
-            )
-            os.makedirs(folder, exist_ok=True)
-
-            filename = f"{new_sous_category.id}.png"
-            save_path = os.path.join(folder, filename)
-
-            if os.path.exists(save_path):
-                os.remove(save_path)
-
-            photo_file.save(save_path)
-            img_path = os.path.relpath(save_path, current_app.root_path)
-
-        new_sous_category.photo = img_path
         db.session.commit()
 
-        # Add the new sous category to all users' visible items
-        add_sous_category_to_all_users_visible_items(new_sous_category.id)
-        print(f"[SUCCESS] Added sous category {new_sous_category.id} to all users' visible items")
+        # New catalog items are visible to everyone; clients refetch their visibility snapshot
+        visibility_state.reset()
+        socket_guard.invalidate('get_visible_items')
 
         return jsonify({
             "message": "SousCategory added successfully",
             "sous_category": new_sous_category.to_dict()
         }), 201
+    except HTTPException:
+        # e.g. a rejected upload: the client gets its 413, not a 500
+        db.session.rollback()
+        raise
     except SQLAlchemyError as e:
         db.session.rollback()
         return jsonify({"error": "Database error", "details": str(e)}), 500
@@ -84,6 +64,7 @@ def add_sous_category():
         return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
 
 @sous_categories_bp.route('/get_sous_categories', methods=['GET'])
+@http_cache.versioned(SousCategory, Category)
 def get_all_sous_categories():
     """
     Retrieve sous categories with optional pagination, filtering, and search.
@@ -99,7 +80,9 @@ def get_all_sous_categories():
             if key not in ['search', 'page', 'per_page']
         }
 
-        query = SousCategory.query.join(Category, SousCategory.category_id == Category.id)
+        query = SousCategory.query.join(Category, SousCategory.category_id == Category.id).options(
+            contains_eager(SousCategory.category)
+        )
 
         for field, value in filters.items():
             if field == 'category_id' and value.isdigit():
@@ -155,7 +138,7 @@ def get_sous_categories_by_category(category_id):
         page = request.args.get('page', type=int, default=None)
         per_page = request.args.get('per_page', type=int, default=None)
 
-        query = SousCategory.query.filter_by(category_id=category_id)
+        query = SousCategory.query.options(*loading_profiles.load('sous_category')).filter_by(category_id=category_id)
 
         if search_query:
             query = query.filter(
@@ -221,29 +204,20 @@ def update_sous_category(id):
         sous_category.category_id = category.id
 
         if photo_file and photo_file.filename:
-            folder = os.path.join(
-                current_app.root_path,
-                'static',
-                'sous_categories_images',
-                name.lower().replace(" ", "_")
-            )
-            os.makedirs(folder, exist_ok=True)
-
-            filename = f"{sous_category.id}.png"
-            save_path = os.path.join(folder, filename)
-
-            if os.path.exists(save_path):
-                os.remove(save_path)
-
-            photo_file.save(save_path)
-            sous_category.photo = os.path.relpath(save_path, current_app.root_path)
+            sous_category.photo = media_store.save(photo_file)
 
         db.session.commit()
+        visibility_state.reset()
+        socket_guard.invalidate('get_visible_items')
 
         return jsonify({
             "message": "SousCategory updated successfully",
             "sous_category": sous_category.to_dict()
         }), 200
+    except HTTPException:
+        # e.g. a rejected upload: the client gets its 413, not a 500
+        db.session.rollback()
+        raise
     except SQLAlchemyError as e:
         db.session.rollback()
         return jsonify({"error": "Database error", "details": str(e)}), 500
@@ -258,16 +232,13 @@ def delete_sous_category(id):
         if not sous_category:
             return jsonify({"message": "SousCategory not found"}), 404
 
-        if sous_category.photo:
-            photo_path = os.path.join(current_app.root_path, sous_category.photo)
-            if os.path.isfile(photo_path):
-                try:
-                    os.remove(photo_path)
-                except Exception as e:
-                    print(f"[WARNING] Failed to delete image: {e}")
+        # Stored images can be shared by several rows; `flask media gc` removes unreferenced ones
+        forget_catalog_item(ItemType.sous_category, sous_category.id)
 
         db.session.delete(sous_category)
         db.session.commit()
+        visibility_state.reset()
+        socket_guard.invalidate('get_visible_items')
         
         return jsonify({"message": "SousCategory deleted successfully"}), 200
     except SQLAlchemyError as e:
@@ -277,6 +248,7 @@ def delete_sous_category(id):
         return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
 
 @sous_categories_bp.route('/get_filter_options', methods=['GET'])
+@db_routing.read_replica
 def get_filter_options():
     """
     Retrieve all categories for use as filter options.
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from flask import Blueprint, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from .. import db
 from ..models.duree_avec_stock import DureeAvecStock
 from ..models.product import Produit
@@ -8,10 +9,31 @@ from ..models.user import User
 from ..models.stock import Stock
 from datetime import datetime, timedelta
 from sqlalchemy import func
+from ..utils import db_pool, db_routing, sql_metrics
 import logging
 
+logger = logging.getLogger(__name__)
+
 statistics_bp = Blueprint('statistics', __name__)
 
+@statistics_bp.route('/db_pool', methods=['GET'])
+@jwt_required()
+def get_db_pool_statistics():
+    """Connection pool checkouts, waits and overflow of the process answering (managers only)."""
+    user = User.query.get(get_jwt_identity())
+    if not user or user.role != 'manager':
+        return jsonify({"error": "Access denied"}), 403
+    return jsonify(db_pool.stats(db.engine)), 200
+
+@statistics_bp.route('/sql', methods=['GET'])
+@jwt_required()
+def get_sql_statistics():
+    """Queries, database time and most repeated statement per endpoint in the process answering (managers only)."""
+    user = User.query.get(get_jwt_identity())
+    if not user or user.role != 'manager':
+        return jsonify({"error": "Access denied"}), 403
+    return jsonify(sql_metrics.stats()), 200
+
 def get_subordinate_ids(user_id, user_dict=None):
     """Recursively get all subordinate user IDs under a given user using the 'responsable' field."""
     if user_dict is None:
@@ -25,6 +47,7 @@ def get_subordinate_ids(user_id, user_dict=None):
     return subordinates
 
 @statistics_bp.route('/duree/<int:duree_id>', methods=['GET'])
+@db_routing.read_replica
 def get_duree_statistics(duree_id):
     try:
         duree = DureeAvecStock.query.get(duree_id)
@@ -68,7 +91,7 @@ def get_duree_statistics(duree_id):
             history_query = history_query.filter(Historique.date <= func.cast(end, db.Date))
 
         history_records = history_query.all()
-        logging.info(f"Number of Historique records for {product.name}: {len(history_records)}")
+        logger.debug("Number of Historique records for %s: %s", product.name, len(history_records))
 
         total_quantity_sold = 0
         total_montant = 0
@@ -77,13 +100,13 @@ def get_duree_statistics(duree_id):
                 quantity = len([code.strip() for code in record.codes.split(',') if code.strip()]) if product_type == 'code' and record.codes else 1
                 total_quantity_sold += quantity
                 total_montant += float(record.montant or 0)
-        logging.info(f"Total quantity sold: {total_quantity_sold}")
-        logging.info(f"Total montant from Historique: {total_montant}")
+        logger.debug("Total quantity sold: %s", total_quantity_sold)
+        logger.debug("Total montant from Historique: %s", total_montant)
 
         total_revenue = total_montant if total_montant else 0
         total_cost = total_quantity_sold * prix_achat if prix_achat and total_quantity_sold else 0
         profit = float(total_revenue - total_cost) if total_cost else 0.0
-        logging.info(f"Total revenue: {total_revenue}, Total cost: {total_cost}, Profit: {profit}")
+        logger.debug("Total revenue: %s, Total cost: %s, Profit: %s", total_revenue, total_cost, profit)
 
         monthly_last_month = []
         if not start_date and not end_date:
@@ -397,10 +420,11 @@ def get_duree_statistics(duree_id):
 
         return jsonify(response), 200
     except Exception as e:
-        logging.error(f"Error in get_duree_statistics: {str(e)}", exc_info=True)
+        logger.error("Error in get_duree_statistics: %s", e, exc_info=True)
         return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
 
 @statistics_bp.route('/user/<int:user_id>/statistics', methods=['GET'])
+@db_routing.read_replica
 def get_user_statistics(user_id):
     try:
         user = User.query.get(user_id)
@@ -761,11 +785,12 @@ def get_user_statistics(user_id):
 
         return jsonify(response), 200
     except Exception as e:
-        logging.error(f"Error in get_user_statistics: {str(e)}", exc_info=True)
+        logger.error("Error in get_user_statistics: %s", e, exc_info=True)
         return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
     
 
 @statistics_bp.route('/user/<int:user_id>/subordinates', methods=['GET'])
+@db_routing.read_replica
 def get_user_subordinates(user_id):
     try:
         user = User.query.get(user_id)
@@ -841,5 +866,5 @@ def get_user_subordinates(user_id):
             'total_pages': (total + per_page - 1) // per_page
         }), 200
     except Exception as e:
-        logging.error(f"Error in get_user_subordinates: {str(e)}", exc_info=True)
+        logger.error("Error in get_user_subordinates: %s", e, exc_info=True)
         return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
\ No newline at end of file
@@ -4,6 +4,12 @@ from .. import db
 from ..models.stock import Stock
 from ..models.product import Produit
 from ..models.duree_avec_stock import DureeAvecStock
+from sqlalchemy.orm import contains_eager
+from ..utils.logging_config import lazy
+from ..utils import db_routing
+import logging
+
+logger = logging.getLogger(__name__)
 
 stocks_bp = Blueprint('stocks', __name__)
 
@@ -37,7 +43,7 @@ def get_all_stocks():
         per_page = request.args.get('per_page', type=int, default=20)
         sort = request.args.get('sort', type=str, default='latest')
 
-        query = db.session.query(Stock).join(Produit)
+        query = db.session.query(Stock).join(Produit).options(contains_eager(Stock.produit))
 
         # Apply filters
         if search_query:
@@ -70,14 +76,12 @@ def get_all_stocks():
         else:  # latest
             query = query.order_by(Stock.id.desc())
 
-        # Log the query for debugging
-        print("SQL Query:", str(query))
+        logger.debug("SQL query: %s", query)
 
         paginated = query.paginate(page=page, per_page=per_page, error_out=False)
         stocks = paginated.items
 
-        # Log results for debugging
-        print("Stocks:", [
+        logger.debug("Stocks: %s", lazy(lambda: [
             {
                 "id": stock.id,
                 "produit_name": stock.produit.name if stock.produit else None,
@@ -85,7 +89,7 @@ def get_all_stocks():
                 "duree": stock.duree,
                 "prix_achat": stock.prix_achat
             } for stock in stocks
-        ])
+        ]))
 
         return jsonify({
             "page": page,
@@ -95,7 +99,7 @@ def get_all_stocks():
             "stocks": [stock.to_dict() for stock in stocks]
         }), 200
     except Exception as e:
-        print("Error in get_all_stocks:", str(e))
+        logger.error("Error in get_all_stocks: %s", e)
         return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
     
 @stocks_bp.route('/get_stock/<int:stock_id>', methods=['GET'])
@@ -123,18 +127,18 @@ def add_stock():
         # Validate produit_id
         produit = Produit.query.get(produit_id)
         if not produit:
-            print(f"Error: Produit with id {produit_id} not found")
+            logger.warning("Produit with id %s not found", produit_id)
             return jsonify({"error": f"Produit with id {produit_id} not found"}), 404
 
         # Validate codes
         if not isinstance(codes, list) or not codes:
-            print("Error: Codes must be a non-empty array")
+            logger.warning("Codes must be a non-empty array")
             return jsonify({"error": "Codes must be a non-empty array"}), 400
 
         # Check for duplicate codes in the input
         code_set = set(code.strip().lower() for code in codes if code and isinstance(code, str))
         if len(code_set) < len([code for code in codes if code and isinstance(code, str)]):
-            print("Error: Duplicate codes found in input")
+            logger.warning("Duplicate codes found in input")
             return jsonify({"error": "Duplicate codes are not allowed"}), 400
 
         # Check for existing codes in the database
@@ -143,7 +147,7 @@ def add_stock():
         ).all()
         existing_codes = {code[0].lower() for code in existing_codes}
         if existing_codes.intersection(code_set):
-            print(f"Error: Codes already exist in database: {existing_codes.intersection(code_set)}")
+            logger.warning("Codes already exist in database: %s", existing_codes.intersection(code_set))
             return jsonify({"error": f"Codes already exist in database: {', '.join(existing_codes.intersection(code_set))}"}), 400
 
         # Normalize inputs
@@ -155,7 +159,7 @@ def add_stock():
         new_stocks = []
         for code in codes:
             if not code or not isinstance(code, str):
-                print(f"Warning: Skipping invalid code: {code}")
+                logger.warning("Skipping invalid code: %s", code)
                 continue  # Skip invalid codes
             new_stock = Stock(
                 produit_id=produit_id,
@@ -175,14 +179,14 @@ def add_stock():
         try:
             update_duree_avec_stock(produit_id, normalized_duree)
         except Exception as e:
-            print(f"Error updating DureeAvecStock: {str(e)}")
+            logger.error("Error updating DureeAvecStock: %s", e)
             db.session.rollback()
             return jsonify({"error": "Failed to update DureeAvecStock", "details": str(e)}), 500
 
         return jsonify([stock.to_dict() for stock in new_stocks]), 201
 
     except Exception as e:
-        print(f"Error in add_stock: {str(e)}")
+        logger.error("Error in add_stock: %s", e)
         db.session.rollback()
         return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
     
@@ -210,7 +214,7 @@ def update_stock(stock_id):
                 Stock.id != stock_id  # Exclude the current stock
             ).first()
             if existing_code:
-                print(f"Error: Code already exists in database: {normalized_code}")
+                logger.warning("Code already exists in database: %s", normalized_code)
                 return jsonify({"error": f"Code already exists in database: {normalized_code}"}), 400
 
         # Validate produit_id if provided
@@ -235,13 +239,13 @@ def update_stock(stock_id):
             update_duree_avec_stock(original_produit_id, original_duree)
             update_duree_avec_stock(stock.produit_id, stock.duree)
         except Exception as e:
-            print(f"Error updating DureeAvecStock: {str(e)}")
+            logger.error("Error updating DureeAvecStock: %s", e)
             db.session.rollback()
             return jsonify({"error": "Failed to update DureeAvecStock", "details": str(e)}), 500
 
         return jsonify(stock.to_dict()), 200
     except Exception as e:
-        print(f"Error in update_stock: {str(e)}")
+        logger.error("Error in update_stock: %s", e)
         db.session.rollback()
         return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
     
@@ -263,6 +267,7 @@ def delete_stock(stock_id):
     return jsonify({"message": f"Stock with id {stock_id} has been deleted"}), 200
 
 @stocks_bp.route('/get_filter_options', methods=['GET'])
+@db_routing.read_replica
 def get_filter_options():
     """Retrieve filter options for stocks including produit_name, fournisseur, and duree."""
     try:
@@ -284,5 +289,5 @@ def get_filter_options():
             "durees": duree_options
         }), 200
     except Exception as e:
-        print("Error in get_filter_options:", str(e))
+        logger.error("Error in get_filter_options: %s", e)
         return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
\ No newline at end of file
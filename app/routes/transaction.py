@@ -12,9 +12,8 @@ from datetime import datetime, timedelta
 from flask_socketio import SocketIO
 from app import socketio, db
 from app.utils.socket_state import connected_users
+from app.utils import socket_guard, serializers, exports, db_routing
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 # Helper function to parse duree string to timedelta
@@ -56,7 +55,7 @@ def format_overdue_duration(time_until_expiration):
             months = round(total_days / 30)
             return f"{months} {'mois' if months == 1 else 'mois'}"
     except Exception as e:
-        logger.error(f"Error in format_overdue_duration: {str(e)}\n{traceback.format_exc()}")
+        logger.error("Error in format_overdue_duration: %s", e, exc_info=True)
         return "inconnu"
 
 # Helper function to check and emit reminders
@@ -64,18 +63,18 @@ def check_and_emit_reminders():
     try:
         now = datetime.utcnow()
         impayes = TransactionImpaye.query.all()
-        logger.debug(f"Checking {len(impayes)} unpaid transactions at {now}")
+        logger.debug("Checking %s unpaid transactions at %s", len(impayes), now)
         for impaye in impayes:
             duree = parse_duree(impaye.duree)
             if not duree:
-                logger.warning(f"Invalid duree for transaction {impaye.id}: {impaye.duree}")
+                logger.warning("Invalid duree for transaction %s: %s", impaye.id, impaye.duree)
                 continue
             expiration = impaye.date_transaction + duree
             time_until_expiration = expiration - now
             sender = User.query.get(impaye.envoyee_par)
             receiver = User.query.get(impaye.recue_par)
             if not sender or not receiver:
-                logger.warning(f"Invalid users for transaction {impaye.id}: sender={impaye.envoyee_par}, receiver={impaye.recue_par}")
+                logger.warning("Invalid users for transaction %s: sender=%s, receiver=%s", impaye.id, impaye.envoyee_par, impaye.recue_par)
                 continue
             notification_data = {
                 'transaction_id': impaye.id,
@@ -95,7 +94,7 @@ def check_and_emit_reminders():
                             'message': f"Échéance dans 1 jour : {impaye.montant} TND",
                             **notification_data
                         }, room=sid)
-                        logger.debug(f"Emitted 1-day before reminder to user {user_id} for transaction {impaye.id}")
+                        logger.debug("Emitted 1-day before reminder to user %s for transaction %s", user_id, impaye.id)
             elif timedelta(hours=-12) <= time_until_expiration <= timedelta(hours=12):
                 for user_id in [impaye.envoyee_par, impaye.recue_par]:
                     sid = connected_users.get(str(user_id))
@@ -105,7 +104,7 @@ def check_and_emit_reminders():
                             'message': f"Échéance aujourd'hui : {impaye.montant} TND",
                             **notification_data
                         }, room=sid)
-                        logger.debug(f"Emitted expiration day reminder to user {user_id} for transaction {impaye.id}")
+                        logger.debug("Emitted expiration day reminder to user %s for transaction %s", user_id, impaye.id)
             elif time_until_expiration < timedelta(hours=-12):
                 user_id = impaye.envoyee_par
                 sid = connected_users.get(str(user_id))
@@ -116,11 +115,12 @@ def check_and_emit_reminders():
                         'message': f"En retard de {overdue_duration} : {impaye.montant} TND",
                         **notification_data
                     }, room=sid)
-                    logger.debug(f"Emitted overdue reminder to sender {user_id} for transaction {impaye.id}")
+                    logger.debug("Emitted overdue reminder to sender %s for transaction %s", user_id, impaye.id)
     except Exception as e:
-        logger.error(f"Error in check_and_emit_reminders: {str(e)}\n{traceback.format_exc()}")
+        logger.error("Error in check_and_emit_reminders: %s", e, exc_info=True)
 
 @socketio.on('get_transaction_reminders')
+@socket_guard.guarded('get_transaction_reminders', key=lambda data: str(data.get('user_id')))
 def handle_get_transaction_reminders(data):
     user_id = data.get('user_id')
     if not user_id:
@@ -128,24 +128,25 @@ def handle_get_transaction_reminders(data):
         return
     user = User.query.get(user_id)
     if not user:
-        logger.warning(f"User not found: {user_id}")
+        logger.warning("User not found: %s", user_id)
         return
     impayes = TransactionImpaye.query.filter(
         (TransactionImpaye.envoyee_par == user_id) | 
         (TransactionImpaye.recue_par == user_id)
     ).all()
     now = datetime.utcnow()
+    reminders = []
     for impaye in impayes:
         duree = parse_duree(impaye.duree)
         if not duree:
-            logger.warning(f"Invalid duree for transaction {impaye.id}: {impaye.duree}")
+            logger.warning("Invalid duree for transaction %s: %s", impaye.id, impaye.duree)
             continue
         expiration = impaye.date_transaction + duree
         time_until_expiration = expiration - now
         sender = User.query.get(impaye.envoyee_par)
         receiver = User.query.get(impaye.recue_par)
         if not sender or not receiver:
-            logger.warning(f"Invalid users for transaction {impaye.id}: sender={impaye.envoyee_par}, receiver={impaye.recue_par}")
+            logger.warning("Invalid users for transaction %s: sender=%s, receiver=%s", impaye.id, impaye.envoyee_par, impaye.recue_par)
             continue
         notification_data = {
             'transaction_id': impaye.id,
@@ -156,99 +157,105 @@ def handle_get_transaction_reminders(data):
             'date_transaction': impaye.date_transaction.isoformat(),
             'expiration': expiration.isoformat()
         }
-        sid = connected_users.get(str(user_id))
-        if not sid:
-            logger.debug(f"No socket connection for user {user_id} for transaction {impaye.id}")
-            continue
         if timedelta(hours=12) <= time_until_expiration <= timedelta(hours=36):
-            socketio.emit('transaction_reminder', {
+            reminders.append(('transaction_reminder', {
                 'type': 'before_expiration',
                 'message': f"Échéance dans 1 jour : {impaye.montant} TND",
                 **notification_data
-            }, room=sid)
+            }))
         elif timedelta(hours=-12) <= time_until_expiration <= timedelta(hours=12):
-            socketio.emit('transaction_reminder', {
+            reminders.append(('transaction_reminder', {
                 'type': 'on_expiration',
                 'message': f"Échéance aujourd'hui : {impaye.montant} TND",
                 **notification_data
-            }, room=sid)
-        elif time_until_expiration < timedelta(hours=-12) and user_id == impaye.envoyee_par:
+            }))
+        elif time_until_expiration < timedelta(hours=-12) and str(user_id) == str(impaye.envoyee_par):
             overdue_duration = format_overdue_duration(time_until_expiration)
-            socketio.emit('transaction_reminder', {
+            reminders.append(('transaction_reminder', {
                 'type': 'after_expiration',
                 'message': f"En retard de {overdue_duration} : {impaye.montant} TND",
                 **notification_data
-            }, room=sid)
+            }))
+    return reminders
 
 @socketio.on('connect')
 def handle_connect():
     user_id = request.args.get('userId')
     if user_id:
         connected_users[user_id] = request.sid
-        logger.debug(f"User {user_id} connected with SID: {request.sid}")
+        logger.debug("User %s connected with SID: %s", user_id, request.sid)
         socketio.start_background_task(lambda: socketio.sleep(30) or check_and_emit_reminders())
 
 transactions_bp = Blueprint('transactions', __name__, url_prefix='/transactions')
 
+def filter_transactions(query, etat, search, envoyee_par, recue_par, start_date, end_date):
+    """Filters and ordering shared by /manager/all and /manager/export; raises ValueError on bad dates."""
+    model = TransactionPaye if etat == 'paye' else TransactionImpaye
+
+    # Apply envoyee_par and recue_par filters if they are valid integers
+    if isinstance(envoyee_par, int):
+        query = query.filter(model.envoyee_par == envoyee_par)
+        logger.debug("Applied envoyee_par filter: %s", query)
+    if isinstance(recue_par, int):
+        query = query.filter(model.recue_par == recue_par)
+        logger.debug("Applied recue_par filter: %s", query)
+
+    # Apply date filters if provided
+    if start_date:
+        try:
+            start_date = datetime.strptime(start_date, '%Y-%m-%d')
+            query = query.filter(model.date_transaction >= start_date)
+            logger.debug("Applied start_date filter: %s", query)
+        except ValueError:
+            logger.warning("Invalid start_date format: %s", start_date)
+            raise ValueError("Invalid start_date format. Use YYYY-MM-DD.")
+    if end_date:
+        try:
+            end_date = datetime.strptime(end_date, '%Y-%m-%d')
+            # Include full end date by adding 1 day
+            query = query.filter(model.date_transaction < end_date + timedelta(days=1))
+            logger.debug("Applied end_date filter: %s", query)
+        except ValueError:
+            logger.warning("Invalid end_date format: %s", end_date)
+            raise ValueError("Invalid end_date format. Use YYYY-MM-DD.")
+
+    # Apply search filter
+    if search:
+        try:
+            search_float = float(search) if search.replace('.', '', 1).isdigit() else None
+            user_filter = User.nom.ilike(f"%{search}%")
+            montant_filter = model.montant == search_float if search_float is not None else func.cast(model.montant, db.String).ilike(f"%{search}%")
+            query = query.join(User, or_(
+                User.id == model.envoyee_par,
+                User.id == model.recue_par
+            ), isouter=True).filter(or_(user_filter, montant_filter))
+            logger.debug("Applied search filter: %s", query)
+        except ValueError:
+            query = query.join(User, or_(
+                User.id == model.envoyee_par,
+                User.id == model.recue_par
+            ), isouter=True).filter(User.nom.ilike(f"%{search}%"))
+            logger.debug("Applied non-numeric search filter: %s", query)
+
+    # Sort by date_transaction DESC, and for paye, also by date_paiement DESC
+    if etat == 'paye':
+        query = query.order_by(TransactionPaye.date_transaction.desc(), TransactionPaye.date_paiement.desc())
+    elif etat == 'impaye':
+        query = query.order_by(TransactionImpaye.date_transaction.desc())
+    return query
+
+
 def apply_filters_and_paginate(query, etat, search, envoyee_par, recue_par, start_date, end_date, page, per_page):
     try:
-        model = TransactionPaye if etat == 'paye' else TransactionImpaye
-        logger.debug(f"Applying filters: etat={etat}, search={search}, envoyee_par={envoyee_par}, recue_par={recue_par}, start_date={start_date}, end_date={end_date}, page={page}, per_page={per_page}")
-
-        # Apply envoyee_par and recue_par filters if they are valid integers
-        if isinstance(envoyee_par, int):
-            query = query.filter(model.envoyee_par == envoyee_par)
-            logger.debug(f"Applied envoyee_par filter: {query}")
-        if isinstance(recue_par, int):
-            query = query.filter(model.recue_par == recue_par)
-            logger.debug(f"Applied recue_par filter: {query}")
-
-        # Apply date filters if provided
-        if start_date:
-            try:
-                start_date = datetime.strptime(start_date, '%Y-%m-%d')
-                query = query.filter(model.date_transaction >= start_date)
-                logger.debug(f"Applied start_date filter: {query}")
-            except ValueError:
-                logger.warning(f"Invalid start_date format: {start_date}")
-                raise ValueError("Invalid start_date format. Use YYYY-MM-DD.")
-        if end_date:
-            try:
-                end_date = datetime.strptime(end_date, '%Y-%m-%d')
-                # Include full end date by adding 1 day
-                query = query.filter(model.date_transaction < end_date + timedelta(days=1))
-                logger.debug(f"Applied end_date filter: {query}")
-            except ValueError:
-                logger.warning(f"Invalid end_date format: {end_date}")
-                raise ValueError("Invalid end_date format. Use YYYY-MM-DD.")
-
-        # Apply search filter
-        if search:
-            try:
-                search_float = float(search) if search.replace('.', '', 1).isdigit() else None
-                user_filter = User.nom.ilike(f"%{search}%")
-                montant_filter = model.montant == search_float if search_float is not None else func.cast(model.montant, db.String).ilike(f"%{search}%")
-                query = query.join(User, or_(
-                    User.id == model.envoyee_par,
-                    User.id == model.recue_par
-                ), isouter=True).filter(or_(user_filter, montant_filter))
-                logger.debug(f"Applied search filter: {query}")
-            except ValueError:
-                query = query.join(User, or_(
-                    User.id == model.envoyee_par,
-                    User.id == model.recue_par
-                ), isouter=True).filter(User.nom.ilike(f"%{search}%"))
-                logger.debug(f"Applied non-numeric search filter: {query}")
-
-        # Sort by date_transaction DESC, and for paye, also by date_paiement DESC
-        if etat == 'paye':
-            query = query.order_by(TransactionPaye.date_transaction.desc(), TransactionPaye.date_paiement.desc())
-        elif etat == 'impaye':
-            query = query.order_by(TransactionImpaye.date_transaction.desc())
+        logger.debug("Applying filters: etat=%s, search=%s, envoyee_par=%s, recue_par=%s, start_date=%s, end_date=%s, page=%s, per_page=%s", etat, search, envoyee_par, recue_par, start_date, end_date, page, per_page)
+        query = filter_transactions(query, etat, search, envoyee_par, recue_par, start_date, end_date)
+
+        # Only the response columns are selected; items come back as dicts
+        projection = serializers.TRANSACTION_PAYE if etat == 'paye' else serializers.TRANSACTION_IMPAYE
 
         # Handle pagination or fetch all if page/per_page not provided
         if page is None or per_page is None:
-            items = query.all()
+            items = projection.fetch(query)
             return {
                 "items": items,
                 "page": 1,
@@ -258,28 +265,28 @@ def apply_filters_and_paginate(query, etat, search, envoyee_par, recue_par, star
         else:
             if page < 1 or per_page < 1:
                 raise ValueError("Page and per_page must be positive integers")
-            pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-            logger.debug(f"Pagination result: page={pagination.page}, total={pagination.total}")
+            items, pagination = projection.paginate(query, page, per_page)
+            logger.debug("Pagination result: page=%s, total=%s", pagination.page, pagination.total)
             return {
-                "items": pagination.items,
+                "items": items,
                 "page": pagination.page,
                 "per_page": pagination.per_page,
                 "total": pagination.total
             }
     except ValueError as ve:
-        logger.error(f"Invalid input in apply_filters_and_paginate: {str(ve)}\n{traceback.format_exc()}")
+        logger.error("Invalid input in apply_filters_and_paginate: %s", ve, exc_info=True)
         raise
     except OperationalError as oe:
-        logger.error(f"Database operational error in apply_filters_and_paginate: {str(oe)}\n{traceback.format_exc()}")
+        logger.error("Database operational error in apply_filters_and_paginate: %s", oe, exc_info=True)
         raise SQLAlchemyError(f"Database operation failed: {str(oe)}")
     except ProgrammingError as pe:
-        logger.error(f"Database programming error in apply_filters_and_paginate: {str(pe)}\n{traceback.format_exc()}")
+        logger.error("Database programming error in apply_filters_and_paginate: %s", pe, exc_info=True)
         raise SQLAlchemyError(f"Invalid database query: {str(pe)}")
     except SQLAlchemyError as se:
-        logger.error(f"Database error in apply_filters_and_paginate: {str(se)}\n{traceback.format_exc()}")
+        logger.error("Database error in apply_filters_and_paginate: %s", se, exc_info=True)
         raise
     except Exception as e:
-        logger.error(f"Unexpected error in apply_filters_and_paginate: {str(e)}\n{traceback.format_exc()}")
+        logger.error("Unexpected error in apply_filters_and_paginate: %s", e, exc_info=True)
         raise
 
 def calculate_transaction_metrics(paye_query, impaye_query):
@@ -329,11 +336,12 @@ def calculate_transaction_metrics(paye_query, impaye_query):
             "monthly": monthly_data
         }
     except Exception as e:
-        logger.error(f"Error in calculate_transaction_metrics: {str(e)}\n{traceback.format_exc()}")
+        logger.error("Error in calculate_transaction_metrics: %s", e, exc_info=True)
         raise
 
 @transactions_bp.route('/manager/all', methods=['GET'])
 @jwt_required()
+@db_routing.read_replica
 def manager_all_transactions():
     try:
         user_id = get_jwt_identity()
@@ -359,13 +367,13 @@ def manager_all_transactions():
         metrics = calculate_transaction_metrics(paye_query, impaye_query)
         return jsonify({
             "paye": {
-                "transactions": [t.to_dict() for t in paye_result["items"]],
+                "transactions": paye_result["items"],
                 "page": paye_result["page"],
                 "per_page": paye_result["per_page"],
                 "total": paye_result["total"]
             },
             "impaye": {
-                "transactions": [t.to_dict() for t in impaye_result["items"]],
+                "transactions": impaye_result["items"],
                 "page": impaye_result["page"],
                 "per_page": impaye_result["per_page"],
                 "total": impaye_result["total"]
@@ -373,15 +381,51 @@ def manager_all_transactions():
             "metrics": metrics
         }), 200
     except ValueError as ve:
-        logger.error(f"Invalid input in manager_all_transactions: {str(ve)}\n{traceback.format_exc()}")
+        logger.error("Invalid input in manager_all_transactions: %s", ve, exc_info=True)
         return jsonify({"error": str(ve)}), 400
     except SQLAlchemyError as se:
-        logger.error(f"Database error in manager_all_transactions: {str(se)}\n{traceback.format_exc()}")
+        logger.error("Database error in manager_all_transactions: %s", se, exc_info=True)
         return jsonify({"error": f"Database error occurred: {str(se)}"}), 500
     except Exception as e:
-        logger.error(f"Error in manager_all_transactions: {str(e)}\n{traceback.format_exc()}")
+        logger.error("Error in manager_all_transactions: %s", e, exc_info=True)
         return jsonify({"error": "An unexpected error occurred while fetching transactions"}), 500
 
+@transactions_bp.route('/manager/export', methods=['GET'])
+@jwt_required()
+@db_routing.read_replica
+def manager_export_transactions():
+    """
+    Same filters as /manager/all for one etat (paye or impaye), streamed as
+    ?format=csv (default) or xlsx with the columns of the list items.
+    """
+    try:
+        user = User.query.get(get_jwt_identity())
+        if user.role not in ["manager", "admin_boss"] or not exports.allowed(user, "imprimer_transactions"):
+            return jsonify({"error": "Access denied"}), 403
+        etat = request.args.get('etat')
+        if etat not in ['paye', 'impaye']:
+            return jsonify({"error": "etat must be 'paye' or 'impaye'"}), 400
+        fmt = request.args.get('format', 'csv').lower()
+        if fmt not in exports.formats():
+            return jsonify({"error": f"format must be one of: {', '.join(exports.formats())}"}), 400
+        model = TransactionPaye if etat == 'paye' else TransactionImpaye
+        query = filter_transactions(
+            model.query, etat,
+            request.args.get('search', ''),
+            request.args.get('envoyee_par', type=int),
+            request.args.get('recue_par', type=int),
+            request.args.get('start_date'),
+            request.args.get('end_date')
+        )
+        projection = serializers.TRANSACTION_PAYE if etat == 'paye' else serializers.TRANSACTION_IMPAYE
+        return exports.response(projection, query, f"transactions-{etat}", fmt)
+    except ValueError as ve:
+        logger.error("Invalid input in manager_export_transactions: %s", ve, exc_info=True)
+        return jsonify({"error": str(ve)}), 400
+    except SQLAlchemyError as se:
+        logger.error("Database error in manager_export_transactions: %s", se, exc_info=True)
+        return jsonify({"error": f"Database error occurred: {str(se)}"}), 500
+
 @transactions_bp.route('/manager/mine', methods=['GET'])
 @jwt_required()
 def manager_my_transactions():
@@ -390,7 +434,7 @@ def manager_my_transactions():
         user = User.query.get(user_id)
 
         if not user or user.role not in ["manager", "admin_boss"]:
-            logger.warning(f"Access denied for user_id={user_id}, role={user.role if user else 'None'}")
+            logger.warning("Access denied for user_id=%s, role=%s", user_id, user.role if user else 'None')
             return jsonify({"error": "Access denied"}), 403
 
         etat = request.args.get('etat')
@@ -402,8 +446,8 @@ def manager_my_transactions():
         per_page = request.args.get('per_page', type=int)
 
         logger.debug(
-            f"Request params: etat={etat}, search={search}, recue_par={recue_par}, "
-            f"start_date={start_date}, end_date={end_date}, page={page}, per_page={per_page}"
+            "Request params: etat=%s, search=%s, recue_par=%s, start_date=%s, end_date=%s, page=%s, per_page=%s",
+            etat, search, recue_par, start_date, end_date, page, per_page
         )
 
         paye_query = TransactionPaye.query.filter(TransactionPaye.envoyee_par == user_id)
@@ -426,13 +470,13 @@ def manager_my_transactions():
         logger.debug("Returning response for manager_my_transactions")
         return jsonify({
             "paye": {
-                "transactions": [t.to_dict() for t in paye_result["items"]],
+                "transactions": paye_result["items"],
                 "page": paye_result["page"],
                 "per_page": paye_result["per_page"],
                 "total": paye_result["total"]
             },
             "impaye": {
-                "transactions": [t.to_dict() for t in impaye_result["items"]],
+                "transactions": impaye_result["items"],
                 "page": impaye_result["page"],
                 "per_page": impaye_result["per_page"],
                 "total": impaye_result["total"]
@@ -441,13 +485,13 @@ def manager_my_transactions():
         }), 200
 
     except ValueError as ve:
-        logger.error(f"Invalid input in manager_my_transactions: {str(ve)}\n{traceback.format_exc()}")
+        logger.error("Invalid input in manager_my_transactions: %s", ve, exc_info=True)
         return jsonify({"error": str(ve)}), 400
     except SQLAlchemyError as se:
-        logger.error(f"Database error in manager_my_transactions: {str(se)}\n{traceback.format_exc()}")
+        logger.error("Database error in manager_my_transactions: %s", se, exc_info=True)
         return jsonify({"error": f"Database error occurred: {str(se)}"}), 500
     except Exception as e:
-        logger.error(f"Unexpected error in manager_my_transactions: {str(e)}\n{traceback.format_exc()}")
+        logger.error("Unexpected error in manager_my_transactions: %s", e, exc_info=True)
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
 @transactions_bp.route('/admin/mine', methods=['GET'])
@@ -457,7 +501,7 @@ def admin_my_transactions():
         user_id = get_jwt_identity()
         user = User.query.get(user_id)
         if not user or user.role != 'admin':
-            logger.warning(f"Access denied for user_id={user_id}, role={user.role if user else 'None'}")
+            logger.warning("Access denied for user_id=%s, role=%s", user_id, user.role if user else 'None')
             return jsonify({"error": "Access denied"}), 403
         etat = request.args.get('etat')
         search = request.args.get('search', '')
@@ -467,7 +511,7 @@ def admin_my_transactions():
         end_date = request.args.get('end_date')
         page = request.args.get('page', type=int)
         per_page = request.args.get('per_page', type=int)
-        logger.debug(f"Request params: etat={etat}, search={search}, envoyee_par={envoyee_par}, recue_par={recue_par}, start_date={start_date}, end_date={end_date}, page={page}, per_page={per_page}")
+        logger.debug("Request params: etat=%s, search=%s, envoyee_par=%s, recue_par=%s, start_date=%s, end_date=%s, page=%s, per_page=%s", etat, search, envoyee_par, recue_par, start_date, end_date, page, per_page)
         paye_query = TransactionPaye.query.filter(TransactionPaye.envoyee_par == user_id)
         impaye_query = TransactionImpaye.query.filter(TransactionImpaye.envoyee_par == user_id)
         paye_result = {"items": [], "page": 1, "per_page": 0, "total": 0}
@@ -480,13 +524,13 @@ def admin_my_transactions():
         logger.debug("Returning response for admin_my_transactions")
         return jsonify({
             "paye": {
-                "transactions": [t.to_dict() for t in paye_result["items"]],
+                "transactions": paye_result["items"],
                 "page": paye_result["page"],
                 "per_page": paye_result["per_page"],
                 "total": paye_result["total"]
             },
             "impaye": {
-                "transactions": [t.to_dict() for t in impaye_result["items"]],
+                "transactions": impaye_result["items"],
                 "page": impaye_result["page"],
                 "per_page": impaye_result["per_page"],
                 "total": impaye_result["total"]
@@ -494,13 +538,13 @@ def admin_my_transactions():
             "metrics": metrics
         }), 200
     except ValueError as ve:
-        logger.error(f"Invalid input in admin_my_transactions: {str(ve)}\n{traceback.format_exc()}")
+        logger.error("Invalid input in admin_my_transactions: %s", ve, exc_info=True)
         return jsonify({"error": str(ve)}), 400
     except SQLAlchemyError as se:
-        logger.error(f"Database error in admin_my_transactions: {str(se)}\n{traceback.format_exc()}")
+        logger.error("Database error in admin_my_transactions: %s", se, exc_info=True)
         return jsonify({"error": f"Database error occurred: {str(se)}"}), 500
     except Exception as e:
-        logger.error(f"Unexpected error in admin_my_transactions: {str(e)}\n{traceback.format_exc()}")
+        logger.error("Unexpected error in admin_my_transactions: %s", e, exc_info=True)
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
 @transactions_bp.route('/admin/revendeurs', methods=['GET'])
@@ -539,13 +583,13 @@ def admin_revendeur_transactions():
         metrics = calculate_transaction_metrics(paye_query, impaye_query)
         return jsonify({
             "paye": {
-                "transactions": [t.to_dict() for t in paye_result["items"]],
+                "transactions": paye_result["items"],
                 "page": paye_result["page"],
                 "per_page": paye_result["per_page"],
                 "total": paye_result["total"]
             },
             "impaye": {
-                "transactions": [t.to_dict() for t in impaye_result["items"]],
+                "transactions": impaye_result["items"],
                 "page": impaye_result["page"],
                 "per_page": impaye_result["per_page"],
                 "total": impaye_result["total"]
@@ -553,13 +597,13 @@ def admin_revendeur_transactions():
             "metrics": metrics
         }), 200
     except ValueError as ve:
-        logger.error(f"Invalid input in admin_revendeur_transactions: {str(ve)}\n{traceback.format_exc()}")
+        logger.error("Invalid input in admin_revendeur_transactions: %s", ve, exc_info=True)
         return jsonify({"error": str(ve)}), 400
     except SQLAlchemyError as se:
-        logger.error(f"Database error in admin_revendeur_transactions: {str(se)}\n{traceback.format_exc()}")
+        logger.error("Database error in admin_revendeur_transactions: %s", se, exc_info=True)
         return jsonify({"error": f"Database error occurred: {str(se)}"}), 500
     except Exception as e:
-        logger.error(f"Error in admin_revendeur_transactions: {str(e)}\n{traceback.format_exc()}")
+        logger.error("Error in admin_revendeur_transactions: %s", e, exc_info=True)
         return jsonify({"error": "An unexpected error occurred while fetching transactions"}), 500
 
 @transactions_bp.route('/revendeur/mine', methods=['GET'])
@@ -569,7 +613,7 @@ def revendeur_my_transactions():
         user_id = get_jwt_identity()
         user = User.query.get(user_id)
         if not user or user.role != 'revendeur':
-            logger.warning(f"Access denied for user_id={user_id}, role={user.role if user else 'None'}")
+            logger.warning("Access denied for user_id=%s, role=%s", user_id, user.role if user else 'None')
             return jsonify({"error": "Access denied"}), 403
         etat = request.args.get('etat')
         search = request.args.get('search', '')
@@ -579,7 +623,7 @@ def revendeur_my_transactions():
         end_date = request.args.get('end_date')
         page = request.args.get('page', type=int)
         per_page = request.args.get('per_page', type=int)
-        logger.debug(f"Request params: etat={etat}, search={search}, envoyee_par={envoyee_par}, recue_par={recue_par}, start_date={start_date}, end_date={end_date}, page={page}, per_page={per_page}")
+        logger.debug("Request params: etat=%s, search=%s, envoyee_par=%s, recue_par=%s, start_date=%s, end_date=%s, page=%s, per_page=%s", etat, search, envoyee_par, recue_par, start_date, end_date, page, per_page)
         paye_query = TransactionPaye.query.filter(TransactionPaye.recue_par == user_id)
         impaye_query = TransactionImpaye.query.filter(TransactionImpaye.recue_par == user_id)
         paye_result = {"items": [], "page": 1, "per_page": 0, "total": 0}
@@ -592,13 +636,13 @@ def revendeur_my_transactions():
         logger.debug("Returning response for revendeur_my_transactions")
         return jsonify({
             "paye": {
-                "transactions": [t.to_dict() for t in paye_result["items"]],
+                "transactions": paye_result["items"],
                 "page": paye_result["page"],
                 "per_page": paye_result["per_page"],
                 "total": paye_result["total"]
             },
             "impaye": {
-                "transactions": [t.to_dict() for t in impaye_result["items"]],
+                "transactions": impaye_result["items"],
                 "page": impaye_result["page"],
                 "per_page": impaye_result["per_page"],
                 "total": impaye_result["total"]
@@ -606,13 +650,13 @@ def revendeur_my_transactions():
             "metrics": metrics
         }), 200
     except ValueError as ve:
-        logger.error(f"Invalid input in revendeur_my_transactions: {str(ve)}\n{traceback.format_exc()}")
+        logger.error("Invalid input in revendeur_my_transactions: %s", ve, exc_info=True)
         return jsonify({"error": str(ve)}), 400
     except SQLAlchemyError as se:
-        logger.error(f"Database error in revendeur_my_transactions: {str(se)}\n{traceback.format_exc()}")
+        logger.error("Database error in revendeur_my_transactions: %s", se, exc_info=True)
         return jsonify({"error": f"Database error occurred: {str(se)}"}), 500
     except Exception as e:
-        logger.error(f"Unexpected error in revendeur_my_transactions: {str(e)}\n{traceback.format_exc()}")
+        logger.error("Unexpected error in revendeur_my_transactions: %s", e, exc_info=True)
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
 @transactions_bp.route('/admin/user/<int:target_user_id>', methods=['GET'])
@@ -622,11 +666,11 @@ def get_transactions_by_user_id(target_user_id):
         user_id = get_jwt_identity()
         user = User.query.get(user_id)
         if not user or user.role != 'admin':
-            logger.warning(f"Access denied for user_id={user_id}, role={user.role if user else 'None'}")
+            logger.warning("Access denied for user_id=%s, role=%s", user_id, user.role if user else 'None')
             return jsonify({"error": "Access denied"}), 403
         target_user = User.query.get(target_user_id)
         if not target_user:
-            logger.warning(f"Target user not found: target_user_id={target_user_id}")
+            logger.warning("Target user not found: target_user_id=%s", target_user_id)
             return jsonify({"error": "User not found"}), 404
         etat = request.args.get('etat')
         search = request.args.get('search', '')
@@ -636,7 +680,7 @@ def get_transactions_by_user_id(target_user_id):
         end_date = request.args.get('end_date')
         page = request.args.get('page', type=int)
         per_page = request.args.get('per_page', type=int)
-        logger.debug(f"Request params: etat={etat}, search={search}, envoyee_par={envoyee_par}, recue_par={recue_par}, start_date={start_date}, end_date={end_date}, page={page}, per_page={per_page}")
+        logger.debug("Request params: etat=%s, search=%s, envoyee_par=%s, recue_par=%s, start_date=%s, end_date=%s, page=%s, per_page=%s", etat, search, envoyee_par, recue_par, start_date, end_date, page, per_page)
         paye_query = TransactionPaye.query.filter(
             (TransactionPaye.envoyee_par == target_user_id) | (TransactionPaye.recue_par == target_user_id)
         )
@@ -644,18 +688,18 @@ def get_transactions_by_user_id(target_user_id):
             (TransactionImpaye.envoyee_par == target_user_id) | (TransactionImpaye.recue_par == target_user_id)
         )
         if not any([etat, search, envoyee_par, recue_par, start_date, end_date, page, per_page]):
-            paye_transactions = paye_query.all()
-            impaye_transactions = impaye_query.all()
+            paye_transactions = serializers.TRANSACTION_PAYE.fetch(paye_query)
+            impaye_transactions = serializers.TRANSACTION_IMPAYE.fetch(impaye_query)
             metrics = calculate_transaction_metrics(paye_query, impaye_query)
             return jsonify({
                 "paye": {
-                    "transactions": [t.to_dict() for t in paye_transactions],
+                    "transactions": paye_transactions,
                     "page": 1,
                     "per_page": len(paye_transactions),
                     "total": len(paye_transactions)
                 },
                 "impaye": {
-                    "transactions": [t.to_dict() for t in impaye_transactions],
+                    "transactions": impaye_transactions,
                     "page": 1,
                     "per_page": len(impaye_transactions),
                     "total": len(impaye_transactions)
@@ -672,13 +716,13 @@ def get_transactions_by_user_id(target_user_id):
         logger.debug("Returning response for get_transactions_by_user_id")
         return jsonify({
             "paye": {
-                "transactions": [t.to_dict() for t in paye_result["items"]],
+                "transactions": paye_result["items"],
                 "page": paye_result["page"],
                 "per_page": paye_result["per_page"],
                 "total": paye_result["total"]
             },
             "impaye": {
-                "transactions": [t.to_dict() for t in impaye_result["items"]],
+                "transactions": impaye_result["items"],
                 "page": impaye_result["page"],
                 "per_page": impaye_result["per_page"],
                 "total": impaye_result["total"]
@@ -686,13 +730,13 @@ def get_transactions_by_user_id(target_user_id):
             "metrics": metrics
         }), 200
     except ValueError as ve:
-        logger.error(f"Invalid input in get_transactions_by_user_id: {str(ve)}\n{traceback.format_exc()}")
+        logger.error("Invalid input in get_transactions_by_user_id: %s", ve, exc_info=True)
         return jsonify({"error": str(ve)}), 400
     except SQLAlchemyError as se:
-        logger.error(f"Database error in get_transactions_by_user_id: {str(se)}\n{traceback.format_exc()}")
+        logger.error("Database error in get_transactions_by_user_id: %s", se, exc_info=True)
         return jsonify({"error": f"Database error occurred: {str(se)}"}), 500
     except Exception as e:
-        logger.error(f"Unexpected error in get_transactions_by_user_id: {str(e)}\n{traceback.format_exc()}")
+        logger.error("Unexpected error in get_transactions_by_user_id: %s", e, exc_info=True)
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
 @transactions_bp.route('/manager/user/<int:target_user_id>', methods=['GET'])
@@ -702,11 +746,11 @@ def manager_get_transactions_by_user(target_user_id):
         manager_id = get_jwt_identity()
         manager = User.query.get(manager_id)
         if not manager or manager.role not in ["manager","admin_boss"]:
-            logger.warning(f"Access denied for manager_id={manager_id}, role={manager.role if manager else 'None'}")
+            logger.warning("Access denied for manager_id=%s, role=%s", manager_id, manager.role if manager else 'None')
             return jsonify({"error": "Access denied"}), 403
         target_user = User.query.get(target_user_id)
         if not target_user:
-            logger.warning(f"Target user not found: target_user_id={target_user_id}")
+            logger.warning("Target user not found: target_user_id=%s", target_user_id)
             return jsonify({"error": "User not found"}), 404
         etat = request.args.get('etat')
         search = request.args.get('search', '')
@@ -716,7 +760,7 @@ def manager_get_transactions_by_user(target_user_id):
         end_date = request.args.get('end_date')
         page = request.args.get('page', type=int)
         per_page = request.args.get('per_page', type=int)
-        logger.debug(f"Request params: etat={etat}, search={search}, envoyee_par={envoyee_par}, recue_par={recue_par}, start_date={start_date}, end_date={end_date}, page={page}, per_page={per_page}")
+        logger.debug("Request params: etat=%s, search=%s, envoyee_par=%s, recue_par=%s, start_date=%s, end_date=%s, page=%s, per_page=%s", etat, search, envoyee_par, recue_par, start_date, end_date, page, per_page)
         paye_query = TransactionPaye.query.filter(
             (TransactionPaye.envoyee_par == target_user_id) | (TransactionPaye.recue_par == target_user_id)
         )
@@ -724,18 +768,18 @@ def manager_get_transactions_by_user(target_user_id):
             (TransactionImpaye.envoyee_par == target_user_id) | (TransactionImpaye.recue_par == target_user_id)
         )
         if not any([etat, search, envoyee_par, recue_par, start_date, end_date, page, per_page]):
-            paye_transactions = paye_query.all()
-            impaye_transactions = impaye_query.all()
+            paye_transactions = serializers.TRANSACTION_PAYE.fetch(paye_query)
+            impaye_transactions = serializers.TRANSACTION_IMPAYE.fetch(impaye_query)
             metrics = calculate_transaction_metrics(paye_query, impaye_query)
             return jsonify({
                 "paye": {
-                    "transactions": [t.to_dict() for t in paye_transactions],
+                    "transactions": paye_transactions,
                     "page": 1,
                     "per_page": len(paye_transactions),
                     "total": len(paye_transactions)
                 },
                 "impaye": {
-                    "transactions": [t.to_dict() for t in impaye_transactions],
+                    "transactions": impaye_transactions,
                     "page": 1,
                     "per_page": len(impaye_transactions),
                     "total": len(impaye_transactions)
@@ -752,13 +796,13 @@ def manager_get_transactions_by_user(target_user_id):
         logger.debug("Returning response for manager_get_transactions_by_user")
         return jsonify({
             "paye": {
-                "transactions": [t.to_dict() for t in paye_result["items"]],
+                "transactions": paye_result["items"],
                 "page": paye_result["page"],
                 "per_page": paye_result["per_page"],
                 "total": paye_result["total"]
             },
             "impaye": {
-                "transactions": [t.to_dict() for t in impaye_result["items"]],
+                "transactions": impaye_result["items"],
                 "page": impaye_result["page"],
                 "per_page": impaye_result["per_page"],
                 "total": impaye_result["total"]
@@ -766,13 +810,13 @@ def manager_get_transactions_by_user(target_user_id):
             "metrics": metrics
         }), 200
     except ValueError as ve:
-        logger.error(f"Invalid input in manager_get_transactions_by_user: {str(ve)}\n{traceback.format_exc()}")
+        logger.error("Invalid input in manager_get_transactions_by_user: %s", ve, exc_info=True)
         return jsonify({"error": str(ve)}), 400
     except SQLAlchemyError as se:
-        logger.error(f"Database error in manager_get_transactions_by_user: {str(se)}\n{traceback.format_exc()}")
+        logger.error("Database error in manager_get_transactions_by_user: %s", se, exc_info=True)
         return jsonify({"error": f"Database error occurred: {str(se)}"}), 500
     except Exception as e:
-        logger.error(f"Unexpected error in manager_get_transactions_by_user: {str(e)}\n{traceback.format_exc()}")
+        logger.error("Unexpected error in manager_get_transactions_by_user: %s", e, exc_info=True)
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
 @transactions_bp.route('/admin/revendeur/<int:revendeur_id>', methods=['GET'])
@@ -802,7 +846,7 @@ def admin_get_transactions_with_my_revendeur(revendeur_id):
         end_date = request.args.get('end_date')
         page = request.args.get('page', type=int)
         per_page = request.args.get('per_page', type=int)
-        logger.debug(f"Request params: etat={etat}, search={search}, envoyee_par={envoyee_par}, recue_par={recue_par}, start_date={start_date}, end_date={end_date}, page={page}, per_page={per_page}")
+        logger.debug("Request params: etat=%s, search=%s, envoyee_par=%s, recue_par=%s, start_date=%s, end_date=%s, page=%s, per_page=%s", etat, search, envoyee_par, recue_par, start_date, end_date, page, per_page)
         paye_query = TransactionPaye.query.filter(
             ((TransactionPaye.envoyee_par == admin_id) & (TransactionPaye.recue_par == revendeur_id)) |
             ((TransactionPaye.envoyee_par == revendeur_id) & (TransactionPaye.recue_par == admin_id))
@@ -820,13 +864,13 @@ def admin_get_transactions_with_my_revendeur(revendeur_id):
         metrics = calculate_transaction_metrics(paye_query, impaye_query)
         return jsonify({
             "paye": {
-                "transactions": [t.to_dict() for t in paye_result["items"]],
+                "transactions": paye_result["items"],
                 "page": paye_result["page"],
                 "per_page": paye_result["per_page"],
                 "total": paye_result["total"]
             },
             "impaye": {
-                "transactions": [t.to_dict() for t in impaye_result["items"]],
+                "transactions": impaye_result["items"],
                 "page": impaye_result["page"],
                 "per_page": impaye_result["per_page"],
                 "total": impaye_result["total"]
@@ -834,23 +878,24 @@ def admin_get_transactions_with_my_revendeur(revendeur_id):
             "metrics": metrics
         }), 200
     except ValueError as ve:
-        logger.error(f"Invalid input in admin_get_transactions_with_my_revendeur: {str(ve)}\n{traceback.format_exc()}")
+        logger.error("Invalid input in admin_get_transactions_with_my_revendeur: %s", ve, exc_info=True)
         return jsonify({"error": str(ve)}), 400
     except SQLAlchemyError as se:
-        logger.error(f"Database error in admin_get_transactions_with_my_revendeur: {str(se)}\n{traceback.format_exc()}")
+        logger.error("Database error in admin_get_transactions_with_my_revendeur: %s", se, exc_info=True)
         return jsonify({"error": f"Database error occurred: {str(se)}"}), 500
     except Exception as e:
-        logger.error(f"Error in admin_get_transactions_with_my_revendeur: {str(e)}\n{traceback.format_exc()}")
+        logger.error("Error in admin_get_transactions_with_my_revendeur: %s", e, exc_info=True)
         return jsonify({"error": "An unexpected error occurred while fetching transactions"}), 500
 
 @transactions_bp.route('/get_filter_options', methods=['GET'])
 @jwt_required()
+@db_routing.read_replica
 def get_filter_options():
     try:
         user_id = get_jwt_identity()
         user = User.query.get(user_id)
         if not user or user.role not in ['manager', 'admin', 'admin_boss', 'revendeur']:
-            logger.warning(f"Access denied for user_id={user_id}, role={user.role if user else 'None'}")
+            logger.warning("Access denied for user_id=%s, role=%s", user_id, user.role if user else 'None')
             return jsonify({"error": "Access denied"}), 403
 
         # For all roles, fetch all users involved in transactions (as sender or receiver)
@@ -904,10 +949,10 @@ def get_filter_options():
         logger.debug("Returning filter options")
         return jsonify(response), 200
     except SQLAlchemyError as se:
-        logger.error(f"Database error in get_filter_options: {str(se)}\n{traceback.format_exc()}")
+        logger.error("Database error in get_filter_options: %s", se, exc_info=True)
         return jsonify({"error": f"Database error occurred: {str(se)}"}), 500
     except Exception as e:
-        logger.error(f"Unexpected error in get_filter_options: {str(e)}\n{traceback.format_exc()}")
+        logger.error("Unexpected error in get_filter_options: %s", e, exc_info=True)
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
     
 @transactions_bp.route('/add_tranche', methods=['POST'])
@@ -966,5 +1011,5 @@ def add_tranche():
             "remaining_amount_unapplied": remaining
         }), 200
     except Exception as e:
-        logger.error(f"Error in add_tranche: {str(e)}\n{traceback.format_exc()}")
+        logger.error("Error in add_tranche: %s", e, exc_info=True)
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
\ No newline at end of file
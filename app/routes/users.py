@@ -8,6 +8,7 @@ from ..models.user import User
 from werkzeug.utils import secure_filename
 import os
 from ..utils.socket_state import connected_users
+from ..utils import pending_counters, socket_guard, loading_profiles, serializers, media_store, metrics
 from ..models.transaction_paye import TransactionPaye
 from ..models.transaction_impaye import TransactionImpaye
 from datetime import datetime
@@ -16,17 +17,8 @@ from sqlalchemy import or_
 
 users_bp = Blueprint('users', __name__, url_prefix='/users')
 
-def save_user_photo(file, user_id):
-    folder = os.path.join(current_app.root_path, 'static', 'users_photos')
-    os.makedirs(folder, exist_ok=True)
-    filename = f"{user_id}.png"
-    save_path = os.path.join(folder, filename)
-
-    if os.path.exists(save_path):
-        os.remove(save_path)
-    file.save(save_path)
-
-    return os.path.relpath(save_path, current_app.root_path)
+def save_user_photo(file):
+    return media_store.save(file)
 
 def emit_user_updated(user, exclude_user_id=None):
     """Helper function to emit user_updated event to relevant users."""
@@ -42,6 +34,7 @@ def emit_user_updated(user, exclude_user_id=None):
         'etat': user.etat,
         'responsable': user.responsable
     }
+    socket_guard.invalidate('get_user_data', str(user.id))
 
     # Notify the user
     sid = connected_users.get(str(user.id))
@@ -72,12 +65,12 @@ def emit_user_updated(user, exclude_user_id=None):
 # ===================== SOCKET EVENTS ===================== #
 
 @socketio.on('get_user_data')
+@socket_guard.guarded('get_user_data', key=lambda data: str(data.get('user_id')))
 def socket_get_user_data(data):
     user_id = data.get('user_id')
     user = User.query.get(user_id)
     if not user:
-        socketio.emit('user_data_error', {'error': 'User not found'}, room=request.sid)
-        return
+        return [('user_data_error', {'error': 'User not found'})]
 
     user_data = {
         'id': user.id,
@@ -91,7 +84,7 @@ def socket_get_user_data(data):
         'etat': user.etat,
         'responsable': user.responsable
     }
-    socketio.emit('user_data', {'user_id': user_id, 'data': user_data}, room=request.sid)
+    return [('user_data', {'user_id': user_id, 'data': user_data})]
 
 
 # ===================== ADD Admin_boss ===================== #
@@ -203,12 +196,10 @@ def add_admin_boss():
         admin_boss_privilege=privileges
     )
     new_admin_boss.set_password(password)
-    db.session.add(new_admin_boss)
-    db.session.flush()
-
+    # Stored before anything is written, so a rejected upload leaves no row behind
     if photo_file and photo_file.filename:
-        new_admin_boss.photo = save_user_photo(photo_file, new_admin_boss.id)
-
+        new_admin_boss.photo = save_user_photo(photo_file)
+    db.session.add(new_admin_boss)
     db.session.commit()
 
     return jsonify(new_admin_boss.to_dict()), 201
@@ -241,19 +232,15 @@ def add_manager():
         photo="default.png"
     )
     new_manager.set_password(password)
-    db.session.add(new_manager)
-    db.session.flush()
-
+    # Stored before anything is written, so a rejected upload leaves no row behind
     if photo_file and photo_file.filename:
-        new_manager.photo = save_user_photo(photo_file, new_manager.id)
-
+        new_manager.photo = save_user_photo(photo_file)
+    db.session.add(new_manager)
     db.session.commit()
     return jsonify(new_manager.to_dict()), 201
 
 @users_bp.route('/add_admin', methods=['POST'])
 def add_admin():
-    from ..routes.visible_items import assign_all_visible_items_to_user
-
     nom = request.form.get('nom')
     email = request.form.get('email')
     telephone = request.form.get('telephone')
@@ -278,22 +265,16 @@ def add_admin():
         photo="default.png"
     )
     new_admin.set_password(password)
-    db.session.add(new_admin)
-    db.session.flush()
-
+    # Stored before anything is written, so a rejected upload leaves no row behind
     if photo_file and photo_file.filename:
-        new_admin.photo = save_user_photo(photo_file, new_admin.id)
-
+        new_admin.photo = save_user_photo(photo_file)
+    db.session.add(new_admin)
     db.session.commit()
 
-    assign_all_visible_items_to_user(new_admin.id)
-
     return jsonify(new_admin.to_dict()), 201
 
 @users_bp.route('/add_revendeur', methods=['POST'])
 def add_revendeur():
-    from ..routes.visible_items import assign_all_visible_items_to_user
-
     nom = request.form.get('nom')
     email = request.form.get('email')
     telephone = request.form.get('telephone')
@@ -323,16 +304,12 @@ def add_revendeur():
         photo="default.png"
     )
     new_revendeur.set_password(password)
-    db.session.add(new_revendeur)
-    db.session.flush()
-
+    # Stored before anything is written, so a rejected upload leaves no row behind
     if photo_file and photo_file.filename:
-        new_revendeur.photo = save_user_photo(photo_file, new_revendeur.id)
-
+        new_revendeur.photo = save_user_photo(photo_file)
+    db.session.add(new_revendeur)
     db.session.commit()
 
-    assign_all_visible_items_to_user(new_revendeur.id)
-
     return jsonify(new_revendeur.to_dict()), 201
 
 # ===================== GET USERS ===================== #
@@ -366,23 +343,13 @@ def get_admins():
         )
 
     if page is None and per_page is None:
-        admins = query.order_by(User.id.desc()).all()
+        admins = serializers.ADMIN.fetch(query.order_by(User.id.desc()))
         return jsonify({
             "page": 1,
             "per_page": len(admins),
             "total": len(admins),
             "pages": 1,
-            "admins": [{
-                "id": admin.id,
-                "photo": admin.photo,
-                "nom": admin.nom,
-                "email": admin.email,
-                "telephone": admin.telephone,
-                "niveau": admin.niveau,
-                "role": admin.role,
-                "etat": admin.etat,
-                "solde": float(admin.solde)
-            } for admin in admins]
+            "admins": admins
         }), 200
 
     per_page = per_page or 20
@@ -449,6 +416,7 @@ def get_revendeurs():
             )
         )
 
+    query = query.options(*loading_profiles.load('user_with_responsable'))
     paginated = query.order_by(User.id.desc()).paginate(page=page, per_page=per_page, error_out=False)
     revendeurs = paginated.items
 
@@ -460,7 +428,7 @@ def get_revendeurs():
         "revendeurs": [{
             "id": r.id,
             "photo": r.photo,
-            "admin": User.query.get(r.responsable).nom if r.responsable else None,
+            "admin": r.responsable_user.nom if r.responsable_user else None,
             "nom": r.nom,
             "email": r.email,
             "telephone": r.telephone,
@@ -505,7 +473,7 @@ def update_manager(manager_id):
         manager.set_password(password)
 
     if photo_file and photo_file.filename:
-        manager.photo = save_user_photo(photo_file, manager.id)
+        manager.photo = save_user_photo(photo_file)
 
     db.session.commit()
     emit_user_updated(manager, exclude_user_id=current_user.id)
@@ -550,7 +518,7 @@ def update_admin(admin_id):
         admin.set_password(password)
 
     if photo_file and photo_file.filename:
-        admin.photo = save_user_photo(photo_file, admin.id)
+        admin.photo = save_user_photo(photo_file)
 
     db.session.commit()
     emit_user_updated(admin, exclude_user_id=current_user.id)
@@ -638,7 +606,7 @@ def update_admin_boss(id):
         admin_boss.admin_boss_privilege = privileges
 
     if photo_file and photo_file.filename:
-        admin_boss.photo = save_user_photo(photo_file, admin_boss.id)
+        admin_boss.photo = save_user_photo(photo_file)
 
     db.session.commit()
     return jsonify(admin_boss.to_dict()), 200
@@ -688,10 +656,12 @@ def update_revendeur(revendeur_id):
         admin = User.query.get(admin_id)
         if not admin or admin.role != 'admin':
             return jsonify({"error": "Admin not found or invalid role"}), 400
+        old_responsable = revendeur.responsable
         revendeur.responsable = admin_id
+        pending_counters.requester_moved(revendeur, old_responsable)
 
     if photo_file and photo_file.filename:
-        revendeur.photo = save_user_photo(photo_file, revendeur.id)
+        revendeur.photo = save_user_photo(photo_file)
 
     db.session.commit()
     emit_user_updated(revendeur, exclude_user_id=current_user.id)
@@ -802,6 +772,9 @@ def update_solde(user_id):
         print(f"Échec de la validation de la base de données pour l'utilisateur {user_id}: {str(e)}")
         return jsonify({"error": "Erreur de base de données."}), 500
 
+    if montant > 0:
+        metrics.count('topups')
+        metrics.count('topup_amount', float(montant))
     emit_user_updated(target_user, exclude_user_id=current_user.id)
     if current_user.role == "admin":
         emit_user_updated(current_user, exclude_user_id=current_user.id)  # Emit for admin
@@ -836,7 +809,9 @@ def switch_revendeur_responsable():
     if not new_admin or new_admin.role != 'admin':
         return jsonify({"error": "New admin not found or invalid role."}), 404
 
+    old_responsable = revendeur.responsable
     revendeur.responsable = new_admin_id
+    pending_counters.requester_moved(revendeur, old_responsable)
     db.session.commit()
 
     emit_user_updated(revendeur, exclude_user_id=current_user.id)
@@ -1,47 +1,80 @@
 # -*- coding: utf-8 -*-
+from datetime import datetime
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from .. import db, socketio
-from ..models.visible_item import VisibleItem, ItemType
+from ..models.visible_item import ItemType, VisibleItem
+from ..models.hidden_item import HiddenItem
 from ..models.user import User
 from ..utils.socket_state import connected_users
-from ..models.product import Produit
+from ..utils import visibility_state, socket_guard
 from ..models.category import Category
 from ..models.sous_category import SousCategory
 from ..models.boutique import Boutique
-from ..models.article import Article
 from ..models.application import Application
 
 visible_bp = Blueprint('visible_items', __name__, url_prefix='/visible_items')
 
-def assign_all_visible_items_to_user(user_id):
-    items = []
-    items += [(p.id, ItemType.product) for p in Produit.query.all()]
-    items += [(c.id, ItemType.category) for c in Category.query.all()]
-    items += [(s.id, ItemType.sous_category) for s in SousCategory.query.all()]
-    items += [(b.id, ItemType.boutique) for b in Boutique.query.all()]
-    items += [(a.id, ItemType.article) for a in Article.query.all()]
-    items += [(app.id, ItemType.application) for app in Application.query.all()]
-
-    for item_id, item_type in items:
-        db.session.add(VisibleItem(user_id=user_id, item_id=item_id, item_type=item_type))
-    db.session.commit()
+# Catalog types whose visibility managers can restrict
+VISIBILITY_MODELS = {
+    ItemType.category: Category,
+    ItemType.sous_category: SousCategory,
+    ItemType.boutique: Boutique,
+    ItemType.application: Application,
+}
+
+def get_hidden_pairs(user_id):
+    """
+    Return the items hidden from the user as a set of (item_type, item_id) pairs.
+    Everything else in the catalog is visible to them.
+    """
+    rows = db.session.query(HiddenItem.item_type, HiddenItem.item_id).filter_by(user_id=user_id).all()
+    return {(item_type.value, item_id) for item_type, item_id in rows}
+
+# Rows per INSERT / IN (...) statement when writing exclusions in bulk
+BULK_CHUNK_SIZE = 1000
+
+def _chunks(values):
+    values = sorted(values)
+    for start in range(0, len(values), BULK_CHUNK_SIZE):
+        yield values[start:start + BULK_CHUNK_SIZE]
+
+def hide_items(user_id, item_type, item_ids):
+    """Hide items from the user with chunked INSERT IGNORE; rows that already exist are skipped by the unique index."""
+    now = datetime.utcnow()
+    for chunk in _chunks(set(item_ids)):
+        db.session.execute(
+            HiddenItem.__table__.insert().prefix_with('IGNORE', dialect='mysql'),
+            [{"user_id": user_id, "item_type": item_type.name, "item_id": item_id, "created_at": now} for item_id in chunk]
+        )
+    socket_guard.invalidate('get_visible_items')
+
+def unhide_items(user_id, item_type, item_ids):
+    table = HiddenItem.__table__
+    for chunk in _chunks(set(item_ids)):
+        db.session.execute(table.delete().where(
+            table.c.user_id == user_id,
+            table.c.item_type == item_type.name,
+            table.c.item_id.in_(chunk)
+        ))
+    socket_guard.invalidate('get_visible_items')
+
+def replace_hidden_items(user_id, item_type, hidden_ids):
+    """Make exactly `hidden_ids` hidden from the user for this item type, touching only the rows that change."""
+    hidden_ids = set(hidden_ids)
+    current = {
+        item_id for (item_id,) in
+        db.session.query(HiddenItem.item_id).filter_by(user_id=user_id, item_type=item_type).all()
+    }
+    unhide_items(user_id, item_type, current - hidden_ids)
+    hide_items(user_id, item_type, hidden_ids - current)
+
+def forget_catalog_item(item_type, item_id):
+    """Drop the exclusions of a deleted catalog item."""
+    HiddenItem.query.filter_by(item_type=item_type, item_id=item_id).delete()
 
 def get_grouped_visible_items(user_id):
-    # Fetch all visible items for the user and organize them by type
-    visible_items = VisibleItem.query.filter_by(user_id=user_id).all()
-    
-    # Create a dictionary of sets for each item type
-    visible_items_by_type = {
-        ItemType.category: set(),
-        ItemType.sous_category: set(),
-        ItemType.boutique: set(),
-        ItemType.application: set()
-    }
-    
-    for item in visible_items:
-        if item.item_type in visible_items_by_type:
-            visible_items_by_type[item.item_type].add(item.item_id)
+    hidden = get_hidden_pairs(user_id)
 
     grouped = {
         'category': [],
@@ -55,19 +88,19 @@ def get_grouped_visible_items(user_id):
         grouped['category'].append({
             'id': category.id,
             'nom': category.nom,
-            'selected': category.id in visible_items_by_type[ItemType.category]
+            'selected': ('category', category.id) not in hidden
         })
 
     # Sous Categories
+    category_names = {c['id']: c['nom'] for c in grouped['category']}
     for sous_category in SousCategory.query.all():
-        category = Category.query.get(sous_category.category_id)
-        category_name = category.nom if category else "Unknown Category"
+        category_name = category_names.get(sous_category.category_id, "Unknown Category")
         grouped['sous_category'].append({
             'id': sous_category.id,
             'name': sous_category.name,
             'category_id': sous_category.category_id,
             'category_name': category_name,
-            'selected': sous_category.id in visible_items_by_type[ItemType.sous_category]
+            'selected': ('sous_category', sous_category.id) not in hidden
         })
 
     # Boutiques
@@ -75,7 +108,7 @@ def get_grouped_visible_items(user_id):
         grouped['boutique'].append({
             'id': boutique.id,
             'nom': boutique.nom,
-            'selected': boutique.id in visible_items_by_type[ItemType.boutique]
+            'selected': ('boutique', boutique.id) not in hidden
         })
 
     # Applications
@@ -83,110 +116,158 @@ def get_grouped_visible_items(user_id):
         grouped['application'].append({
             'id': application.id,
             'nom': application.nom,
-            'selected': application.id in visible_items_by_type[ItemType.application]
+            'selected': ('application', application.id) not in hidden
         })
 
     return grouped
 
+def group_pairs(pairs):
+    grouped = {}
+    for item_type, item_id in sorted(pairs):
+        grouped.setdefault(item_type, []).append(item_id)
+    return grouped
+
 # ===================== SOCKET FUNCTIONS ===================== #
 
-def emit_visible_items_updated(user_id, exclude_user_id=None):
-    user = User.query.get(user_id)
-    if not user:
+def emit_visible_items_delta(user_id, hidden_before, hidden_after, exclude_user_id=None):
+    """
+    Push only what changed between two sets of hidden pairs.
+    Clients apply the delta when base_version matches the version they hold,
+    otherwise they ask for a snapshot with get_visible_items.
+    """
+    added = hidden_before - hidden_after
+    removed = hidden_after - hidden_before
+    if not added and not removed:
         return
 
     try:
-        grouped_items = get_grouped_visible_items(user_id)
+        base_version, version = visibility_state.record_change(user_id, added, removed)
+        socket_guard.invalidate('get_visible_items')
         data = {
             "user_id": user_id,
-            "items": grouped_items
+            "base_version": base_version,
+            "version": version,
+            "added": group_pairs(added),
+            "removed": group_pairs(removed)
         }
 
         sid = connected_users.get(str(user_id))
         if sid:
-            socketio.emit('visible_items_updated', data, room=sid)
-            print(f"Emitted visible_items_updated to user {user_id} with SID {sid}")
+            socketio.emit('visible_items_delta', data, room=sid)
 
         managers = User.query.filter_by(role='manager').all()
         for manager in managers:
             if manager.id != exclude_user_id:
                 sid = connected_users.get(str(manager.id))
                 if sid:
-                    socketio.emit('visible_items_updated', data, room=sid)
-                    print(f"Emitted visible_items_updated to manager {manager.id} with SID {sid}")
+                    socketio.emit('visible_items_delta', data, room=sid)
     except Exception as e:
-        print(f"Error in emit_visible_items_updated for user {user_id}: {str(e)}")
+        print(f"Error in emit_visible_items_delta for user {user_id}: {str(e)}")
 
 # ===================== SOCKET EVENTS ===================== #
 
 @socketio.on('get_visible_items')
+@socket_guard.guarded('get_visible_items', key=lambda data: (
+    str(data.get('user_id')), str(data.get('current_user_id')), data.get('version')
+))
 def socket_get_visible_items(data):
     user_id = data.get('user_id')
     current_user_id = data.get('current_user_id')
+    known_version = data.get('version')
     user = User.query.get(user_id)
     current_user = User.query.get(current_user_id) if current_user_id else None
 
     if not user:
-        socketio.emit('visible_items_error', {'error': 'User not found'}, room=request.sid)
-        return
+        return [('visible_items_error', {'error': 'User not found'})]
 
     if current_user and current_user.id != user_id and current_user.role != 'manager':
-        socketio.emit('visible_items_error', {'error': 'Unauthorized'}, room=request.sid)
-        return
+        return [('visible_items_error', {'error': 'Unauthorized'})]
 
     try:
+        # Client already has a version: send what changed since then if we still know it
+        if known_version:
+            delta = visibility_state.changes_since(user_id, known_version)
+            if delta is not None:
+                added, removed = delta
+                return [('visible_items_delta', {
+                    'user_id': user_id,
+                    'base_version': known_version,
+                    'version': visibility_state.current_version(user_id),
+                    'added': group_pairs(added),
+                    'removed': group_pairs(removed)
+                })]
+
         grouped_items = get_grouped_visible_items(user_id)
-        socketio.emit('visible_items_updated', {
+        return [('visible_items_updated', {
             'user_id': user_id,
+            'version': visibility_state.current_version(user_id),
             'items': grouped_items
-        }, room=request.sid)
-        print(f"Emitted visible_items_updated to SID {request.sid} for user {user_id}")
+        })]
     except Exception as e:
-        socketio.emit('visible_items_error', {'error': f"Failed to fetch visible items: {str(e)}"}, room=request.sid)
         print(f"Error in socket_get_visible_items for user {user_id}: {str(e)}")
+        return [('visible_items_error', {'error': f"Failed to fetch visible items: {str(e)}"})]
 
 # ===================== HTTP ENDPOINTS ===================== #
 
-@visible_bp.route('/add', methods=['POST'])
-@jwt_required()
-def add_visible_item():
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
-    if current_user.role != "manager":
-        return jsonify({"error": "Only managers can assign visibility."}), 403
-
-    user_id = request.json.get('user_id')
-    item_id = request.json.get('item_id')
-    item_type = request.json.get('item_type')
+def _parse_item(data):
+    """Validate user_id / item_id / item_type from a request body. Returns (user, item_type, item_id, error)."""
+    user_id = data.get('user_id')
+    item_id = data.get('item_id')
+    item_type = data.get('item_type')
 
     if not all([user_id, item_id, item_type]):
-        return jsonify({"error": "Missing required fields."}), 400
+        return None, None, None, (jsonify({"error": "Missing required fields."}), 400)
 
     try:
         item_type_enum = ItemType(item_type)
     except ValueError:
-        return jsonify({"error": "Invalid item type."}), 400
+        return None, None, None, (jsonify({"error": "Invalid item type."}), 400)
+    if item_type_enum not in VISIBILITY_MODELS:
+        return None, None, None, (jsonify({"error": "Visibility cannot be set for this item type."}), 400)
 
     user = User.query.get(user_id)
     if not user:
-        return jsonify({"error": "User not found."}), 404
+        return None, None, None, (jsonify({"error": "User not found."}), 404)
 
     try:
         item_id = int(item_id)  # Ensure item_id is an integer
     except (ValueError, TypeError):
-        return jsonify({"error": "Invalid item_id, must be an integer."}), 400
-
-    new_visible = VisibleItem(
-        user_id=user_id,
-        item_id=item_id,
-        item_type=item_type_enum
-    )
-    db.session.add(new_visible)
+        return None, None, None, (jsonify({"error": "Invalid item_id, must be an integer."}), 400)
+
+    return user, item_type_enum, item_id, None
+
+def _ids(values):
+    ids = set()
+    for value in values or []:
+        try:
+            ids.add(int(value))
+        except (ValueError, TypeError):
+            continue
+    return ids
+
+@visible_bp.route('/add', methods=['POST'])
+@jwt_required()
+def add_visible_item():
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    if current_user.role != "manager":
+        return jsonify({"error": "Only managers can assign visibility."}), 403
+
+    user, item_type_enum, item_id, error = _parse_item(request.json or {})
+    if error:
+        return error
+
+    before = get_hidden_pairs(user.id)
+    unhide_items(user.id, item_type_enum, [item_id])
     db.session.commit()
 
-    emit_visible_items_updated(user_id, exclude_user_id=current_user_id)
+    emit_visible_items_delta(user.id, before, before - {(item_type_enum.value, item_id)}, exclude_user_id=current_user_id)
 
-    return jsonify({"message": "Visibility assigned", "data": new_visible.to_dict()}), 201
+    return jsonify({"message": "Visibility assigned", "data": {
+        "user_id": user.id,
+        "item_id": item_id,
+        "item_type": item_type_enum.value
+    }}), 201
 
 @visible_bp.route('/get_visible_items/<int:user_id>', methods=['GET'])
 @jwt_required()
@@ -205,15 +286,31 @@ def get_visible_items(user_id):
         grouped = get_grouped_visible_items(user_id)
         return jsonify({
             "user_id": user_id,
+            "version": visibility_state.current_version(user_id),
             "items": grouped if grouped else {}
         }), 200
     except Exception as e:
         print(f"Error in get_visible_items for user {user_id}: {str(e)}")
         return jsonify({"error": f"Failed to fetch visible items: {str(e)}"}), 500
 
+@visible_bp.route('/delete', methods=['DELETE'])
+@jwt_required()
+def delete_visible_item():
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    if current_user.role != "manager":
+        return jsonify({"error": "Only managers can delete visibility."}), 403
+
+    user, item_type_enum, item_id, error = _parse_item(request.get_json() or {})
+    if error:
+        return error
+
+    return _hide_item(user, item_type_enum, item_id, current_user_id)
+
 @visible_bp.route('/delete/<int:visible_id>', methods=['DELETE'])
 @jwt_required()
-def delete_visible_item(visible_id):
+def delete_visible_item_by_id(visible_id):
+    """Former route, kept for older clients: visible_id is a row of the legacy visible_items table."""
     current_user_id = get_jwt_identity()
     current_user = User.query.get(current_user_id)
     if current_user.role != "manager":
@@ -222,12 +319,19 @@ def delete_visible_item(visible_id):
     item = VisibleItem.query.get(visible_id)
     if not item:
         return jsonify({"error": "Item not found."}), 404
+    if item.item_type not in VISIBILITY_MODELS:
+        return jsonify({"error": "Visibility cannot be set for this item type."}), 400
 
-    user_id = item.user_id
-    db.session.delete(item)
-    db.session.commit()
+    user = User.query.get(item.user_id)
+    return _hide_item(user, item.item_type, item.item_id, current_user_id)
 
-    emit_visible_items_updated(user_id, exclude_user_id=current_user_id)
+def _hide_item(user, item_type_enum, item_id, current_user_id):
+    before = get_hidden_pairs(user.id)
+    if (item_type_enum.value, item_id) not in before:
+        hide_items(user.id, item_type_enum, [item_id])
+        db.session.commit()
+
+    emit_visible_items_delta(user.id, before, before | {(item_type_enum.value, item_id)}, exclude_user_id=current_user_id)
 
     return jsonify({"message": "Visibility removed."}), 200
 
@@ -255,19 +359,25 @@ def add_visible_items_bulk():
         item_type_enum = ItemType(item_type)
     except ValueError:
         return jsonify({"error": "Invalid item type."}), 400
+    if item_type_enum not in VISIBILITY_MODELS:
+        return jsonify({"error": "Visibility cannot be set for this item type."}), 400
 
-    db.session.query(VisibleItem).filter_by(user_id=user_id, item_type=item_type).delete()
-
+    visible_ids = set()
     for item_id in item_ids:
         try:
-            item_id = int(item_id)  # Ensure item_id is an integer
-            db.session.add(VisibleItem(user_id=user_id, item_type=item_type_enum, item_id=item_id))
+            visible_ids.add(int(item_id))  # Ensure item_id is an integer
         except (ValueError, TypeError):
             print(f"Skipping invalid item_id {item_id} for user {user_id} and type {item_type}")
             continue
 
+    # Everything of this type that was not selected becomes hidden
+    model = VISIBILITY_MODELS[item_type_enum]
+    all_ids = {row.id for row in db.session.query(model.id).all()}
+
+    before = get_hidden_pairs(user_id)
+    replace_hidden_items(user_id, item_type_enum, all_ids - visible_ids)
     db.session.commit()
-    emit_visible_items_updated(user_id, exclude_user_id=current_user_id)
+    emit_visible_items_delta(user_id, before, get_hidden_pairs(user_id), exclude_user_id=current_user_id)
 
     return jsonify({"message": "Visible items updated successfully"}), 201
 
@@ -291,57 +401,35 @@ def set_bulk_visible_items():
         return jsonify({"error": "User not found."}), 404
 
     try:
-        # First delete all existing visible items for this user
-        VisibleItem.query.filter_by(user_id=user_id).delete()
-
-        # Prepare lists for each item type
-        selected_categories = items.get('category', [])
-        selected_sous_categories = items.get('sous_category', [])
-        selected_boutiques = items.get('boutique', [])
-        selected_applications = items.get('application', [])
-
-        # Add categories
-        for cat_id in selected_categories:
-            if Category.query.get(cat_id):  # Only add if category exists
-                db.session.add(VisibleItem(
-                    user_id=user_id,
-                    item_type=ItemType.category,
-                    item_id=cat_id
-                ))
-
-        # Add sous categories (with basic validation)
-        for sc_id in selected_sous_categories:
-            sc = SousCategory.query.get(sc_id)
-            if sc and sc.category_id in selected_categories:  # Only add if exists and parent category is selected
-                db.session.add(VisibleItem(
-                    user_id=user_id,
-                    item_type=ItemType.sous_category,
-                    item_id=sc_id
-                ))
-
-        # Add boutiques
-        for bout_id in selected_boutiques:
-            if Boutique.query.get(bout_id):  # Only add if boutique exists
-                db.session.add(VisibleItem(
-                    user_id=user_id,
-                    item_type=ItemType.boutique,
-                    item_id=bout_id
-                ))
-
-        # Add applications
-        for app_id in selected_applications:
-            if Application.query.get(app_id):  # Only add if application exists
-                db.session.add(VisibleItem(
-                    user_id=user_id,
-                    item_type=ItemType.application,
-                    item_id=app_id
-                ))
+        before = get_hidden_pairs(user_id)
+
+        selected_categories = _ids(items.get('category', []))
+        selected_boutiques = _ids(items.get('boutique', []))
+        selected_applications = _ids(items.get('application', []))
+        requested_sous_categories = _ids(items.get('sous_category', []))
+
+        # Sous categories are only visible when their parent category is selected
+        sous_category_parents = dict(db.session.query(SousCategory.id, SousCategory.category_id).all())
+        selected_sous_categories = {
+            sc_id for sc_id in requested_sous_categories
+            if sous_category_parents.get(sc_id) in selected_categories
+        }
+
+        all_categories = {row.id for row in db.session.query(Category.id).all()}
+        all_sous_categories = set(sous_category_parents)
+        all_boutiques = {row.id for row in db.session.query(Boutique.id).all()}
+        all_applications = {row.id for row in db.session.query(Application.id).all()}
+
+        replace_hidden_items(user_id, ItemType.category, all_categories - selected_categories)
+        replace_hidden_items(user_id, ItemType.sous_category, all_sous_categories - selected_sous_categories)
+        replace_hidden_items(user_id, ItemType.boutique, all_boutiques - selected_boutiques)
+        replace_hidden_items(user_id, ItemType.application, all_applications - selected_applications)
 
         db.session.commit()
-        emit_visible_items_updated(user_id, exclude_user_id=current_user_id)
+        emit_visible_items_delta(user_id, before, get_hidden_pairs(user_id), exclude_user_id=current_user_id)
         return jsonify({"message": "Visibility settings updated successfully."}), 200
 
     except Exception as e:
         db.session.rollback()
         print(f"Error updating visible items: {str(e)}")
-        return jsonify({"error": f"Failed to update visible items: {str(e)}"}), 500
\ No newline at end of file
+        return jsonify({"error": f"Failed to update visible items: {str(e)}"}), 500
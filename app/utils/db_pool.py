@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Database connection pool: options per process profile, and checkout metrics.
+
+DB_PROFILE names what the process is for:
+- web:   the app server. Sized for concurrent requests and socket handlers, with
+         a short pool_timeout so a saturated pool fails fast instead of queueing
+         every request behind it.
+- jobs:  CLI commands and worker processes (`flask media gc`, imports...). A few
+         connections and a long pool_timeout.
+
+Each option is read from DB_<PROFILE>_<OPTION>, then DB_<OPTION>, then the
+profile default, e.g. DB_WEB_POOL_SIZE=20 or DB_POOL_RECYCLE=280. pool_recycle
+must stay below MySQL's wait_timeout, and pool_pre_ping replaces connections
+the server closed anyway (restart, failover). Options set explicitly in
+SQLALCHEMY_ENGINE_OPTIONS win, and an explicit poolclass or a SQLite URI
+leaves the pool alone.
+
+The pool records how long each checkout waited for a connection and how far it
+went into overflow; stats() returns these counters for this process, so pools
+can be sized against the concurrency they actually see.
+"""
+import os
+import threading
+import time
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+PROFILES = {
+    'web': {
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_timeout': 10,
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+    },
+    'jobs': {
+        'pool_size': 2,
+        'max_overflow': 3,
+        'pool_timeout': 60,
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+    },
+}
+
+# Upper bounds (seconds) of the checkout wait histogram
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+_lock = threading.Lock()
+_stats = {
+    "checkouts": 0,
+    "timeouts": 0,
+    "overflow_checkouts": 0,
+    "overflow_peak": 0,
+    "wait_seconds_total": 0.0,
+    "wait_seconds_max": 0.0,
+    "wait_buckets": [0] * len(WAIT_BUCKETS),
+}
+
+
+def _parse_bool(value):
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+_PARSERS = {
+    'pool_size': int,
+    'max_overflow': int,
+    'pool_timeout': float,
+    'pool_recycle': int,
+    'pool_pre_ping': _parse_bool,
+}
+
+
+def engine_options(profile, environ=os.environ):
+    if profile not in PROFILES:
+        raise ValueError(f"DB_PROFILE must be one of {', '.join(PROFILES)}, got {profile!r}")
+    options = {'poolclass': MeteredQueuePool}
+    for option, default in PROFILES[profile].items():
+        value = environ.get(f"DB_{profile.upper()}_{option.upper()}", environ.get(f"DB_{option.upper()}"))
+        options[option] = _PARSERS[option](value) if value is not None else default
+    return options
+
+
+def _record(wait, pool, timed_out=False):
+    overflow = max(pool.overflow(), 0)
+    with _lock:
+        if timed_out:
+            _stats["timeouts"] += 1
+        else:
+            _stats["checkouts"] += 1
+            if overflow:
+                _stats["overflow_checkouts"] += 1
+        _stats["overflow_peak"] = max(_stats["overflow_peak"], overflow)
+        _stats["wait_seconds_total"] += wait
+        _stats["wait_seconds_max"] = max(_stats["wait_seconds_max"], wait)
+        for i, bound in enumerate(WAIT_BUCKETS):
+            if wait <= bound:
+                _stats["wait_buckets"][i] += 1
+                break
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that times every checkout, including the ones that end in a pool timeout."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            _record(time.perf_counter() - started, self, timed_out=True)
+            raise
+        _record(time.perf_counter() - started, self)
+        return connection
+
+
+def stats(engine=None):
+    """
+    Checkout counters of this process. wait_buckets holds, per WAIT_BUCKETS bound,
+    the checkouts that waited up to that long (not cumulative); longer waits are
+    only counted in the totals. With an engine, adds the current state of its pool.
+    """
+    with _lock:
+        snapshot = dict(_stats, wait_buckets=dict(zip(WAIT_BUCKETS, _stats["wait_buckets"])))
+    pool = getattr(engine, 'pool', None)
+    if isinstance(pool, QueuePool):
+        snapshot.update({
+            "pool_size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": pool._max_overflow,
+        })
+    return snapshot
+
+
+def init_db_pool(app):
+    profile = app.config['DB_PROFILE']
+    options = engine_options(profile)
+    configured = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if 'poolclass' in configured or app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        return
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**options, **configured}
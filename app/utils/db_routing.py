@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Read-replica routing for heavy read-only endpoints.
+
+With DATABASE_REPLICA_URL set, the replica is registered as the 'replica'
+bind (same pool options as the primary) and views decorated with
+read_replica send their SELECTs there:
+
+    @statistics_bp.route('/user/<int:user_id>/statistics', methods=['GET'])
+    @db_routing.read_replica
+    def get_user_statistics(user_id): ...
+
+Everything else stays on the primary: writes, SELECT ... FOR UPDATE,
+session.connection(), reads that follow a write in the same request, and
+every request of a user who wrote something in the last
+REPLICA_READ_YOUR_WRITES_SECONDS seconds (read-your-writes: a lagging replica
+must not hide a purchase or a top-up from the user who just made it). The
+user is the JWT identity: views without @jwt_required() still read a token
+when the client sends one, so the guard holds for them too. Requests without
+a valid token read from the replica.
+
+Recent writers are remembered in the memory of the process, like the
+Socket.IO connections, so the guard holds as long as one user's requests
+reach the same process. Without DATABASE_REPLICA_URL the decorator does
+nothing.
+"""
+import functools
+import threading
+import time
+from flask import current_app, g, has_request_context
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt import PyJWTError
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import Select, event
+
+REPLICA_BIND = 'replica'
+
+# Writers older than the guard window are purged once the map grows past this size
+WRITERS_PURGE_SIZE = 5000
+
+_lock = threading.Lock()
+_last_write = {}  # user id -> monotonic time of their last write
+
+
+def _current_user_id():
+    try:
+        return get_jwt_identity()
+    except RuntimeError:  # the view does not verify a token: read it if one was sent
+        pass
+    try:
+        verify_jwt_in_request(optional=True)
+    except (JWTExtendedException, PyJWTError):
+        return None
+    return get_jwt_identity()
+
+
+def wrote_recently(user_id):
+    if user_id is None:
+        return False
+    window = current_app.config['REPLICA_READ_YOUR_WRITES_SECONDS']
+    with _lock:
+        last = _last_write.get(str(user_id))
+    return last is not None and time.monotonic() - last < window
+
+
+def _remember_write(user_id):
+    now = time.monotonic()
+    window = current_app.config['REPLICA_READ_YOUR_WRITES_SECONDS']
+    with _lock:
+        _last_write[str(user_id)] = now
+        if len(_last_write) > WRITERS_PURGE_SIZE:
+            for key in [k for k, t in _last_write.items() if now - t >= window]:
+                del _last_write[key]
+
+
+def read_replica(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if REPLICA_BIND in current_app.config['SQLALCHEMY_BINDS'] and not wrote_recently(_current_user_id()):
+            g.db_read_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+class RoutingSession(FlaskSession):
+    """Sends the SELECTs of read_replica views to the replica bind, everything else to the primary."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and isinstance(clause, Select) and clause._for_update_arg is None
+                and not self._flushing and has_request_context()
+                and g.get('db_read_replica') and not g.get('db_wrote')):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _mark_write():
+    if has_request_context():
+        g.db_wrote = True
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_flush(session, flush_context):
+    _mark_write()
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _mark_bulk_write(orm_execute_state):
+    if not orm_execute_state.is_select:
+        _mark_write()
+
+
+def _after_request(response):
+    if g.get('db_wrote'):
+        user_id = _current_user_id()
+        if user_id is not None:
+            _remember_write(user_id)
+    return response
+
+
+def init_db_routing(app):
+    """Registers the replica bind; call before db.init_app(app)."""
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    url = app.config.get('DATABASE_REPLICA_URL')
+    if url:
+        binds.setdefault(REPLICA_BIND, url)
+    app.config['SQLALCHEMY_BINDS'] = binds
+    app.after_request(_after_request)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Streamed CSV / XLSX exports of list endpoints.
+
+    return exports.response(serializers.HISTORIQUE, query, 'historique', 'csv')
+
+The query runs once, through a server-side cursor (yield_per / stream_results),
+and rows are formatted by a serializers.Projection EXPORT_CHUNK_SIZE at a time,
+so memory stays flat whatever the number of rows:
+
+- csv:  every chunk is sent as soon as it is read (chunked transfer encoding).
+        UTF-8 with a BOM so Excel shows accents correctly.
+- xlsx: xlsxwriter in constant_memory mode writes each row straight to a
+        temporary file; the finished workbook is then streamed from disk and
+        removed. An XLSX file is a zip archive, so its first byte can only be
+        sent once the last row is written. Sheets roll over at Excel's row limit.
+"""
+import csv
+import io
+import os
+import tempfile
+from datetime import datetime
+from flask import current_app, stream_with_context
+
+try:
+    import xlsxwriter
+except ImportError:  # optional dependency
+    xlsxwriter = None
+
+XLSX_MAX_ROWS = 1048576
+FILE_BLOCK_SIZE = 64 * 1024
+
+# Spreadsheets run a CSV cell starting with one of these as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def formats():
+    return ('csv', 'xlsx') if xlsxwriter is not None else ('csv',)
+
+
+def allowed(user, privilege):
+    """admin_boss accounts need the imprimer_* privilege; other roles keep the scope of the list endpoint."""
+    return user.role != 'admin_boss' or privilege in (user.admin_boss_privilege or [])
+
+
+def _csv_cell(value):
+    """Exported text is data: quote it with a leading ' when a spreadsheet would evaluate it."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _csv(keys, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(keys)
+    for chunk in chunks:
+        writer.writerows([_csv_cell(value) for value in values] for values in chunk)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _xlsx(keys, chunks, title):
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        workbook = xlsxwriter.Workbook(path, {
+            'constant_memory': True,
+            # Exported text is data: never turn '=...' into formulas or count URLs against the sheet limit
+            'strings_to_formulas': False,
+            'strings_to_urls': False,
+        })
+        sheets = 0
+        row = XLSX_MAX_ROWS
+        for chunk in chunks:
+            for values in chunk:
+                if row == XLSX_MAX_ROWS:
+                    sheets += 1
+                    sheet = workbook.add_worksheet(title if sheets == 1 else f"{title} ({sheets})")
+                    sheet.write_row(0, 0, keys)
+                    row = 1
+                sheet.write_row(row, 0, values)
+                row += 1
+        if not sheets:
+            workbook.add_worksheet(title).write_row(0, 0, keys)
+        workbook.close()
+
+        with open(path, 'rb') as f:
+            block = f.read(FILE_BLOCK_SIZE)
+            while block:
+                yield block
+                block = f.read(FILE_BLOCK_SIZE)
+    finally:
+        os.remove(path)
+
+
+def response(projection, query, name, fmt):
+    """Streamed attachment of the projected rows of query; fmt must be one of formats()."""
+    chunks = projection.stream(query, current_app.config['EXPORT_CHUNK_SIZE'])
+    if fmt == 'xlsx':
+        body = _xlsx(projection.keys, chunks, name[:31])
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    else:
+        body = _csv(projection.keys, chunks)
+        mimetype = 'text/csv'
+
+    response = current_app.response_class(stream_with_context(body), mimetype=mimetype)
+    filename = f"{name}-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}"
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'no-store'
+    # Let nginx pass the chunks through instead of buffering the whole file
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
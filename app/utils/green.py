@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+CPU-bound calls from green threads.
+
+Under the eventlet worker every request is a green thread of one OS thread, so
+a call that never does I/O (hashing a password is tens of milliseconds of
+scrypt / pbkdf2) stalls all other requests and socket connections of the
+worker until it returns. offload() runs such calls in eventlet's pool of
+native threads (tpool) when the process is monkey-patched; hashlib releases
+the GIL, so they really run in parallel. Elsewhere (flask CLI, sync workers)
+the call runs directly.
+
+    offload(generate_password_hash, password)
+"""
+try:
+    from eventlet import patcher, tpool
+except ImportError:  # optional dependency
+    patcher = tpool = None
+
+
+def is_green():
+    return patcher is not None and patcher.is_monkey_patched('thread')
+
+
+def offload(fn, *args, **kwargs):
+    if is_green():
+        return tpool.execute(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
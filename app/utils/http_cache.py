@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Conditional GET and response compression for the catalog endpoints.
+
+    @categories_bp.route('/get_category', methods=['GET'])
+    @http_cache.versioned(Category)
+    def get_all_categories(): ...
+
+versioned() builds a weak ETag from the table_versions counters of the tables
+the response is made of (app/utils/table_versions.py). When the client's
+If-None-Match still matches, the view is not run: the request costs one
+primary-key lookup on table_versions and returns 304. ETags only need to be
+unique per URL, so the query string does not have to be part of them.
+
+init_compression(app) compresses JSON bodies above COMPRESS_MIN_SIZE bytes
+with brotli (when installed and accepted by the client) or gzip.
+"""
+import gzip
+import threading
+from functools import wraps
+from flask import current_app, make_response, request
+from . import table_versions
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}  # 304 answers / views run
+
+
+def versioned(*models):
+    tables = tuple(model.__tablename__ for model in models)
+    table_versions.watch(*tables)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Read before running the view so a concurrent write can only make the ETag older
+            current = table_versions.versions(tables)
+            etag = current_app.config['HTTP_CACHE_ETAG_PREFIX'] + "-".join(
+                f"{table}.{current[table]}" for table in tables
+            )
+            hit = request.if_none_match.contains_weak(etag)
+            with _lock:
+                _stats["hits" if hit else "misses"] += 1
+            if hit:
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+def stats():
+    with _lock:
+        return dict(_stats)
+
+
+def _compress(response):
+    if (response.status_code != 200 or response.direct_passthrough
+            or response.mimetype != 'application/json'
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    data = response.get_data()
+    if len(data) < current_app.config['COMPRESS_MIN_SIZE']:
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        response.set_data(brotli.compress(data, quality=current_app.config['COMPRESS_BROTLI_QUALITY']))
+        response.headers['Content-Encoding'] = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(data, compresslevel=current_app.config['COMPRESS_GZIP_LEVEL']))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def init_compression(app):
+    app.after_request(_compress)
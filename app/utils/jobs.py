@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Background jobs with progress reporting.
+
+A job is a function run in a Socket.IO background task with its own app
+context. It receives the Job as first argument and reports progress with
+job.progress(done, total); whatever it returns becomes the job result. The
+owner gets a 'job_updated' socket event on every change and can poll the
+job with get(job_id).
+
+Jobs live in memory: they are lost on restart and only visible to the
+process that runs them.
+"""
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app
+from .. import db, socketio
+from .socket_state import connected_users
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs kept for status queries
+MAX_JOBS = 100
+
+_lock = threading.Lock()
+_jobs = OrderedDict()  # job id -> Job
+
+
+class Job:
+    def __init__(self, name, owner_id):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.owner_id = owner_id
+        self.status = 'pending'
+        self.done = 0
+        self.total = None
+        self.result = None
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.finished_at = None
+
+    def progress(self, done, total=None):
+        self.done = done
+        if total is not None:
+            self.total = total
+        self._notify()
+
+    def _notify(self):
+        sid = connected_users.get(str(self.owner_id))
+        if sid:
+            socketio.emit('job_updated', self.to_dict(), room=sid)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "done": self.done,
+            "total": self.total,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            "finished_at": self.finished_at.strftime('%Y-%m-%d %H:%M:%S') if self.finished_at else None
+        }
+
+
+def _run(app, job, fn, args, kwargs):
+    with app.app_context():
+        job.status = 'running'
+        job._notify()
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.status = 'done'
+        except Exception as e:
+            db.session.rollback()
+            logger.exception("Job %s (%s) failed", job.name, job.id)
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            db.session.remove()
+            job.finished_at = datetime.utcnow()
+            job._notify()
+
+
+def start(name, owner_id, fn, *args, **kwargs):
+    """Run fn(job, *args, **kwargs) in the background and return the Job."""
+    job = Job(name, owner_id)
+    with _lock:
+        _jobs[job.id] = job
+        while len(_jobs) > MAX_JOBS:
+            _jobs.popitem(last=False)
+    socketio.start_background_task(_run, current_app._get_current_object(), job, fn, args, kwargs)
+    return job
+
+
+def get(job_id):
+    with _lock:
+        return _jobs.get(job_id)
+
+
+def stats():
+    """Number of jobs kept in memory, per status."""
+    counts = {"pending": 0, "running": 0, "done": 0, "failed": 0}
+    with _lock:
+        for job in _jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+    return counts
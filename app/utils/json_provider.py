@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+orjson-backed JSON provider for app.json.
+
+Output matches Flask's default provider (sorted keys, datetimes as HTTP
+dates through the default hook, compact unless in debug) except that
+non-ASCII text is written as UTF-8 instead of \\u escapes. When orjson is
+not installed the default provider stays in place.
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    _ORJSON_KWARGS = {'indent', 'separators'}
+
+    def _options(self, indent=None):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def _dump_bytes(self, obj, indent=None):
+        return orjson.dumps(obj, default=self.default, option=self._options(indent))
+
+    def dumps(self, obj, **kwargs):
+        # Anything orjson cannot honour (cls, custom default, ...) goes through the stdlib
+        if not set(kwargs) <= self._ORJSON_KWARGS:
+            return super().dumps(obj, **kwargs)
+        return self._dump_bytes(obj, kwargs.get('indent')).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self._dump_bytes(obj, indent) + b"\n", mimetype=self.mimetype)
+
+
+def init_json(app):
+    """Use orjson for app.json when it is available."""
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
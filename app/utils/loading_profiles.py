@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Named eager-loading profiles for list endpoints.
+
+Most to_dict() methods follow a relationship (Stock.produit.name,
+Historique.user.nom, ...). Serializing a page of N rows with lazy loading
+costs up to N extra SELECTs per relationship; applying the matching profile
+loads them with the page instead:
+
+    query = Stock.query.options(*loading_profiles.load('stock'))
+
+Many-to-one relationships are joined (one query), collections use
+selectinload (one extra query per page). When the list query already joins
+the related table for filtering, use contains_eager on that join instead.
+"""
+from sqlalchemy.orm import joinedload, selectinload
+from ..models.user import User
+from ..models.product import Produit
+from ..models.sous_category import SousCategory
+from ..models.stock import Stock
+from ..models.article import Article
+from ..models.historique import Historique
+from ..models.transaction_paye import TransactionPaye
+from ..models.transaction_impaye import TransactionImpaye
+from ..models.demande_solde import DemandeSolde
+from ..models.commande_boutique import CommandeBoutique
+from ..models.commande_produit import CommandeProduit
+from ..models.panier import Panier
+from ..models.duree_avec_stock import DureeAvecStock
+from ..models.duree_sans_stock import DureeSansStock
+
+_PRODUIT = (joinedload(Produit.category), joinedload(Produit.sous_category))
+
+PROFILES = {
+    'produit': _PRODUIT,
+    # DureeAvecStock.to_dict() reads .produit, which the identity map already holds
+    'produit_with_durees': _PRODUIT + (selectinload(Produit.duree_avec_stock),),
+    'sous_category': (joinedload(SousCategory.category),),
+    'stock': (joinedload(Stock.produit),),
+    'duree_avec_stock': (joinedload(DureeAvecStock.produit),),
+    'duree_sans_stock': (joinedload(DureeSansStock.produit),),
+    'article': (joinedload(Article.boutique),),
+    'historique': (joinedload(Historique.user),),
+    'transaction_paye': (joinedload(TransactionPaye.sender), joinedload(TransactionPaye.receiver)),
+    'transaction_impaye': (joinedload(TransactionImpaye.sender), joinedload(TransactionImpaye.receiver)),
+    'demande_solde': (joinedload(DemandeSolde.user),),
+    'commande_boutique': (joinedload(CommandeBoutique.user), joinedload(CommandeBoutique.article)),
+    'commande_produit': (joinedload(CommandeProduit.user), joinedload(CommandeProduit.produit)),
+    'panier': (joinedload(Panier.user), joinedload(Panier.article)),
+    'user_with_responsable': (joinedload(User.responsable_user),),
+}
+
+
+def load(name):
+    """Loader options of a profile, to pass to query.options(*...)."""
+    return PROFILES[name]
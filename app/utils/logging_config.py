@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Central logging setup.
+
+Records go through a QueueHandler so request handlers never block on stream
+I/O; a QueueListener thread writes them out. The level comes from LOG_LEVEL
+(INFO by default). Debug records of hot-path modules are sampled, so turning
+DEBUG on in production does not multiply the cost of every request.
+"""
+import atexit
+import itertools
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+_listener = None
+
+
+class DebugSampler(logging.Filter):
+    """Let through every record above DEBUG, and one DEBUG record out of `every`."""
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = max(1, int(every))
+        self._counter = itertools.count()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        return next(self._counter) % self.every == 0
+
+
+class lazy:
+    """Defer building an expensive log argument until the record is actually formatted."""
+
+    def __init__(self, build):
+        self.build = build
+
+    def __str__(self):
+        return str(self.build())
+
+
+def configure_logging(app):
+    global _listener
+
+    level = logging.getLevelName(str(app.config.get('LOG_LEVEL', 'INFO')).upper())
+    if not isinstance(level, int):
+        level = logging.INFO
+
+    root = logging.getLogger()
+    if _listener is None:
+        stream = logging.StreamHandler()
+        stream.setFormatter(logging.Formatter(LOG_FORMAT))
+        records = queue.Queue(-1)
+        _listener = QueueListener(records, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+        root.handlers = [QueueHandler(records)]
+    root.setLevel(level)
+
+    every = app.config.get('LOG_DEBUG_SAMPLE_EVERY', 100)
+    for name in app.config.get('LOG_SAMPLED_LOGGERS', ()):
+        logger = logging.getLogger(name)
+        logger.filters = [f for f in logger.filters if not isinstance(f, DebugSampler)]
+        logger.addFilter(DebugSampler(every))
@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed store for uploaded images.
+
+Uploads are written once under static/media/<h[:2]>/<h>.<ext>, where h is the
+sha256 of the bytes, and the path relative to the app root is what the model
+column keeps (same shape as before: 'static/...'). Identical uploads share one
+file and a new upload always gets a new URL, so /static/media/ responses are
+served with a one year immutable Cache-Control.
+
+    media_store.save(request.files['photo'])   -> 'static/media/3f/3f9a...e1.png'
+    media_store.variants(path)                 -> {'full': ..., 'card': ..., 'thumb': ...}
+
+Pipeline:
+- multipart bodies are read (and spooled to disk by Werkzeug) before the view
+  runs, so a slow client never holds a DB transaction; MAX_CONTENT_LENGTH caps them
+- save() copies the upload to a temp file, at most MEDIA_MAX_UPLOAD_BYTES,
+  hashing it on the way, then renames it into place: a crash never leaves a
+  half-written image behind a row
+- a media_files row records the upload as 'pending' (on its own connection, so
+  it does not depend on the caller's transaction) and MEDIA_WORKERS background
+  workers validate it with Pillow and write <h>.<variant>.webp (VARIANTS,
+  longest side in pixels), then mark it 'ready' or 'failed'. Decoding and
+  resizing go through green.offload(), so under eventlet they run in native
+  threads instead of stalling every request and socket of the worker
+
+Until its variants exist an image falls back to the original. Once a row is
+marked, the table_versions counters of the tables that reference the image are
+bumped and its products are dropped from the price matrix, so cached listings
+stop serving the fallback. Without Pillow nothing is processed and rows are 'ready' at once. Rows never delete their files
+since they can be shared; `flask media gc` removes the files no MEDIA_COLUMNS
+row references any more, `flask media process-pending` reruns unfinished
+processing and `flask media import-legacy` moves images saved under the old
+per-entity folders into the store.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+import click
+from flask import current_app, request
+from flask.cli import AppGroup
+from sqlalchemy.dialects.mysql import insert
+from werkzeug.exceptions import RequestEntityTooLarge
+from .. import db, socketio
+from . import green, table_versions
+from ..models.media_file import MediaFile
+
+try:
+    from PIL import Image
+except ImportError:  # optional dependency: without it only the original is stored
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+MEDIA_DIR = 'static/media'
+MEDIA_URL_PREFIX = '/static/media/'
+VARIANTS = {'card': 480, 'thumb': 160}
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+# Leading bytes of the formats we store, checked so the extension does not depend on the client
+MAGIC = ((b'\x89PNG', 'png'), (b'\xff\xd8\xff', 'jpg'), (b'GIF8', 'gif'))
+CHUNK_SIZE = 64 * 1024
+
+# (model module, class name, column) of every column holding a media path
+MEDIA_COLUMNS = (
+    ('app.models.category', 'Category', 'photo'),
+    ('app.models.sous_category', 'SousCategory', 'photo'),
+    ('app.models.product', 'Produit', 'photo'),
+    ('app.models.article', 'Article', 'photo'),
+    ('app.models.boutique', 'Boutique', 'photo'),
+    ('app.models.application', 'Application', 'logo'),
+    ('app.models.user', 'User', 'photo'),
+    ('app.models.gest_message', 'GestMessage', 'img_path'),
+    ('app.models.demande_solde', 'DemandeSolde', 'preuve'),
+    # update_demande copies the demande's proof path onto the transaction it creates
+    ('app.models.transaction_paye', 'TransactionPaye', 'preuve'),
+)
+
+
+def _root():
+    return os.path.join(current_app.root_path, MEDIA_DIR)
+
+
+def _extension(filename, head):
+    if head[8:12] == b'WEBP' and head[:4] == b'RIFF':
+        return 'webp'
+    for magic, ext in MAGIC:
+        if head.startswith(magic):
+            return ext
+    ext = os.path.splitext(filename or '')[1].lstrip('.').lower()
+    # Uploads used to be saved as .png whatever they were
+    return ext if ext in EXTENSIONS else 'png'
+
+
+def _store(stream, filename):
+    root = _root()
+    os.makedirs(root, exist_ok=True)
+    limit = current_app.config['MEDIA_MAX_UPLOAD_BYTES']
+    tmp = os.path.join(root, f".tmp-{uuid.uuid4().hex}")
+    sha = hashlib.sha256()
+    size = 0
+    head = b''
+    try:
+        with open(tmp, 'wb') as out:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                size += len(chunk)
+                if size > limit:
+                    raise RequestEntityTooLarge(f"Uploaded file is larger than {limit} bytes")
+                if len(head) < 12:
+                    head += chunk[:12]
+                sha.update(chunk)
+                out.write(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+
+        digest = sha.hexdigest()
+        folder = os.path.join(root, digest[:2])
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{digest}.{_extension(filename, head)}")
+        if os.path.exists(path):
+            os.remove(tmp)
+            # Same bytes already stored: make it young again so gc leaves it to the new row
+            for name in [f"{digest}.{v}.webp" for v in VARIANTS] + [os.path.basename(path)]:
+                if os.path.exists(os.path.join(folder, name)):
+                    os.utime(os.path.join(folder, name))
+        else:
+            os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    relative = os.path.relpath(path, current_app.root_path)
+    if _record(digest, relative, size):
+        _enqueue(digest)
+    return relative
+
+
+def save(file_storage):
+    """Store an uploaded werkzeug FileStorage and return its path relative to the app root."""
+    return _store(file_storage.stream, file_storage.filename)
+
+
+def save_file(path):
+    """Store a file already on disk (absolute path) and return its media path."""
+    with open(path, 'rb') as f:
+        return _store(f, os.path.basename(path))
+
+
+# ---- processing ----
+
+_lock = threading.Lock()
+_queue = deque()    # digests waiting for a worker
+_workers = 0
+
+
+def _record(digest, path, size):
+    """Insert the media_files row; True when the upload is new and needs processing."""
+    status = 'pending' if Image is not None else 'ready'
+    stmt = insert(MediaFile).prefix_with('IGNORE', dialect='mysql').values(
+        digest=digest, path=path, size=size, status=status, created_at=datetime.utcnow()
+    )
+    with db.engine.begin() as connection:
+        inserted = connection.execute(stmt).rowcount == 1
+    return inserted and status == 'pending'
+
+
+def _enqueue(digest):
+    global _workers
+    with _lock:
+        _queue.append(digest)
+        if _workers >= current_app.config['MEDIA_WORKERS']:
+            return
+        _workers += 1
+    socketio.start_background_task(_work, current_app._get_current_object())
+
+
+def _work(app):
+    global _workers
+    while True:
+        with _lock:
+            if not _queue:
+                _workers -= 1
+                return
+            digest = _queue.popleft()
+        with app.app_context():
+            try:
+                process(digest)
+            except Exception:
+                logger.exception("Processing of media %s crashed", digest)
+                db.session.rollback()
+            finally:
+                db.session.remove()
+
+
+def stats():
+    """Uploads waiting for a worker and workers running in this process."""
+    with _lock:
+        return {"queued": len(_queue), "workers": _workers}
+
+
+def _write_variants(source, digest):
+    folder = os.path.dirname(source)
+    with Image.open(source) as image:
+        image.load()
+        for name, size in VARIANTS.items():
+            target = os.path.join(folder, f"{digest}.{name}.webp")
+            if os.path.exists(target):
+                continue
+            # Written even for small images so a finished upload always has every variant
+            variant = image.convert('RGBA' if 'A' in image.getbands() or image.mode == 'P' else 'RGB')
+            variant.thumbnail((size, size))
+            tmp = os.path.join(folder, f".tmp-{uuid.uuid4().hex}")
+            variant.save(tmp, 'WEBP', quality=80)
+            os.replace(tmp, target)
+
+
+def _validate_and_resize(source, digest):
+    with Image.open(source) as image:
+        image.verify()
+    _write_variants(source, digest)
+
+
+def process(digest):
+    """Validate a stored upload and write its variants, recording the outcome on its media_files row."""
+    media = MediaFile.query.get(digest)
+    if media is None:
+        return
+    source = os.path.join(current_app.root_path, media.path)
+    try:
+        green.offload(_validate_and_resize, source, digest)
+        media.status, media.error = 'ready', None
+    except Exception as e:
+        logger.warning("Upload %s is not a usable image: %s", media.path, e)
+        media.status, media.error = 'failed', str(e)[:255]
+    media.processed_at = datetime.utcnow()
+    db.session.commit()
+    _publish(media.path)
+
+
+def _publish(path):
+    """Make the listings that embed `path` render its variants again."""
+    from . import price_matrix  # imports this module
+    tables = set()
+    for model, column in _columns():
+        ids = [id_ for (id_,) in db.session.query(model.id).filter(column == path)]
+        if ids:
+            tables.add(model.__tablename__)
+            if model.__tablename__ == 'produits':
+                price_matrix.invalidate(ids)
+    if tables:
+        table_versions.bump(tables)
+
+
+def is_media_path(path):
+    return bool(path) and path.startswith(MEDIA_DIR + '/')
+
+
+_complete = {}  # path -> variants, once every variant exists (files never change afterwards)
+
+
+def variants(path):
+    """URLs of each size of a stored image; legacy paths and missing variants fall back to the original."""
+    if not path:
+        return None
+    if path in _complete:
+        return _complete[path]
+    result = dict({'full': path}, **{name: path for name in VARIANTS})
+    if Image is None or not is_media_path(path):
+        return result
+    base, _ = os.path.splitext(path)
+    for name in VARIANTS:
+        candidate = f"{base}.{name}.webp"
+        if os.path.exists(os.path.join(current_app.root_path, candidate)):
+            result[name] = candidate
+    if all(result[name] != path for name in VARIANTS):
+        _complete[path] = result
+    return result
+
+
+def format_variants(paths):
+    """Column formatter for serializers.Projection."""
+    return [variants(p) for p in paths]
+
+
+# ---- maintenance ----
+
+def _columns():
+    import importlib
+    for module, class_name, column in MEDIA_COLUMNS:
+        model = getattr(importlib.import_module(module), class_name)
+        yield model, getattr(model, column)
+
+
+def referenced_digests():
+    digests = set()
+    for _, column in _columns():
+        for (path,) in db.session.query(column).filter(column.like(MEDIA_DIR + '/%')):
+            digests.add(os.path.basename(path).split('.')[0])
+    return digests
+
+
+def collect_garbage(min_age, dry_run=False):
+    """
+    Remove stored files (originals, variants and leftover temp files) that no row
+    references and that are older than min_age seconds. Returns their paths.
+    The age check keeps files whose upload transaction has not committed yet.
+    """
+    root = _root()
+    if not os.path.isdir(root):
+        return []
+    referenced = referenced_digests()
+    cutoff = time.time() - min_age
+    removed = []
+    for folder, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(folder, name)
+            if name.split('.')[0] in referenced or os.path.getmtime(path) > cutoff:
+                continue
+            removed.append(path)
+            if not dry_run:
+                os.remove(path)
+    if not dry_run:
+        _complete.clear()
+        kept = {name.split('.')[0] for _, _, files in os.walk(root) for name in files}
+        gone = [row.digest for row in MediaFile.query.with_entities(MediaFile.digest) if row.digest not in kept]
+        if gone:
+            MediaFile.query.filter(MediaFile.digest.in_(gone)).delete(synchronize_session=False)
+        db.session.commit()
+    return removed
+
+
+def import_legacy():
+    """Move images saved under the old per-entity folders into the store. Returns the number of rows updated."""
+    updated = 0
+    for model, column in _columns():
+        rows = db.session.query(model).filter(column.isnot(None), ~column.like(MEDIA_DIR + '/%')).all()
+        for row in rows:
+            source = os.path.join(current_app.root_path, getattr(row, column.key))
+            if not os.path.isfile(source):
+                continue
+            setattr(row, column.key, save_file(source))
+            updated += 1
+        db.session.commit()
+    return updated
+
+
+def _read_uploads():
+    # Reading request.files makes Werkzeug receive the whole body (spooling large
+    # parts to temp files) before the view can open a DB transaction
+    if request.mimetype == 'multipart/form-data':
+        request.files
+
+
+def _immutable_cache(response):
+    if request.path.startswith(MEDIA_URL_PREFIX) and response.status_code in (200, 206, 304):
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+media_cli = AppGroup('media', help="Maintenance of the uploaded images store.")
+
+
+@media_cli.command('gc')
+@click.option('--min-age', type=int, default=None, help="Only remove files older than this many seconds.")
+@click.option('--dry-run', is_flag=True, help="List the files without removing them.")
+def gc_command(min_age, dry_run):
+    if min_age is None:
+        min_age = current_app.config['MEDIA_GC_MIN_AGE']
+    removed = collect_garbage(min_age, dry_run=dry_run)
+    for path in removed:
+        click.echo(path)
+    click.echo(f"{len(removed)} file(s) {'to remove' if dry_run else 'removed'}")
+
+
+@media_cli.command('process-pending')
+@click.option('--failed', is_flag=True, help="Also retry the uploads that failed.")
+def process_pending_command(failed):
+    statuses = ['pending', 'failed'] if failed else ['pending']
+    digests = [row.digest for row in MediaFile.query.filter(MediaFile.status.in_(statuses))]
+    for digest in digests:
+        process(digest)
+    click.echo(f"{len(digests)} upload(s) processed")
+
+
+@media_cli.command('import-legacy')
+def import_legacy_command():
+    click.echo(f"{import_legacy()} row(s) moved to the media store; old folders can be deleted afterwards")
+
+
+def init_media(app):
+    app.before_request(_read_uploads)
+    app.after_request(_immutable_cache)
+    app.cli.add_command(media_cli)
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+GET /metrics in the Prometheus text exposition format.
+
+Everything exported is a counter or a gauge kept in the memory of this
+process; a scrape only copies them under their locks and formats text, it
+never touches the database. Recording is a dict update per request,
+statement or emit, so the endpoint can stay enabled in production.
+
+- HTTP: app_http_request_duration_seconds, a histogram per blueprint and
+  status class (time until the response is returned; a streamed body is not
+  included)
+- database: connection pool size, checkouts, timeouts and checkout waits
+  (app/utils/db_pool.py), queries and query time per endpoint
+  (app/utils/sql_metrics.py)
+- Socket.IO: connected clients, emitted events per event, polled events
+  served / cached / throttled (app/utils/socket_guard.py)
+- background work: jobs per status, uploads waiting for a media worker
+- caches: hits and misses of the catalog ETags, the price matrix and the
+  socket event memo, and their hit ratio since the process started
+- business: purchases, codes sold, top-ups, returns and their amounts, counted
+  by the routes after their commit with count(). Rates come from Prometheus,
+  e.g. purchases per minute: rate(app_purchases_total[5m]) * 60
+
+Each process (gunicorn worker) exports its own numbers. The figures include
+sales and top-up totals, so the route is only registered when METRICS_TOKEN is
+set, and scrapes must send `Authorization: Bearer <METRICS_TOKEN>`.
+The counters are recorded either way.
+"""
+import hmac
+import threading
+import time
+from flask import abort, current_app, g, request
+from .. import db
+from . import db_pool, http_cache, jobs, media_store, price_matrix, socket_guard, socket_state, sql_metrics
+
+# Upper bounds (seconds) of the request duration histogram
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+BUSINESS = {
+    'purchases': "Purchases committed",
+    'codes_sold': "Codes sold",
+    'purchase_amount': "Amount of the purchases committed",
+    'topups': "Balance top-ups committed (direct updates and confirmed demandes)",
+    'topup_amount': "Amount of the balance top-ups committed",
+    'returns': "Returns approved",
+    'return_amount': "Amount refunded by approved returns",
+}
+
+_lock = threading.Lock()
+_requests = {}  # (blueprint, status class) -> [bucket counts..., +Inf count, sum]
+_business = dict.fromkeys(BUSINESS, 0)
+
+
+def count(name, value=1):
+    """Add value to the business counter `name` (one of BUSINESS)."""
+    with _lock:
+        _business[name] += value
+
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+
+
+def _after_request(response):
+    started = g.get('metrics_started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    key = (request.blueprint or 'none', f"{response.status_code // 100}xx")
+    with _lock:
+        histogram = _requests.get(key)
+        if histogram is None:
+            histogram = _requests[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed <= bound:
+                histogram[i] += 1
+                break
+        else:
+            histogram[len(LATENCY_BUCKETS)] += 1
+        histogram[-1] += elapsed
+    return response
+
+
+# ---- exposition ----
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _sample(name, labels, value):
+    if labels:
+        name += '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+    return f"{name} {value}"
+
+
+class _Exposition:
+    def __init__(self):
+        self.lines = []
+
+    def metric(self, name, kind, help_text, samples):
+        """samples: (labels dict, value) pairs; a metric without samples is left out."""
+        samples = list(samples)
+        if not samples:
+            return
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+        self.lines.extend(_sample(name, labels, value) for labels, value in samples)
+
+    def histogram(self, name, help_text, series):
+        """series: (labels dict, {bound: non-cumulative count}, total count, sum) tuples."""
+        series = list(series)
+        if not series:
+            return
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} histogram")
+        for labels, buckets, total, seconds in series:
+            cumulative = 0
+            for bound, n in buckets.items():
+                cumulative += n
+                self.lines.append(_sample(f"{name}_bucket", dict(labels, le=f"{bound:g}"), cumulative))
+            self.lines.append(_sample(f"{name}_bucket", dict(labels, le="+Inf"), total))
+            self.lines.append(_sample(f"{name}_sum", labels, float(seconds)))
+            self.lines.append(_sample(f"{name}_count", labels, total))
+
+    def text(self):
+        return '\n'.join(self.lines) + '\n'
+
+
+def _http(out):
+    with _lock:
+        snapshot = {key: list(histogram) for key, histogram in _requests.items()}
+    out.histogram(
+        'app_http_request_duration_seconds', "Time to handle a request, per blueprint and status class",
+        [({"blueprint": blueprint, "status": status},
+          dict(zip(LATENCY_BUCKETS, histogram[:len(LATENCY_BUCKETS)])),
+          sum(histogram[:-1]), histogram[-1])
+         for (blueprint, status), histogram in sorted(snapshot.items())]
+    )
+
+
+def _database(out):
+    pool = db_pool.stats(db.engine)
+    for key, kind, help_text in (
+        ("pool_size", "gauge", "Connections kept open by the pool"),
+        ("checked_out", "gauge", "Connections currently checked out"),
+        ("overflow", "gauge", "Connections open above pool_size"),
+        ("max_overflow", "gauge", "Connections allowed above pool_size"),
+    ):
+        if key in pool:
+            out.metric(f"app_db_pool_{key}", kind, help_text, [({}, pool[key])])
+    out.metric('app_db_pool_checkouts_total', 'counter', "Connections checked out of the pool",
+               [({}, pool["checkouts"])])
+    out.metric('app_db_pool_overflow_checkouts_total', 'counter', "Checkouts served by an overflow connection",
+               [({}, pool["overflow_checkouts"])])
+    out.metric('app_db_pool_timeouts_total', 'counter', "Checkouts that gave up after pool_timeout",
+               [({}, pool["timeouts"])])
+    out.histogram('app_db_pool_wait_seconds', "Time waited for a connection at checkout",
+                  [({}, pool["wait_buckets"], pool["checkouts"] + pool["timeouts"], pool["wait_seconds_total"])])
+
+    per_endpoint = sorted(sql_metrics.stats().items())
+    out.metric('app_db_queries_total', 'counter', "SQL statements executed by requests, per endpoint",
+               (({"endpoint": e}, c["queries"]) for e, c in per_endpoint))
+    out.metric('app_db_query_seconds_total', 'counter', "Cursor time of the SQL statements of requests, per endpoint",
+               (({"endpoint": e}, float(c["db_seconds"])) for e, c in per_endpoint))
+    out.metric('app_db_repeated_statement_requests_total', 'counter',
+               "Requests that ran one statement more than SQL_REPEAT_WARN times (likely N+1), per endpoint",
+               (({"endpoint": e}, c["repeat_warnings"]) for e, c in per_endpoint))
+
+
+def _sockets(out):
+    out.metric('app_socket_connected_clients', 'gauge', "Users with an open Socket.IO connection",
+               [({}, len(socket_state.connected_users))])
+    out.metric('app_socket_emits_total', 'counter', "Socket.IO events emitted, per event",
+               (({"event": e}, n) for e, n in sorted(socket_state.emitted().items())))
+    out.metric('app_socket_polls_total', 'counter', "Polled socket events served, answered from the memo or throttled",
+               (({"event": e, "outcome": outcome}, n)
+                for e, counters in sorted(socket_guard.stats().items()) for outcome, n in counters.items()))
+
+
+def _background(out):
+    out.metric('app_jobs', 'gauge', "Background jobs kept in memory, per status",
+               (({"status": status}, n) for status, n in jobs.stats().items()))
+    media = media_store.stats()
+    out.metric('app_media_queue_depth', 'gauge', "Uploads waiting for a media worker", [({}, media["queued"])])
+    out.metric('app_media_workers', 'gauge', "Media workers running", [({}, media["workers"])])
+
+
+def _caches(out):
+    etags = http_cache.stats()
+    matrix = price_matrix.stats()
+    polls = socket_guard.stats().values()
+    caches = {
+        "http_etag": (etags["hits"], etags["misses"]),
+        "price_matrix": (matrix["hits"], matrix["misses"]),
+        "socket_memo": (sum(c["cached"] for c in polls), sum(c["served"] for c in polls)),
+    }
+    out.metric('app_cache_requests_total', 'counter', "Cache lookups, per cache and result",
+               (({"cache": cache, "result": result}, n)
+                for cache, (hits, misses) in caches.items() for result, n in (("hit", hits), ("miss", misses))))
+    out.metric('app_cache_hit_ratio', 'gauge', "Hits over lookups since the process started",
+               (({"cache": cache}, hits / (hits + misses)) for cache, (hits, misses) in caches.items() if hits + misses))
+    out.metric('app_price_matrix_rebuilds_total', 'counter', "Full rebuilds of the price matrix",
+               [({}, matrix["full_rebuilds"])])
+
+
+def _business_counters(out):
+    with _lock:
+        snapshot = dict(_business)
+    for name, help_text in BUSINESS.items():
+        value = snapshot[name]
+        out.metric(f"app_{name}_total", 'counter', help_text, [({}, float(value) if 'amount' in name else value)])
+
+
+def render():
+    out = _Exposition()
+    _http(out)
+    _database(out)
+    _sockets(out)
+    _background(out)
+    _caches(out)
+    _business_counters(out)
+    return out.text()
+
+
+def metrics_view():
+    expected = f"Bearer {current_app.config['METRICS_TOKEN']}".encode()
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected):
+        abort(401)
+    response = current_app.response_class(render(), mimetype='text/plain')
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def init_metrics(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    if app.config.get('METRICS_TOKEN'):
+        app.add_url_rule('/metrics', 'metrics', metrics_view, methods=['GET'])
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Pending demande counters per approver scope.
+
+Managers and admin_boss share the 'managers' scope (requests sent by admins),
+each admin has an 'admin:<id>' scope (requests sent by their revendeurs).
+Counts are adjusted in the same transaction as the demande that changes them,
+so reading or pushing a count is a primary-key lookup on pending_counts.
+A background loop recomputes them from demandes_solde to repair any drift;
+the entry points start it with start_reconciler(app).
+"""
+import logging
+from datetime import datetime
+from sqlalchemy import String, and_, case, cast, func, literal, select, update
+from sqlalchemy.dialects.mysql import insert
+from .. import db, socketio
+from ..models.user import User
+from ..models.demande_solde import DemandeSolde
+from ..models.pending_count import PendingCount
+from .socket_state import connected_users
+from . import socket_guard
+
+logger = logging.getLogger(__name__)
+
+MANAGERS_SCOPE = 'managers'
+
+# _scope() as SQL, for statements computed from demandes_solde
+_SCOPE = case(
+    (User.role == 'admin', literal(MANAGERS_SCOPE)),
+    (and_(User.role == 'revendeur', User.responsable.isnot(None)), literal('admin:') + cast(User.responsable, String)),
+)
+
+
+def _scope(role, responsable):
+    if role == 'admin':
+        return MANAGERS_SCOPE
+    if role == 'revendeur' and responsable:
+        return f"admin:{responsable}"
+    return None
+
+
+def scope_for_approver(user):
+    if user.role in ['manager', 'admin_boss']:
+        return MANAGERS_SCOPE
+    if user.role == 'admin':
+        return f"admin:{user.id}"
+    return None
+
+
+def _add(scope, delta):
+    if not scope or not delta:
+        return
+    stmt = insert(PendingCount).values(scope=scope, count=max(delta, 0), updated_at=datetime.utcnow())
+    stmt = stmt.on_duplicate_key_update(
+        count=func.greatest(PendingCount.count + delta, 0),
+        updated_at=stmt.inserted.updated_at
+    )
+    db.session.execute(stmt)
+
+
+def adjust(requester, delta):
+    """Add delta to the scope that approves `requester`. Call before committing the demande change."""
+    _add(_scope(requester.role, requester.responsable), delta)
+
+
+def requester_moved(requester, old_responsable):
+    """Move a revendeur's pending demandes to their new admin's scope."""
+    if requester.role != 'revendeur' or old_responsable == requester.responsable:
+        return
+    pending = DemandeSolde.query.filter_by(envoyee_par=requester.id, etat='en cours').count()
+    if pending:
+        _add(_scope('revendeur', old_responsable), -pending)
+        _add(_scope('revendeur', requester.responsable), pending)
+
+
+def get_count(user):
+    scope = scope_for_approver(user)
+    if not scope:
+        return 0
+    count = db.session.query(PendingCount.count).filter_by(scope=scope).scalar()
+    return count or 0
+
+
+def reconcile():
+    """
+    Recompute every scope from demandes_solde and fix the stored counts.
+    Returns a dict of the scopes that were wrong with their corrected count.
+
+    Each count is computed and written by the same statement, so a demande
+    created or approved meanwhile is either counted by it or adjusted after
+    it, never overwritten by a count read before it.
+    """
+    before = dict(db.session.query(PendingCount.scope, PendingCount.count).all())
+
+    expected = (
+        select(_SCOPE.label('scope'), func.count(DemandeSolde.id), func.now())
+        .select_from(DemandeSolde)
+        .join(User, DemandeSolde.envoyee_par == User.id)
+        .where(DemandeSolde.etat == 'en cours', _SCOPE.isnot(None))
+        .group_by(_SCOPE)
+    )
+    stmt = insert(PendingCount).from_select(['scope', 'count', 'updated_at'], expected)
+    db.session.execute(stmt.on_duplicate_key_update(count=stmt.inserted.count, updated_at=stmt.inserted.updated_at))
+
+    # scopes with nothing pending left
+    pending_scopes = (
+        select(_SCOPE)
+        .select_from(DemandeSolde)
+        .join(User, DemandeSolde.envoyee_par == User.id)
+        .where(DemandeSolde.etat == 'en cours', _SCOPE.isnot(None))
+    )
+    db.session.execute(
+        update(PendingCount)
+        .where(PendingCount.count != 0, PendingCount.scope.notin_(pending_scopes))
+        .values(count=0, updated_at=func.now())
+    )
+
+    after = dict(db.session.query(PendingCount.scope, PendingCount.count).all())
+    db.session.commit()
+    return {scope: count for scope, count in after.items() if before.get(scope) != count}
+
+
+def emit_counts(counts):
+    """Push update_en_cours_count for each scope in `counts` to its connected approvers."""
+    socket_guard.invalidate("get_en_cours_count")
+    for scope, count in counts.items():
+        if scope == MANAGERS_SCOPE:
+            user_ids = [u.id for u in User.query.filter(User.role.in_(['manager', 'admin_boss'])).all()]
+        else:
+            user_ids = [int(scope.split(':', 1)[1])]
+        for uid in user_ids:
+            sid = connected_users.get(str(uid))
+            if sid:
+                socketio.emit("update_en_cours_count", {"user_id": uid, "count": count}, room=sid)
+
+
+def _reconcile_loop(app):
+    interval = app.config.get('PENDING_COUNTS_RECONCILE_SECONDS', 300)
+    while True:
+        with app.app_context():
+            try:
+                changed = reconcile()
+                if changed:
+                    logger.info("Reconciled pending counts: %s", changed)
+                    emit_counts(changed)
+            except Exception:
+                db.session.rollback()
+                logger.exception("Error reconciling pending counts")
+            finally:
+                db.session.remove()
+        socketio.sleep(interval)
+
+
+def start_reconciler(app):
+    """
+    Run reconcile() every PENDING_COUNTS_RECONCILE_SECONDS (0 disables it).
+    Called once per process by the entry points; several processes running it
+    at once is harmless.
+    """
+    if app.config.get('PENDING_COUNTS_RECONCILE_SECONDS', 300) <= 0:
+        return
+    socketio.start_background_task(_reconcile_loop, app)
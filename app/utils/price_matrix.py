@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+In-memory price matrix for the storefront.
+
+For every product it holds what get_products_by_sous_category returns, already
+priced for each niveau and for both audiences:
+- admin:     the full duree rows with prix_affiche = prix_N of the admin's niveau
+- revendeur: (duree, Quantite, prix_affiche) where prix_affiche is the GestPrix
+             prix_vente, else the GestPrix prix_achat, else prix_N of the
+             responsible admin's niveau
+
+Rows come from duree_avec_stock with quantite > 0, or from the active
+duree_sans_stock rows when a product has no stock.
+
+Committed changes to a product, its durees or the GestPrix table invalidate the
+product (or the whole matrix) and bump the version; it is rebuilt on the next
+read. Writes made by other processes are picked up when the matrix ages out
+(PRICE_MATRIX_MAX_AGE seconds).
+
+Builds query the database without holding _lock, and one full rebuild runs at
+a time. Each invalidation takes a new generation number and each entry keeps
+the generation its build started at: an entry is current when it started after
+the last invalidation of its product and of the whole matrix, so a change
+committed while a build is running is never marked as rebuilt.
+"""
+import threading
+import time
+import uuid
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm.attributes import get_history
+from .. import db
+from ..models.product import Produit
+from ..models.category import Category
+from ..models.sous_category import SousCategory
+from ..models.duree_avec_stock import DureeAvecStock
+from ..models.duree_sans_stock import DureeSansStock
+from ..models.gest_prix import GestPrix, normalize_key
+from . import media_store
+
+NIVEAUX = ('niveau1', 'niveau2', 'niveau3')
+
+# Changes to these invalidate single products, changes to the others the whole matrix
+PER_PRODUCT_MODELS = (Produit, DureeAvecStock, DureeSansStock)
+FULL_REBUILD_MODELS = (GestPrix, Category, SousCategory)
+WATCHED_TABLES = {m.__tablename__ for m in PER_PRODUCT_MODELS + FULL_REBUILD_MODELS}
+
+_EPOCH = uuid.uuid4().hex[:8]
+
+_lock = threading.Lock()
+_build_lock = threading.Lock()  # held for a full rebuild, without _lock
+_entries = {}           # produit_id -> (generation, entry); entry is None when the product has nothing to sell
+_invalidated = {}       # produit_id -> generation of its last invalidation
+_full_invalidated = 0   # generation of the last invalidation of the whole matrix
+_generation = 0
+_gest_prix = None       # (generation, {(produit_key, duree_key) -> (prix_vente, prix_achat)})
+_built_at = 0.0
+_counter = 0
+_stats = {"hits": 0, "misses": 0, "full_rebuilds": 0}  # products served from / rebuilt into the matrix
+
+
+def niveau_of(user):
+    niveau = (user.niveau or 'niveau1').lower()
+    return niveau if niveau in NIVEAUX else 'niveau1'
+
+
+def _prix_for_niveau(duree_row, niveau):
+    return float({'niveau2': duree_row.prix_2, 'niveau3': duree_row.prix_3}.get(niveau, duree_row.prix_1))
+
+
+def _load_gest_prix():
+    return {
+        (produit_key, duree_key): (prix_vente, prix_achat)
+        for produit_key, duree_key, prix_vente, prix_achat in db.session.query(
+            GestPrix.produit_key, GestPrix.duree_key, GestPrix.prix_vente, GestPrix.prix_achat
+        ).all()
+    }
+
+
+def _revendeur_price(gest_prix, product, duree_row, niveau):
+    prix_vente, prix_achat_gp = gest_prix.get((normalize_key(product.name), normalize_key(duree_row.duree)), (None, None))
+    if prix_vente and float(prix_vente) > 0:
+        return float(prix_vente)
+    if prix_achat_gp is not None:
+        return float(prix_achat_gp)
+    return _prix_for_niveau(duree_row, niveau)
+
+
+def _build_entry(product, das_rows, dss_rows, gest_prix):
+    with_stock = bool(das_rows)
+    rows = das_rows if with_stock else dss_rows
+    if not rows:
+        return None
+
+    full_rows = [d.to_dict() for d in rows]
+    if not with_stock:
+        for d_full in full_rows:
+            d_full["Quantite"] = None  # for UI consistency, front-end checks Quantite None
+    admin_product = product.to_dict()
+    revendeur_product = {
+        "id": product.id,
+        "name": product.name,
+        "photo": product.photo,
+        "photo_variants": media_store.variants(product.photo),
+        "sous_category_id": product.sous_category_id,
+        "etat": product.etat,
+        "type": product.type
+    }
+
+    entry = {'admin': {}, 'revendeur': {}}
+    for niveau in NIVEAUX:
+        entry['admin'][niveau] = dict(admin_product, duree_avec_stock=[
+            dict(d_full, prix_affiche=_prix_for_niveau(d, niveau)) for d, d_full in zip(rows, full_rows)
+        ])
+        entry['revendeur'][niveau] = dict(revendeur_product, duree_avec_stock=[{
+            "duree": d.duree,
+            "Quantite": d.quantite if with_stock else None,
+            "prix_affiche": _revendeur_price(gest_prix, product, d, niveau)
+        } for d in rows])
+    return entry
+
+
+def _build(produit_ids, gest_prix):
+    """Build entries for the given products (all products when None) with three queries."""
+    products = Produit.query.options(joinedload(Produit.category), joinedload(Produit.sous_category))
+    das_query = DureeAvecStock.query.filter(DureeAvecStock.quantite > 0)
+    dss_query = DureeSansStock.query.filter(DureeSansStock.etat == 'actif')
+    if produit_ids is not None:
+        products = products.filter(Produit.id.in_(produit_ids))
+        das_query = das_query.filter(DureeAvecStock.produit_id.in_(produit_ids))
+        dss_query = dss_query.filter(DureeSansStock.produit_id.in_(produit_ids))
+
+    das_by_product, dss_by_product = {}, {}
+    for d in das_query.order_by(DureeAvecStock.id).all():
+        das_by_product.setdefault(d.produit_id, []).append(d)
+    for d in dss_query.order_by(DureeSansStock.id).all():
+        dss_by_product.setdefault(d.produit_id, []).append(d)
+
+    entries = {pid: None for pid in (produit_ids or ())}
+    for product in products.all():
+        entries[product.id] = _build_entry(
+            product, das_by_product.get(product.id, []), dss_by_product.get(product.id, []), gest_prix
+        )
+    return entries
+
+
+def _bump():
+    global _counter
+    _counter += 1
+
+
+def current_version():
+    return f"{_EPOCH}.{_counter}"
+
+
+def _needs_full_rebuild(max_age):
+    return (_gest_prix is None or _gest_prix[0] < _full_invalidated
+            or time.monotonic() - _built_at > max_age)
+
+
+def _current(pid, since):
+    """The entry of pid if it is current or was built after generation `since`, else False."""
+    built = _entries.get(pid)
+    if built is None:
+        return False
+    generation, entry = built
+    if generation >= since or generation >= max(_invalidated.get(pid, 0), _full_invalidated):
+        return entry
+    return False
+
+
+def _full_rebuild(max_age):
+    global _entries, _invalidated, _gest_prix, _built_at
+    with _build_lock:
+        with _lock:
+            if not _needs_full_rebuild(max_age):
+                return  # rebuilt by the request we waited for
+            generation = _generation
+        started = time.monotonic()
+        gest_prix = _load_gest_prix()
+        entries = _build(None, gest_prix)
+        with _lock:
+            # keep the products rebuilt since this build started
+            newer = {pid: built for pid, built in _entries.items() if built[0] > generation}
+            _entries = {pid: (generation, entry) for pid, entry in entries.items()}
+            _entries.update(newer)
+            _invalidated = {pid: g for pid, g in _invalidated.items() if g > generation}
+            _gest_prix = (generation, gest_prix)
+            _built_at = started
+            _bump()
+            _stats["full_rebuilds"] += 1
+
+
+def get_entries(produit_ids, audience, niveau):
+    """
+    Return {produit_id: product dict} for the ids that have something to sell,
+    priced for `audience` ('admin' or 'revendeur') at `niveau`, plus the matrix version.
+    """
+    max_age = current_app.config.get('PRICE_MATRIX_MAX_AGE', 60)
+    with _lock:
+        since = _generation
+        full = _needs_full_rebuild(max_age)
+    if full:
+        _full_rebuild(max_age)
+
+    with _lock:
+        entries = {pid: _current(pid, since) for pid in produit_ids}
+        missing = {pid for pid, entry in entries.items() if entry is False}
+        generation = _generation
+        gest_prix = _gest_prix[1]
+        version = current_version()
+        _stats["misses"] += len(missing)
+        _stats["hits"] += len(produit_ids) - len(missing)
+
+    if missing:
+        built = _build(missing, gest_prix)
+        entries.update(built)
+        with _lock:
+            for pid, entry in built.items():
+                if pid not in _entries or _entries[pid][0] <= generation:
+                    _entries[pid] = (generation, entry)
+
+    result = {}
+    for pid in produit_ids:
+        entry = entries[pid]
+        if entry:
+            result[pid] = entry[audience][niveau]
+    return result, version
+
+
+def stats():
+    with _lock:
+        return dict(_stats)
+
+
+def invalidate(produit_ids=None):
+    """Mark the given products, or everything when produit_ids is None, for rebuilding."""
+    global _generation, _full_invalidated
+    with _lock:
+        _generation += 1
+        if produit_ids is None:
+            _full_invalidated = _generation
+        else:
+            _invalidated.update(dict.fromkeys(produit_ids, _generation))
+        _bump()
+
+
+# ---- keeping the matrix in sync with ORM writes ----
+
+def _pending(session):
+    return session.info.setdefault('price_matrix_pending', {'full': False, 'ids': set()})
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    pending = None
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, FULL_REBUILD_MODELS):
+            pending = pending or _pending(session)
+            pending['full'] = True
+        elif isinstance(obj, Produit):
+            pending = pending or _pending(session)
+            pending['ids'].add(obj.id)
+        elif isinstance(obj, PER_PRODUCT_MODELS):
+            pending = pending or _pending(session)
+            # a duree moved to another product changes both products
+            pending['ids'].update(pid for pid in get_history(obj, 'produit_id').sum() if pid is not None)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_changes(orm_execute_state):
+    # query.update() / query.delete() and Core statements skip the flush
+    if orm_execute_state.is_select:
+        return
+    table = getattr(orm_execute_state.statement, 'table', None)
+    if getattr(table, 'name', None) in WATCHED_TABLES:
+        _pending(orm_execute_state.session)['full'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    pending = session.info.pop('price_matrix_pending', None)
+    if not pending:
+        return
+    if pending['full']:
+        invalidate()
+    elif pending['ids']:
+        invalidate(pending['ids'])
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('price_matrix_pending', None)
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Denormalized price range of each product.
+
+Produit.min_prix / Produit.max_prix hold the lowest / highest prix_1 of the
+product's duree_avec_stock rows (NULL when it has none), so catalog pages
+sorted by price read produits alone instead of joining every duration.
+
+They are recomputed in the same transaction as the duration change:
+- ORM flushes refresh the products whose durations were added, changed or deleted
+- bulk statements on duree_avec_stock (query.update() / query.delete(), Core inserts)
+  refresh the products they touch: the produit_id values they insert or set, and for
+  UPDATE / DELETE the products of the rows their WHERE clause matches, read just before
+  they run. Only a statement whose products cannot be known that way (INSERT ... SELECT,
+  produit_id set to an SQL expression, no WHERE clause) refreshes every product.
+refresh() can also be called directly to repair drift.
+"""
+from sqlalchemy import event, func, select, update
+from sqlalchemy.sql.elements import BindParameter, ClauseElement
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from .. import db
+from ..models.product import Produit
+from ..models.duree_avec_stock import DureeAvecStock
+
+REFRESH_CHUNK_SIZE = 1000
+
+
+def _refresh_statement():
+    prices = select(DureeAvecStock.prix_1).where(DureeAvecStock.produit_id == Produit.id)
+    return update(Produit).values(
+        min_prix=prices.with_only_columns(func.min(DureeAvecStock.prix_1)).scalar_subquery(),
+        max_prix=prices.with_only_columns(func.max(DureeAvecStock.prix_1)).scalar_subquery(),
+    ).execution_options(synchronize_session=False)
+
+
+def refresh(produit_ids=None, session=None):
+    """Recompute min_prix / max_prix for the given products, or for all of them."""
+    session = session or db.session
+    connection = session.connection()
+    stmt = _refresh_statement()
+    if produit_ids is None:
+        connection.execute(stmt)
+        return
+    ids = sorted(produit_ids)
+    for start in range(0, len(ids), REFRESH_CHUNK_SIZE):
+        connection.execute(stmt.where(Produit.id.in_(ids[start:start + REFRESH_CHUNK_SIZE])))
+
+
+# ---- keeping the columns in sync with ORM writes ----
+
+@event.listens_for(Session, 'after_flush')
+def _refresh_flushed(session, flush_context):
+    produit_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, DureeAvecStock):
+            continue
+        history = get_history(obj, 'produit_id')
+        # Quantity updates on every sale leave the price range alone
+        if obj in session.dirty and not history.has_changes() and not get_history(obj, 'prix_1').has_changes():
+            continue
+        produit_ids.update(pid for pid in history.sum() if pid is not None)
+    if produit_ids:
+        refresh(produit_ids, session)
+
+
+def _bulk_produit_ids(orm_execute_state):
+    """Products a bulk statement on duree_avec_stock touches, or None when they cannot be known."""
+    stmt = orm_execute_state.statement
+    ids = set()
+
+    # produit_id values inserted or set: execute() parameters, then .values()
+    params = orm_execute_state.parameters or {}
+    rows = list(params) if isinstance(params, (list, tuple)) else [params]
+    rows += stmt._multi_values[0] if getattr(stmt, '_multi_values', None) else [getattr(stmt, '_values', None) or {}]
+    for row in rows:
+        for key, value in row.items():
+            if getattr(key, 'key', key) != 'produit_id':
+                continue
+            if isinstance(value, BindParameter):
+                value = value.value
+            elif isinstance(value, ClauseElement):
+                return None
+            ids.add(value)
+
+    if stmt.is_insert:
+        return None if stmt.select is not None else ids
+    if stmt.whereclause is None:
+        return None
+    # Rows matched before the statement runs, so deleted rows and moved durations count too
+    matched = select(DureeAvecStock.produit_id).where(stmt.whereclause).distinct()
+    ids.update(orm_execute_state.session.connection().execute(matched).scalars())
+    return ids
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _refresh_after_bulk(orm_execute_state):
+    # query.update() / query.delete() and Core statements skip the flush
+    if orm_execute_state.is_select:
+        return
+    table = getattr(orm_execute_state.statement, 'table', None)
+    if getattr(table, 'name', None) != DureeAvecStock.__tablename__:
+        return
+    produit_ids = _bulk_produit_ids(orm_execute_state)
+    result = orm_execute_state.invoke_statement()
+    if produit_ids is None:
+        refresh(session=orm_execute_state.session)
+    else:
+        produit_ids.discard(None)
+        if produit_ids:
+            refresh(produit_ids, session=orm_execute_state.session)
+    return result
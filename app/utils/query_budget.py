@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Count the SQL statements a block of code issues.
+
+    with count_queries() as statements:
+        client.get('/api/stock/get_stocks?per_page=100')
+    print(len(statements))
+
+    with query_budget(4):
+        client.get('/api/stock/get_stocks?per_page=100')   # raises QueryBudgetExceeded on a 5th statement
+
+Must run inside an app context. Used by benchmarks/query_budgets.py to check
+that list endpoints issue the same number of queries whatever the page size.
+"""
+from contextlib import contextmanager
+from sqlalchemy import event
+from .. import db
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def count_queries(engine=None):
+    """Collect the SQL text of every statement executed on the engine inside the block."""
+    engine = engine or db.engine
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', _record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', _record)
+
+
+@contextmanager
+def query_budget(max_queries, engine=None):
+    """Fail when the block issues more than max_queries statements."""
+    with count_queries(engine) as statements:
+        yield statements
+    if len(statements) > max_queries:
+        raise QueryBudgetExceeded(
+            f"{len(statements)} queries issued, budget is {max_queries}:\n" + "\n".join(statements)
+        )
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Column-projection serializers for large list responses.
+
+A Projection names the columns a response needs and how to format them. It
+selects only those columns (no ORM entities, no to_dict() per row) and
+formats each column in one pass over the page:
+
+    TRANSACTION_PAYE.fetch(query)                  -> list of dicts
+    TRANSACTION_PAYE.paginate(query, page, per_page) -> (list of dicts, pagination)
+    TRANSACTION_PAYE.stream(query, chunk_size)     -> iterator of lists of value tuples
+
+The dicts have the same keys and values as the matching to_dict().
+"""
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from .. import db
+from ..models.user import User
+from ..models.category import Category
+from ..models.historique import Historique
+from ..models.return_request import ReturnRequest
+from ..models.transaction_paye import TransactionPaye
+from ..models.transaction_impaye import TransactionImpaye
+from . import media_store
+
+
+def format_datetimes(values):
+    """'%Y-%m-%d %H:%M:%S' for a column of naive datetimes; isoformat is much cheaper than strftime."""
+    return [v.isoformat(' ', 'seconds') if v is not None else None for v in values]
+
+
+def format_floats(values):
+    return [float(v) if v is not None else None for v in values]
+
+
+class Projection:
+    """
+    fields: (key, column, formatter) triples; formatter takes and returns a list of column values, or is None.
+    joins:  (target, onclause) pairs outer-joined to the query before selecting the columns.
+    """
+
+    def __init__(self, fields, joins=()):
+        self.keys = tuple(key for key, _, _ in fields)
+        self.columns = tuple(column for _, column, _ in fields)
+        self.formatters = tuple(formatter for _, _, formatter in fields)
+        self.joins = tuple(joins)
+
+    def select(self, query):
+        for target, onclause in self.joins:
+            query = query.outerjoin(target, onclause)
+        return query.with_entities(*self.columns)
+
+    def values(self, rows):
+        """Formatted value tuples, in field order."""
+        if not rows:
+            return []
+        columns = list(zip(*rows))
+        for i, formatter in enumerate(self.formatters):
+            if formatter:
+                columns[i] = formatter(columns[i])
+        return list(zip(*columns))
+
+    def rows(self, rows):
+        keys = self.keys
+        return [dict(zip(keys, values)) for values in self.values(rows)]
+
+    def fetch(self, query):
+        return self.rows(self.select(query).all())
+
+    def paginate(self, query, page, per_page):
+        pagination = self.select(query).paginate(page=page, per_page=per_page, error_out=False)
+        return self.rows(pagination.items), pagination
+
+    def stream(self, query, chunk_size):
+        """
+        Runs the query now, through a server-side cursor, and returns an iterator
+        over lists of at most chunk_size formatted value tuples.
+        """
+        result = db.session.execute(
+            self.select(query).statement,
+            execution_options={"yield_per": chunk_size}
+        )
+        return (self.values(rows) for rows in result.partitions())
+
+
+def _transaction_projection(model, extra_fields):
+    sender = aliased(User)
+    receiver = aliased(User)
+    return Projection(
+        [
+            ("id", model.id, None),
+            ("envoyee_par", sender.nom, None),
+            ("recue_par", receiver.nom, None),
+            ("recue_par_id", model.recue_par, None),
+            ("montant", model.montant, None),
+            ("date_transaction", model.date_transaction, format_datetimes),
+            ("etat", model.etat, None),
+        ] + extra_fields,
+        joins=[(sender, sender.id == model.envoyee_par), (receiver, receiver.id == model.recue_par)]
+    )
+
+
+TRANSACTION_PAYE = _transaction_projection(TransactionPaye, [
+    ("preuve", TransactionPaye.preuve, None),
+    ("date_paiement", TransactionPaye.date_paiement, format_datetimes),
+])
+
+TRANSACTION_IMPAYE = _transaction_projection(TransactionImpaye, [
+    ("duree", TransactionImpaye.duree, None),
+])
+
+ADMIN = Projection([
+    ("id", User.id, None),
+    ("photo", User.photo, None),
+    ("nom", User.nom, None),
+    ("email", User.email, None),
+    ("telephone", User.telephone, None),
+    ("niveau", User.niveau, None),
+    ("role", User.role, None),
+    ("etat", User.etat, None),
+    ("solde", User.solde, format_floats),
+])
+
+# The caller's query already joins User on Historique.user_id
+HISTORIQUE = Projection([
+    ("id", Historique.id, None),
+    ("user_id", Historique.user_id, None),
+    ("user_nom", User.nom, None),
+    ("produit", Historique.produit, None),
+    ("duree", Historique.duree, None),
+    ("codes", Historique.codes, None),
+    ("montant", Historique.montant, None),
+    ("note", Historique.note, None),
+    ("date", Historique.date, format_datetimes),
+    ("return_status", select(ReturnRequest.status)
+        .where(ReturnRequest.historique_id == Historique.id)
+        .order_by(ReturnRequest.created_at.desc(), ReturnRequest.id.desc())
+        .limit(1).correlate(Historique).scalar_subquery(), None),
+])
+
+CATEGORY = Projection([
+    ("id", Category.id, None),
+    ("nom", Category.nom, None),
+    ("photo", Category.photo, None),
+    ("photo_variants", Category.photo, media_store.format_variants),
+    ("etat", Category.etat, None),
+])
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Throttling and short-lived result caching for socket events that clients poll.
+
+Guarded handlers return the events they want to send back as a list of
+(event, payload) pairs instead of emitting them. The guard sends them to the
+calling connection and remembers them for a few seconds per (event, key), so a
+client polling in a loop is served from memory or throttled, not from the DB.
+"""
+import functools
+import threading
+import time
+from flask import current_app, request
+from .. import socketio
+
+_lock = threading.Lock()
+_buckets = {}  # sid -> (tokens, last refill)
+_memo = {}     # (event, key) -> (expires at, emissions)
+_stats = {}    # event -> {"served": n, "cached": n, "throttled": n}
+
+# Expired memo entries are purged once the memo grows past this size
+MEMO_PURGE_SIZE = 5000
+
+
+def _count(event, outcome):
+    with _lock:
+        counters = _stats.setdefault(event, {"served": 0, "cached": 0, "throttled": 0})
+        counters[outcome] += 1
+
+
+def _take_token(sid):
+    capacity = current_app.config.get('SOCKET_RATE_CAPACITY', 10)
+    rate = current_app.config.get('SOCKET_RATE_PER_SECOND', 2)
+    now = time.monotonic()
+    with _lock:
+        tokens, last = _buckets.get(sid, (capacity, now))
+        tokens = min(capacity, tokens + (now - last) * rate)
+        if tokens < 1:
+            _buckets[sid] = (tokens, now)
+            return False
+        _buckets[sid] = (tokens - 1, now)
+        return True
+
+
+def _remember(memo_key, emissions, ttl):
+    now = time.monotonic()
+    with _lock:
+        if len(_memo) > MEMO_PURGE_SIZE:
+            for k in [k for k, (expires, _) in _memo.items() if expires <= now]:
+                del _memo[k]
+        _memo[memo_key] = (now + ttl, emissions)
+
+
+def _recall(memo_key):
+    with _lock:
+        entry = _memo.get(memo_key)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+
+def guarded(event, key=None):
+    """
+    Throttle a socket handler per connection and cache what it returns.
+    `key(data)` picks the part of the request the result depends on (usually the user id).
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(data=None):
+            data = data or {}
+            sid = request.sid
+
+            if not _take_token(sid):
+                _count(event, "throttled")
+                socketio.emit('throttled', {'event': event}, room=sid)
+                return
+
+            memo_key = (event, key(data) if key else None)
+            emissions = _recall(memo_key)
+            if emissions is not None:
+                _count(event, "cached")
+            else:
+                emissions = handler(data) or []
+                ttl = current_app.config.get('SOCKET_MEMO_TTL', 2)
+                if ttl > 0:
+                    _remember(memo_key, emissions, ttl)
+                _count(event, "served")
+
+            for name, payload in emissions:
+                socketio.emit(name, payload, room=sid)
+        return wrapper
+    return decorator
+
+
+def invalidate(event, key=None):
+    """Drop cached results of `event`, for one key or for every key when key is None."""
+    with _lock:
+        if key is None:
+            for k in [k for k in _memo if k[0] == event]:
+                del _memo[k]
+        else:
+            _memo.pop((event, key), None)
+
+
+def forget_connection(sid):
+    with _lock:
+        _buckets.pop(sid, None)
+
+
+def stats():
+    with _lock:
+        return {event: dict(counters) for event, counters in _stats.items()}
@@ -1 +1,25 @@
+"""
+Socket.IO state shared by the routes: the connection of each user, and the
+number of events this process emitted, per event name.
+"""
+import threading
+from flask_socketio import SocketIO
+
 connected_users = {}
+
+_lock = threading.Lock()
+_emitted = {}  # event -> emissions
+
+
+class MeteredSocketIO(SocketIO):
+    """SocketIO that counts emitted events, including flask_socketio.emit() calls from handlers."""
+
+    def emit(self, event, *args, **kwargs):
+        with _lock:
+            _emitted[event] = _emitted.get(event, 0) + 1
+        return super().emit(event, *args, **kwargs)
+
+
+def emitted():
+    with _lock:
+        return dict(_emitted)
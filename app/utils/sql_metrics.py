@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+SQL statements per request: count, database time and repeated statements.
+
+Every statement executed on any engine (primary and replica) while a request
+is handled is counted against that request, together with its cursor time
+and its fingerprint: the SQL text with literals and expanded IN lists
+collapsed, so the same query run for different ids is counted as one
+statement. Then:
+
+- the response carries a Server-Timing header (visible in the browser dev
+  tools), unless SQL_SERVER_TIMING is off:
+
+      Server-Timing: db;dur=12.4;desc="7 queries", app;dur=31.0
+
+- a fingerprint run more than SQL_REPEAT_WARN times in one request is logged
+  as a warning: it is almost always a query issued per row (N+1) that should
+  be a join, a selectinload or an IN query;
+- stats() returns, per endpoint, the requests served, queries and database
+  time in total and at worst, and the most repeated statement seen.
+
+Streamed responses (exports) run most of their queries after the headers are
+sent: their Server-Timing only covers the queries made before, while the
+warning and stats() cover the whole stream. Socket.IO handlers are not
+requests and are not counted.
+"""
+import functools
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_IN_LIST = re.compile(r"\(\s*(?:%s|\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:%s|\?|%\(\w+\)s|:\w+))+\s*\)")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r"\s+")
+_COLUMNS = re.compile(r"^SELECT .*? FROM ", re.IGNORECASE)
+
+_lock = threading.Lock()
+_stats = {}  # endpoint -> counters
+
+
+@functools.lru_cache(maxsize=2048)
+def fingerprint(statement):
+    """The statement with whitespace, literals and IN lists normalized."""
+    text = _SPACES.sub(' ', statement).strip()
+    text = _STRING.sub('?', text)
+    text = _NUMBER.sub('?', text)
+    return _IN_LIST.sub('(...)', text)
+
+
+def _short(statement):
+    """A fingerprint without its SELECT column list, for logs."""
+    return _COLUMNS.sub('SELECT ... FROM ', statement, count=1)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._sql_metrics_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context():
+        return
+    started = getattr(context, '_sql_metrics_started', None)
+    elapsed = time.perf_counter() - started if started is not None else 0.0
+    current = g.get('sql_metrics')
+    if current is None:
+        current = g.sql_metrics = {"queries": 0, "seconds": 0.0, "fingerprints": Counter()}
+    current["queries"] += 1
+    current["seconds"] += elapsed
+    current["fingerprints"][fingerprint(statement)] += 1
+
+
+def _before_request():
+    g.sql_metrics_started = time.perf_counter()
+
+
+def _after_request(response):
+    if not current_app.config['SQL_SERVER_TIMING']:
+        return response
+    current = g.get('sql_metrics') or {"queries": 0, "seconds": 0.0}
+    timings = [f'db;dur={current["seconds"] * 1000:.1f};desc="{current["queries"]} queries"']
+    started = g.get('sql_metrics_started')
+    if started is not None:
+        timings.append(f"app;dur={(time.perf_counter() - started) * 1000:.1f}")
+    response.headers.add('Server-Timing', ', '.join(timings))
+    return response
+
+
+def _teardown_request(exc):
+    current = g.pop('sql_metrics', None)
+    endpoint = request.endpoint or 'unmatched'
+    queries = current["queries"] if current else 0
+    seconds = current["seconds"] if current else 0.0
+    statement, repeats = (current["fingerprints"].most_common(1)[0]
+                          if current and current["fingerprints"] else (None, 0))
+    if repeats < 2:
+        statement, repeats = None, 0
+
+    threshold = current_app.config['SQL_REPEAT_WARN']
+    if repeats > threshold:
+        logger.warning("%s %s ran the same statement %d times (%d queries, likely N+1): %.300s",
+                       request.method, request.path, repeats, queries, _short(statement))
+
+    with _lock:
+        counters = _stats.get(endpoint)
+        if counters is None:
+            counters = _stats[endpoint] = {
+                "requests": 0,
+                "queries": 0,
+                "queries_max": 0,
+                "db_seconds": 0.0,
+                "db_seconds_max": 0.0,
+                "repeat_warnings": 0,
+                "repeat_max": 0,
+                "repeat_statement": None,
+            }
+        counters["requests"] += 1
+        counters["queries"] += queries
+        counters["queries_max"] = max(counters["queries_max"], queries)
+        counters["db_seconds"] += seconds
+        counters["db_seconds_max"] = max(counters["db_seconds_max"], seconds)
+        if repeats > threshold:
+            counters["repeat_warnings"] += 1
+        if repeats > counters["repeat_max"]:
+            counters["repeat_max"] = repeats
+            counters["repeat_statement"] = _short(statement)
+
+
+def stats():
+    with _lock:
+        return {endpoint: dict(counters) for endpoint, counters in _stats.items()}
+
+
+def init_sql_metrics(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
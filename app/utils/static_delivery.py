@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+How files under app/static are delivered (STATIC_DELIVERY):
+
+- direct:      Flask streams the file itself, with conditional and byte-range
+               responses (206) so videos can seek.
+- x-sendfile:  Flask answers with an empty body and an X-Sendfile header holding
+               the absolute path; Apache (mod_xsendfile) or lighttpd sends the file.
+- x-accel:     Flask answers with an empty body and an X-Accel-Redirect header
+               holding STATIC_ACCEL_PREFIX + the file path; nginx sends the file
+               from an internal location, e.g.
+
+                   location /_static/ {
+                       internal;
+                       alias /srv/2ncodes/app/static/;
+                   }
+
+In every mode Flask still resolves and authorizes the request (no path
+traversal, no temporary or hidden files, 404 for missing files) and sets the
+caching headers, so a worker is only held for a stat() instead of the whole
+transfer. Ranges and conditional requests are then handled by the front server.
+"""
+import mimetypes
+import os
+from urllib.parse import quote
+from flask import abort, current_app, send_from_directory
+from werkzeug.security import safe_join
+
+MODES = ('direct', 'x-sendfile', 'x-accel')
+
+
+def authorize(filename):
+    """Absolute path of a servable static file, or abort(404)."""
+    path = safe_join(current_app.static_folder, filename)
+    if path is None or any(part.startswith('.') for part in filename.split('/')):
+        abort(404)
+    if not os.path.isfile(path):
+        abort(404)
+    return path
+
+
+def _accel_response(filename):
+    app = current_app
+    response = app.response_class()
+    response.headers['X-Accel-Redirect'] = app.config['STATIC_ACCEL_PREFIX'] + quote(filename)
+    response.mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    # nginx adds Content-Length, ETag, Last-Modified and handles Range itself
+    response.headers.pop('Content-Length', None)
+    max_age = app.get_send_file_max_age(filename)
+    if max_age is not None:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    return response
+
+
+def send_static_file(filename):
+    mode = current_app.config['STATIC_DELIVERY']
+    authorize(filename)
+    if mode == 'x-accel':
+        return _accel_response(filename)
+    # Werkzeug emits X-Sendfile itself when USE_X_SENDFILE is set; the front server
+    # then answers conditional and range requests
+    return send_from_directory(
+        current_app.static_folder, filename,
+        max_age=current_app.get_send_file_max_age(filename),
+        conditional=mode == 'direct'
+    )
+
+
+def init_static_delivery(app):
+    mode = app.config['STATIC_DELIVERY']
+    if mode not in MODES:
+        raise ValueError(f"STATIC_DELIVERY must be one of {', '.join(MODES)}, got {mode!r}")
+    app.config['USE_X_SENDFILE'] = mode == 'x-sendfile'
+    app.view_functions['static'] = send_static_file
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Per-table change counters, stored in table_versions.
+
+Tables are registered with watch(). Every commit that adds, updates or
+deletes rows of a watched table (ORM flushes, query.update() / query.delete()
+and Core statements run through the session) increments its counter once,
+right after the commit and on a separate connection, so the hot row is never
+locked for the length of a business transaction. A reader that sees the old
+counter with the new data only costs its client one extra download.
+
+    versions(['categories', 'sous_categories'])  -> {'categories': 12, 'sous_categories': 3}
+"""
+import logging
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.orm import Session
+from .. import db
+from ..models.table_version import TableVersion
+
+logger = logging.getLogger(__name__)
+
+_watched = set()
+
+
+def watch(*tables):
+    _watched.update(tables)
+
+
+def versions(tables):
+    """Current counter of each table; 0 for a table never written since the migration."""
+    rows = db.session.query(TableVersion.table_name, TableVersion.version).filter(
+        TableVersion.table_name.in_(list(tables))
+    ).all()
+    current = dict(rows)
+    return {table: current.get(table, 0) for table in tables}
+
+
+def bump(tables):
+    now = datetime.utcnow()
+    stmt = insert(TableVersion).values([
+        {"table_name": table, "version": 1, "updated_at": now} for table in sorted(tables)
+    ])
+    stmt = stmt.on_duplicate_key_update(version=TableVersion.version + 1, updated_at=stmt.inserted.updated_at)
+    with db.engine.begin() as connection:
+        connection.execute(stmt)
+
+
+# ---- collecting writes to watched tables ----
+
+def _pending(session):
+    return session.info.setdefault('table_versions_pending', set())
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table in _watched:
+            _pending(session).add(table)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_changes(orm_execute_state):
+    if orm_execute_state.is_select:
+        return
+    table = getattr(getattr(orm_execute_state.statement, 'table', None), 'name', None)
+    if table in _watched:
+        _pending(orm_execute_state.session).add(table)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    tables = session.info.pop('table_versions_pending', None)
+    if not tables:
+        return
+    try:
+        bump(tables)
+    except Exception:
+        # The data is committed; clients will pick it up with the next bump of these tables
+        logger.exception("Could not bump table versions for %s", sorted(tables))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('table_versions_pending', None)
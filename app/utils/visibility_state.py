@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Per-user visibility versions and a short change log.
+
+Every change to a user's visible items gets a new version. Clients keep the
+last version they applied and send it back when they (re)connect: if the log
+still holds every change since that version they get a delta, otherwise a
+full snapshot.
+"""
+import threading
+import uuid
+from collections import deque
+
+# How many changes are remembered per user before a client falls back to a full snapshot.
+MAX_CHANGES_PER_USER = 50
+
+# Versions are only meaningful inside the process that issued them.
+_EPOCH = uuid.uuid4().hex[:8]
+
+_lock = threading.Lock()
+_counter = 0
+_versions = {}
+_changes = {}
+
+
+def _next_version():
+    global _counter
+    _counter += 1
+    return f"{_EPOCH}.{_counter}"
+
+
+def current_version(user_id):
+    user_id = int(user_id)
+    with _lock:
+        if user_id not in _versions:
+            _versions[user_id] = _next_version()
+        return _versions[user_id]
+
+
+def record_change(user_id, added, removed):
+    """
+    Store a change of (item_type, item_id) pairs and return (base_version, version).
+    """
+    user_id = int(user_id)
+    with _lock:
+        base = _versions.get(user_id) or _next_version()
+        version = _next_version()
+        _versions[user_id] = version
+        log = _changes.setdefault(user_id, deque(maxlen=MAX_CHANGES_PER_USER))
+        log.append((base, version, frozenset(added), frozenset(removed)))
+        return base, version
+
+
+def changes_since(user_id, version):
+    """
+    Fold every change made after `version` into one (added, removed) pair.
+    Returns None when the log no longer reaches back to `version`.
+    """
+    user_id = int(user_id)
+    with _lock:
+        current = _versions.get(user_id)
+        if current is None or not version:
+            return None
+        if version == current:
+            return set(), set()
+
+        entries = list(_changes.get(user_id, ()))
+        start = next((i for i, entry in enumerate(entries) if entry[0] == version), None)
+        if start is None:
+            return None
+
+        added, removed = set(), set()
+        for _, _, entry_added, entry_removed in entries[start:]:
+            for key in entry_added:
+                if key in removed:
+                    removed.discard(key)
+                else:
+                    added.add(key)
+            for key in entry_removed:
+                if key in added:
+                    added.discard(key)
+                else:
+                    removed.add(key)
+        return added, removed
+
+
+def reset(user_id=None):
+    """
+    Forget the change log (for one user or everyone) so the next request gets a
+    full snapshot. Used when the catalog itself changes.
+    """
+    with _lock:
+        if user_id is None:
+            _versions.clear()
+            _changes.clear()
+        else:
+            _versions.pop(int(user_id), None)
+            _changes.pop(int(user_id), None)
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers shared by the benchmark scripts: building the app against a scratch
+database, seeding it, and running it as a separate server process.
+
+Run the server on its own with:
+
+    python -m benchmarks.common --database-url mysql+pymysql://root:pw@localhost/2ncodes_bench --port 5055
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+from werkzeug.security import generate_password_hash
+
+BENCH_PASSWORD = 'bench'
+BENCH_DUREE = '1 mois'
+
+
+def make_app(database_url=None):
+    """Create the app, optionally pointing it at another database."""
+    if database_url:
+        from app.config.config import Config
+        Config.SQLALCHEMY_DATABASE_URI = database_url
+    from app import create_app
+    return create_app()
+
+
+def seed(n_admins=10, n_revendeurs=1000, n_codes=1000, n_demandes=100):
+    """
+    Drop and recreate every table, then insert a manager, admins, revendeurs,
+    one product with `n_codes` stock codes and `n_demandes` pending admin demandes.
+    Must run inside an app context. Returns the ids of the created users.
+    """
+    from app import db
+    from app.models.user import User
+    from app.models.category import Category
+    from app.models.sous_category import SousCategory
+    from app.models.product import Produit
+    from app.models.stock import Stock
+    from app.models.duree_avec_stock import DureeAvecStock
+    from app.models.demande_solde import DemandeSolde
+
+    db.drop_all()
+    db.create_all()
+
+    # One hash for everyone: hashing thousands of passwords would dominate seeding
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    now = datetime.utcnow()
+
+    def user_row(i, role, responsable=None):
+        return {
+            "nom": f"{role}{i}",
+            "email": f"{role}{i}@bench.local",
+            "telephone": f"{role[:2]}{i:08d}",
+            "password_hash": password_hash,
+            "niveau": "niveau1",
+            "solde": 1_000_000.0,
+            "etat": "actif",
+            "role": role,
+            "responsable": responsable,
+            "admin_boss_privilege": []
+        }
+
+    db.session.execute(User.__table__.insert(), [user_row(0, 'manager')])
+    db.session.execute(User.__table__.insert(), [user_row(i, 'admin') for i in range(n_admins)])
+    admin_ids = [u.id for u in User.query.filter_by(role='admin').order_by(User.id).all()]
+    db.session.execute(User.__table__.insert(), [
+        user_row(i, 'revendeur', admin_ids[i % len(admin_ids)]) for i in range(n_revendeurs)
+    ])
+
+    category = Category(nom='Bench', etat='actif')
+    db.session.add(category)
+    db.session.flush()
+    sous_category = SousCategory(name='Bench', category_id=category.id, etat='actif')
+    db.session.add(sous_category)
+    db.session.flush()
+    produit = Produit(name='Bench IPTV', category_id=category.id, sous_category_id=sous_category.id, type='code')
+    db.session.add(produit)
+    db.session.flush()
+    db.session.add(DureeAvecStock(
+        produit_id=produit.id, duree=BENCH_DUREE, prix_1=1.0, prix_2=1.0, prix_3=1.0,
+        quantite=n_codes, stock_minimale=0, date_ajout=now
+    ))
+    if n_codes:
+        db.session.execute(Stock.__table__.insert(), [
+            {"fournisseur": "bench", "prix_achat": 0.5, "produit_id": produit.id, "duree": BENCH_DUREE,
+             "code": f"BENCH-{i:08d}", "date_ajout": now}
+            for i in range(n_codes)
+        ])
+    if n_demandes:
+        db.session.execute(DemandeSolde.__table__.insert(), [
+            {"envoyee_par": admin_ids[i % len(admin_ids)], "montant": 10.0, "date_demande": now, "etat": "en cours"}
+            for i in range(n_demandes)
+        ])
+    db.session.commit()
+
+    from app.utils import pending_counters
+    pending_counters.reconcile()
+
+    users = User.query.with_entities(User.id, User.role, User.email).all()
+    return {
+        "produit_id": produit.id,
+        "manager": [u for u in users if u.role == 'manager'][0],
+        "admins": [u for u in users if u.role == 'admin'],
+        "revendeurs": [u for u in users if u.role == 'revendeur'],
+        "demande_ids": [d.id for d in DemandeSolde.query.with_entities(DemandeSolde.id).all()]
+    }
+
+
+def start_server(database_url, port, env=None):
+    """Start the app in a child process and wait until it accepts connections."""
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.common', '--database-url', database_url, '--port', str(port)],
+        env={**os.environ, **(env or {})},
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Server process exited during startup")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Server did not start within 30 seconds")
+
+
+def process_cpu_seconds(pid):
+    """User + system CPU time of a process, read from /proc (Linux only)."""
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    ticks = os.sysconf('SC_CLK_TCK')
+    return (int(fields[11]) + int(fields[12])) / ticks
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the app for benchmarking")
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+
+    app = make_app(args.database_url)
+    from app import socketio
+    socketio.run(app, host='127.0.0.1', port=args.port, debug=False, log_output=False)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Peak memory of a large transaction export: the list endpoint without
+pagination (every row fetched, then serialized) against the streamed CSV
+export (server-side cursor, EXPORT_CHUNK_SIZE rows at a time).
+
+Seeds a scratch database with --rows paid transactions, then for each
+strategy writes the whole export to /dev/null and prints the time and the
+peak of Python allocations (tracemalloc) while it ran:
+- fetch_all:  serializers.TRANSACTION_PAYE.fetch(query), then one csv.writer pass
+- streamed:   exports._csv(keys, TRANSACTION_PAYE.stream(query, --chunk-size))
+
+    python -m benchmarks.exports \\
+        --database-url mysql+pymysql://root:pw@localhost/2ncodes_bench --rows 1000000
+
+The database is dropped and recreated: never point it at real data.
+"""
+import argparse
+import csv
+import io
+import os
+import time
+import tracemalloc
+
+from benchmarks.common import make_app, seed
+from benchmarks.serialization import seed_transactions
+
+SEED_BATCH = 50000
+
+
+def measure(fn):
+    from app import db
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    db.session.expunge_all()
+    return elapsed, peak, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare fetch-all and streamed CSV exports")
+    parser.add_argument('--database-url', required=True, help="Scratch database, it is dropped and reseeded")
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    args = parser.parse_args()
+
+    from app.models.transaction_paye import TransactionPaye
+    from app.utils import exports, serializers
+
+    app = make_app(args.database_url)
+    with app.app_context():
+        seeded = seed(n_admins=20, n_revendeurs=200, n_codes=0, n_demandes=0)
+        users = seeded["admins"] + seeded["revendeurs"]
+        for start in range(0, args.rows, SEED_BATCH):
+            seed_transactions(min(SEED_BATCH, args.rows - start), users)
+
+        projection = serializers.TRANSACTION_PAYE
+
+        def query():
+            return TransactionPaye.query.order_by(TransactionPaye.date_transaction.desc(), TransactionPaye.id.desc())
+
+        def fetch_all():
+            items = projection.fetch(query())
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=projection.keys)
+            writer.writeheader()
+            writer.writerows(items)
+            with open(os.devnull, 'w') as out:
+                return out.write(buffer.getvalue())
+
+        def streamed():
+            size = 0
+            with open(os.devnull, 'wb') as out:
+                for block in exports._csv(projection.keys, projection.stream(query(), args.chunk_size)):
+                    size += out.write(block)
+            return size
+
+        print(f"{args.rows} rows, chunks of {args.chunk_size}")
+        print(f"{'strategy':<12}{'seconds':>10}{'peak MB':>10}{'CSV MB':>10}")
+        for name, fn in (('fetch_all', fetch_all), ('streamed', streamed)):
+            seconds, peak, size = measure(fn)
+            print(f"{name:<12}{seconds:>10.2f}{peak / 1e6:>10.1f}{size / 1e6:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
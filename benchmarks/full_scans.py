@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Full-scan check of the route queries.
+
+Seeds a scratch MySQL database, calls the hot routes as a manager, an admin
+and a revendeur (a purchase and a return request included), records every
+SELECT / UPDATE / DELETE they issue and runs EXPLAIN on it. A query fails when
+MySQL has to read a whole table to apply its WHERE clause: access type ALL
+with no possible key. That verdict does not depend on the table sizes, so the
+check is stable on a small seed and in CI. Tables in SMALL_TABLES (catalog and
+settings tables that stay in the hundreds of rows) may be scanned.
+
+    python -m benchmarks.full_scans \\
+        --database-url mysql+pymysql://root:pw@localhost/2ncodes_bench
+
+Exits with status 1 when a query full-scans. Add the route of every new hot
+query to CHECKS. The database is dropped and recreated: never point it at
+real data.
+"""
+import argparse
+import re
+import sys
+
+from benchmarks.common import BENCH_DUREE, make_app, seed
+
+# role -> (method, url, json body); {name} placeholders come from the seeded rows
+CHECKS = [
+    ('revendeur', 'POST', '/api/historique/acheter', {"produit_id": "{produit_id}", "duree": BENCH_DUREE, "quantite": 1}),
+    ('revendeur', 'POST', '/api/historique/{historique_id}/return', {"reason": "full scan check"}),
+    ('revendeur', 'GET', '/api/historique/get', None),
+    ('revendeur', 'GET', '/api/historique/get_my_history', None),
+    ('revendeur', 'GET', '/api/transactions/revendeur/mine?page=1&per_page=20', None),
+    ('revendeur', 'GET', '/api/demande_solde/my_demandes', None),
+    ('admin', 'GET', '/api/historique/get', None),
+    ('admin', 'GET', '/api/users/get_revendeurs?page=1', None),
+    ('admin', 'GET', '/api/transactions/admin/mine?page=1&per_page=20', None),
+    ('admin', 'GET', '/api/transactions/admin/revendeurs?page=1&per_page=20', None),
+    ('manager', 'GET', '/api/historique/get', None),
+    ('manager', 'GET', '/api/historique/export', None),
+    ('manager', 'GET', '/api/demande_solde/get?page=1', None),
+    ('manager', 'GET', '/api/users/get_admins?page=1&per_page=20', None),
+    ('manager', 'GET', '/api/transactions/manager/all?page=1&per_page=20', None),
+    ('manager', 'GET', '/api/statistics/duree/{duree_id}', None),
+]
+
+SMALL_TABLES = {
+    'categories', 'sous_categories', 'applications', 'boutiques', 'articles', 'produits',
+    'duree_sans_stock', 'gest_prix', 'table_versions', 'pending_counts', 'media_files', 'alembic_version',
+}
+
+STATEMENT = re.compile(r'^\s*(SELECT|UPDATE|DELETE)\b', re.IGNORECASE)
+
+
+def fill(value, context):
+    if isinstance(value, dict):
+        return {k: fill(v, context) for k, v in value.items()}
+    if isinstance(value, str) and value.startswith('{') and value.endswith('}') and value[1:-1] in context:
+        return context[value[1:-1]]
+    return value.format(**context) if isinstance(value, str) else value
+
+
+def full_scans(connection, statement, parameters):
+    """EXPLAIN rows of the statement that read a whole table to filter it."""
+    result = connection.exec_driver_sql("EXPLAIN " + statement, parameters)
+    rows = [dict(zip(result.keys(), row)) for row in result]
+    return [
+        row for row in rows
+        if row.get('type') == 'ALL' and not row.get('possible_keys')
+        and 'Using where' in (row.get('Extra') or '')
+        and re.sub(r'_\d+$', '', row.get('table') or '') not in SMALL_TABLES
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report route queries that need a full table scan")
+    parser.add_argument('--database-url', required=True, help="Scratch MySQL database, it is dropped and reseeded")
+    args = parser.parse_args()
+
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy import event
+    from app import db
+    from app.models.historique import Historique
+    from app.models.duree_avec_stock import DureeAvecStock
+
+    app = make_app(args.database_url)
+    with app.app_context():
+        seeded = seed(n_admins=5, n_revendeurs=50, n_codes=50, n_demandes=20)
+        revendeur = seeded["revendeurs"][0]
+        users = {
+            'manager': seeded["manager"],
+            'admin': seeded["admins"][0],
+            'revendeur': revendeur,
+        }
+        headers = {
+            role: {"Authorization": f"Bearer {create_access_token(identity=str(user.id))}"}
+            for role, user in users.items()
+        }
+        context = {
+            'produit_id': seeded["produit_id"],
+            'duree_id': DureeAvecStock.query.first().id,
+        }
+        db.session.remove()
+
+        statements = {}  # statement -> (route, parameters)
+
+        def record(conn, cursor, statement, parameters, ctx, executemany):
+            if not executemany and STATEMENT.match(statement):
+                statements.setdefault(statement, (current_route, parameters))
+
+        client = app.test_client()
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            for role, method, url, body in CHECKS:
+                if '{historique_id}' in url:
+                    context['historique_id'] = Historique.query.filter_by(user_id=revendeur.id).first().id
+                    db.session.remove()
+                current_route = f"{method} {fill(url, context)} ({role})"
+                resp = client.open(fill(url, context), method=method, headers=headers[role], json=fill(body, context))
+                resp.get_data()  # streamed responses run their queries while being read
+                if resp.status_code >= 400:
+                    raise SystemExit(f"{current_route} returned {resp.status_code}: {resp.get_data(as_text=True)[:200]}")
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+        failures = 0
+        with db.engine.connect() as connection:
+            for statement, (route, parameters) in statements.items():
+                for row in full_scans(connection, statement, parameters):
+                    failures += 1
+                    print(f"FULL SCAN of {row['table']} ({row.get('rows')} rows) in {route}:\n    "
+                          + " ".join(statement.split())[:300])
+        print(f"{len(statements)} distinct statements from {len(CHECKS)} routes, {failures} full scan(s)")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Check that the production setup (wsgi.py: eventlet.monkey_patch() first) lets
+green threads overlap on database I/O and password hashing.
+
+- queries:  --concurrency green threads each run SELECT SLEEP(--sleep) through
+            the app's session. With PyMySQL on patched sockets they overlap and
+            the batch takes about --sleep seconds; if they serialize it takes
+            --concurrency times longer.
+- hashing:  a green thread ticking every 10 ms runs while --hashes passwords are
+            hashed through User.set_password (green.offload -> tpool). Few
+            ticks means the hashes froze the event loop.
+
+Exits with status 1 when the queries serialize.
+
+    python -m benchmarks.green_io \\
+        --database-url mysql+pymysql://root:pw@localhost/2ncodes_bench --concurrency 20
+"""
+import eventlet
+eventlet.monkey_patch()
+
+import argparse  # noqa: E402
+import sys  # noqa: E402
+import time  # noqa: E402
+
+from benchmarks.common import make_app  # noqa: E402
+
+TICK = 0.01
+
+
+def run_queries(app, concurrency, sleep):
+    from sqlalchemy import text
+    from app import db
+
+    def slow_query():
+        with app.app_context():
+            db.session.execute(text("SELECT SLEEP(:s)"), {"s": sleep})
+            db.session.remove()
+
+    pool = eventlet.GreenPool(concurrency)
+    started = time.perf_counter()
+    for _ in range(concurrency):
+        pool.spawn(slow_query)
+    pool.waitall()
+    return time.perf_counter() - started
+
+
+def run_hashes(count):
+    from app.models.user import User
+
+    ticks = []
+    done = []
+
+    def ticker():
+        while not done:
+            ticks.append(time.perf_counter())
+            eventlet.sleep(TICK)
+
+    thread = eventlet.spawn(ticker)
+    started = time.perf_counter()
+    user = User()
+    for _ in range(count):
+        user.set_password('bench-password')
+    elapsed = time.perf_counter() - started
+    done.append(True)
+    thread.wait()
+    return elapsed, len(ticks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that DB I/O and hashing do not block green threads")
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--sleep', type=float, default=1.0)
+    parser.add_argument('--hashes', type=int, default=20)
+    args = parser.parse_args()
+
+    app = make_app(args.database_url)
+    pool_capacity = app.config['SQLALCHEMY_ENGINE_OPTIONS'].get('pool_size', 0) + \
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'].get('max_overflow', 0)
+    if pool_capacity < args.concurrency:
+        print(f"note: the pool holds {pool_capacity} connections, "
+              f"raise DB_WEB_POOL_SIZE / DB_WEB_MAX_OVERFLOW to test {args.concurrency} at once")
+
+    elapsed = run_queries(app, args.concurrency, args.sleep)
+    serial = args.concurrency * args.sleep
+    overlapped = elapsed < serial / 2
+    print(f"{args.concurrency} x SLEEP({args.sleep}): {elapsed:.2f}s "
+          f"({'overlapped' if overlapped else 'SERIALIZED'}, serial would be {serial:.0f}s)")
+
+    with app.app_context():
+        elapsed, ticks = run_hashes(args.hashes)
+    expected = elapsed / TICK
+    print(f"{args.hashes} password hashes: {elapsed:.2f}s, ticker ran {ticks} times "
+          f"out of ~{expected:.0f} ({100 * ticks / max(expected, 1):.0f}%)")
+
+    sys.exit(0 if overlapped else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput of the hot list endpoints with debug logging vs production logging.
+
+Seeds a scratch database, then runs the same requests through the Flask test
+client in two child processes:
+- debug:      LOG_LEVEL=DEBUG, every debug record kept, Socket.IO loggers on
+- production: default settings (INFO, sampled debug, Socket.IO loggers off)
+
+    python -m benchmarks.logging_overhead \\
+        --database-url mysql+pymysql://root:pw@localhost/2ncodes_bench --requests 2000
+
+Log output of the children goes to /dev/null so the terminal is not the bottleneck.
+The database is dropped and recreated: never point it at real data.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.common import make_app, seed
+
+MODES = {
+    'debug': {
+        'LOG_LEVEL': 'DEBUG',
+        'LOG_DEBUG_SAMPLE_EVERY': '1',
+        'SOCKETIO_LOGGER': 'true',
+        'ENGINEIO_LOGGER': 'true',
+    },
+    'production': {},
+}
+
+ENDPOINTS = [
+    '/api/product/get_products?per_page=50',
+    '/api/stock/get_stocks?per_page=50',
+    '/api/transactions/manager/all?page=1&per_page=50',
+]
+
+
+def worker(args):
+    """Run inside a child process: time `args.requests` requests and print the result as JSON."""
+    from flask_jwt_extended import create_access_token
+    from app.models.user import User
+
+    app = make_app(args.database_url)
+    with app.app_context():
+        manager = User.query.filter_by(role='manager').first()
+        token = create_access_token(identity=str(manager.id))
+    headers = {"Authorization": f"Bearer {token}"}
+
+    client = app.test_client()
+    for url in ENDPOINTS:  # warm up
+        client.get(url, headers=headers)
+
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    for i in range(args.requests):
+        resp = client.get(ENDPOINTS[i % len(ENDPOINTS)], headers=headers)
+        if resp.status_code >= 400:
+            raise SystemExit(f"{ENDPOINTS[i % len(ENDPOINTS)]} returned {resp.status_code}")
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        "requests_per_second": args.requests / elapsed,
+        "cpu_ms_per_request": 1000 * (time.process_time() - cpu_started) / args.requests,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare debug and production logging throughput")
+    parser.add_argument('--database-url', required=True, help="Scratch database, it is dropped and reseeded")
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+
+    app = make_app(args.database_url)
+    with app.app_context():
+        seed(n_admins=10, n_revendeurs=200, n_codes=500, n_demandes=0)
+
+    results = {}
+    for mode, env in MODES.items():
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.logging_overhead', '--worker',
+             '--database-url', args.database_url, '--requests', str(args.requests)],
+            env={**os.environ, **env},
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        ).stdout
+        results[mode] = json.loads(output.decode().strip().splitlines()[-1])
+
+    print(f"{'mode':<12}{'req/s':>10}{'cpu ms/req':>12}")
+    for mode, result in results.items():
+        print(f"{mode:<12}{result['requests_per_second']:>10.0f}{result['cpu_ms_per_request']:>12.2f}")
+    speedup = results['production']['requests_per_second'] / results['debug']['requests_per_second']
+    print(f"\nproduction logging is {speedup:.2f}x the throughput of debug logging")
+
+
+if __name__ == '__main__':
+    main()
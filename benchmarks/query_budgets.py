@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Query budgets of the list endpoints.
+
+Seeds a scratch database, then calls each list endpoint with a small and a
+large page and counts the SQL statements. An endpoint fails when it goes over
+its budget or when the large page needs more queries than the small one
+(a lazy load per row).
+
+    python -m benchmarks.query_budgets \\
+        --database-url mysql+pymysql://root:pw@localhost/2ncodes_bench
+
+The database is dropped and recreated: never point it at real data.
+"""
+import argparse
+import sys
+
+from benchmarks.common import make_app, seed
+
+# endpoint -> maximum statements per request (authentication lookups included)
+BUDGETS = {
+    '/api/product/get_products?per_page={n}': 3,
+    '/api/stock/get_stocks?per_page={n}': 3,
+    '/api/duree_avec_stock/get_all?per_page={n}': 3,
+    '/api/demande_solde/get?page=1': 3,
+    '/api/historique/get?per_page={n}': 4,
+    '/api/users/get_revendeurs?page=1': 3,
+    '/api/users/get_admins?page=1&per_page={n}': 3,
+    '/api/transactions/manager/all?page=1&per_page={n}': 14,
+}
+
+PAGE_SIZES = (5, 100)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the number of queries issued by list endpoints")
+    parser.add_argument('--database-url', required=True, help="Scratch database, it is dropped and reseeded")
+    args = parser.parse_args()
+
+    from flask_jwt_extended import create_access_token
+    from app.utils.query_budget import count_queries
+
+    app = make_app(args.database_url)
+    failures = 0
+    with app.app_context():
+        seeded = seed(n_admins=20, n_revendeurs=300, n_codes=300, n_demandes=100)
+        token = create_access_token(identity=str(seeded["manager"].id))
+        headers = {"Authorization": f"Bearer {token}"}
+        client = app.test_client()
+
+        print(f"{'endpoint':<52}" + "".join(f"{'n=' + str(n):>8}" for n in PAGE_SIZES) + f"{'budget':>8}")
+        for template, budget in BUDGETS.items():
+            counts = []
+            for n in PAGE_SIZES:
+                url = template.format(n=n)
+                with count_queries() as statements:
+                    resp = client.get(url, headers=headers)
+                if resp.status_code >= 400:
+                    raise SystemExit(f"{url} returned {resp.status_code}")
+                counts.append(len(statements))
+            ok = max(counts) <= budget and counts[-1] <= counts[0]
+            failures += not ok
+            print(f"{template:<52}" + "".join(f"{c:>8}" for c in counts) + f"{budget:>8}" + ("" if ok else "  FAIL"))
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
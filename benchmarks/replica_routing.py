@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Check the read-replica routing of app/utils/db_routing.py against two databases.
+
+The primary and the replica each get a users table with the same user and a
+categories table holding one row named after the database, so every answer
+shows where it was read. Then:
+
+- a @read_replica view (GET /api/sous_categories/get_filter_options) reads the replica;
+- the same JWT user reads the primary for REPLICA_READ_YOUR_WRITES_SECONDS
+  (--window) after a write, and the replica again once the window has passed;
+- a write inside a routed request sends its later SELECTs to the primary;
+- without DATABASE_REPLICA_URL the view reads the primary.
+
+Exits with status 1 when a check fails. Without arguments the two databases are
+SQLite files in a temporary folder:
+
+    python -m benchmarks.replica_routing
+    python -m benchmarks.replica_routing \\
+        --database-url mysql+pymysql://root:pw@localhost/2ncodes_bench \\
+        --replica-url mysql+pymysql://root:pw@localhost/2ncodes_bench_replica
+
+The users and categories tables of both databases are dropped and recreated:
+never point them at real data.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.common import BENCH_PASSWORD, make_app
+
+VIEW_URL = '/api/sous_categories/get_filter_options'
+TABLES = ('users', 'categories')
+
+
+def build_app(database_url, replica_url):
+    from app.config.config import Config
+    Config.DATABASE_REPLICA_URL = replica_url
+    return make_app(database_url)
+
+
+def seed(app):
+    """Recreate TABLES on every engine of the app; returns the id of the user."""
+    from werkzeug.security import generate_password_hash
+    from app import db
+    from app.models.category import Category
+    from app.models.user import User
+
+    tables = [db.metadata.tables[name] for name in TABLES]
+    with app.app_context():
+        for bind, engine in db.engines.items():
+            db.metadata.drop_all(engine, tables=tables)
+            db.metadata.create_all(engine, tables=tables)
+            with engine.begin() as connection:
+                connection.execute(User.__table__.insert(), [{
+                    "id": 1, "nom": "routing", "email": "routing@bench.local", "telephone": "00000001",
+                    "password_hash": generate_password_hash(BENCH_PASSWORD), "role": "admin",
+                }])
+                connection.execute(Category.__table__.insert(), [{"nom": bind or 'primary', "etat": "actif"}])
+    return 1
+
+
+def add_check_views(app):
+    """Views that only exist in this check: a plain write, and a routed view that writes between two reads."""
+    from flask import jsonify
+    from flask_jwt_extended import get_jwt_identity, jwt_required
+    from app import db
+    from app.models.category import Category
+    from app.models.user import User
+    from app.utils import db_routing
+
+    @app.route('/_replica_routing/write', methods=['POST'])
+    @jwt_required()
+    def replica_routing_write():
+        user = db.session.get(User, int(get_jwt_identity()))
+        user.solde += 1
+        db.session.commit()
+        return jsonify({"solde": user.solde})
+
+    @app.route('/_replica_routing/read_write_read', methods=['POST'])
+    @db_routing.read_replica
+    def replica_routing_read_write_read():
+        before = Category.query.first().nom
+        db.session.query(User).filter_by(id=1).update({User.solde: User.solde + 1})
+        after = Category.query.first().nom
+        db.session.commit()
+        return jsonify({"before": before, "after": after})
+
+
+def read_from(client, headers=None):
+    resp = client.get(VIEW_URL, headers=headers)
+    if resp.status_code != 200:
+        raise SystemExit(f"{VIEW_URL} returned {resp.status_code}")
+    return resp.get_json()["categories"][0]["nom"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check which database the read-replica routing reads")
+    parser.add_argument('--database-url', help="Primary scratch database (default: a SQLite file)")
+    parser.add_argument('--replica-url', help="Replica scratch database (default: a SQLite file)")
+    parser.add_argument('--window', type=float, default=1.0, help="REPLICA_READ_YOUR_WRITES_SECONDS for the check")
+    args = parser.parse_args()
+
+    folder = None
+    if not args.database_url or not args.replica_url:
+        folder = tempfile.mkdtemp(prefix='replica_routing-')
+        args.database_url = args.database_url or f"sqlite:///{os.path.join(folder, 'primary.db')}"
+        args.replica_url = args.replica_url or f"sqlite:///{os.path.join(folder, 'replica.db')}"
+
+    from flask_jwt_extended import create_access_token
+
+    failures = 0
+
+    def check(name, got, expected):
+        nonlocal failures
+        ok = got == expected
+        failures += not ok
+        print(f"{name:<58}{got!s:>10}{expected!s:>10}" + ("" if ok else "  FAIL"))
+
+    try:
+        app = build_app(args.database_url, args.replica_url)
+        app.config['REPLICA_READ_YOUR_WRITES_SECONDS'] = args.window
+        user_id = seed(app)
+        add_check_views(app)
+        client = app.test_client()
+        with app.app_context():
+            headers = {"Authorization": f"Bearer {create_access_token(identity=str(user_id))}"}
+
+        print(f"{'check':<58}{'read':>10}{'expected':>10}")
+        check("routed view, anonymous", read_from(client), 'replica')
+        check("routed view, user without recent writes", read_from(client, headers), 'replica')
+
+        if client.post('/_replica_routing/write', headers=headers).status_code != 200:
+            raise SystemExit("/_replica_routing/write failed")
+        check("same user right after a write", read_from(client, headers), 'primary')
+        check("another client right after that write", read_from(client), 'replica')
+        time.sleep(args.window + 0.1)
+        check(f"same user {args.window:g}s later (window passed)", read_from(client, headers), 'replica')
+
+        resp = client.post('/_replica_routing/read_write_read').get_json()
+        check("routed request, SELECT before its write", resp["before"], 'replica')
+        check("routed request, SELECT after its write", resp["after"], 'primary')
+
+        app = build_app(args.database_url, None)
+        seed(app)
+        check("routed view without DATABASE_REPLICA_URL", read_from(app.test_client()), 'primary')
+    finally:
+        if folder:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Serialization cost of a large transaction list: ORM entities + to_dict() +
+stdlib json against the column projection + orjson provider.
+
+Seeds a scratch database with --rows paid transactions, then times each
+strategy end to end (query, row -> dict, dict -> JSON bytes) and prints
+rows/sec:
+- to_dict:     joinedload sender/receiver, [t.to_dict() ...], DefaultJSONProvider
+- projection:  serializers.TRANSACTION_PAYE.fetch(query), app.json (orjson when installed)
+
+    python -m benchmarks.serialization \\
+        --database-url mysql+pymysql://root:pw@localhost/2ncodes_bench --rows 20000
+
+The database is dropped and recreated: never point it at real data.
+"""
+import argparse
+import time
+from datetime import datetime
+
+from benchmarks.common import make_app, seed
+
+
+def seed_transactions(rows, users):
+    from app import db
+    from app.models.transaction_paye import TransactionPaye
+
+    now = datetime.utcnow()
+    db.session.execute(TransactionPaye.__table__.insert(), [
+        {"envoyee_par": users[i % len(users)].id, "recue_par": users[(i + 1) % len(users)].id,
+         "montant": 10.0 + i % 100, "preuve": None, "date_transaction": now, "date_paiement": now, "etat": "paye"}
+        for i in range(rows)
+    ])
+    db.session.commit()
+
+
+def best_of(fn, repeat):
+    from app import db
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = fn()
+        timings.append(time.perf_counter() - start)
+        # Entities from the previous run would make later runs identity-map hits
+        db.session.expunge_all()
+    return min(timings), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare to_dict + json with projection + orjson")
+    parser.add_argument('--database-url', required=True, help="Scratch database, it is dropped and reseeded")
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    from flask.json.provider import DefaultJSONProvider
+    from app.models.transaction_paye import TransactionPaye
+    from app.utils import serializers, loading_profiles
+
+    app = make_app(args.database_url)
+    with app.app_context():
+        seeded = seed(n_admins=20, n_revendeurs=200, n_codes=0, n_demandes=0)
+        seed_transactions(args.rows, seeded["admins"] + seeded["revendeurs"])
+        stdlib_json = DefaultJSONProvider(app)
+
+        def query():
+            return TransactionPaye.query.order_by(TransactionPaye.date_transaction.desc(), TransactionPaye.id.desc())
+
+        def with_to_dict():
+            items = query().options(*loading_profiles.load('transaction_paye')).all()
+            return len(stdlib_json.response({"transactions": [t.to_dict() for t in items]}).get_data())
+
+        def with_projection():
+            items = serializers.TRANSACTION_PAYE.fetch(query())
+            return len(app.json.response({"transactions": items}).get_data())
+
+        print(f"JSON provider: {type(app.json).__name__}, {args.rows} rows, best of {args.repeat}")
+        print(f"{'strategy':<14}{'seconds':>10}{'rows/sec':>12}{'bytes':>12}")
+        for name, fn in (('to_dict', with_to_dict), ('projection', with_projection)):
+            seconds, size = best_of(fn, args.repeat)
+            print(f"{name:<14}{seconds:>10.3f}{args.rows / seconds:>12.0f}{size:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Socket.IO fan-out load test.
+
+Seeds a scratch database, starts the app in a child process, connects many
+simulated clients (one per revendeur, plus the admins and the manager) and
+drives purchases, top-ups, message broadcasts and demande approvals one at a
+time. For each action it measures how long the resulting notifications take
+to reach every client, and reports p50/p99 latency, server CPU and frames
+received per second.
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.socket_fanout \\
+        --database-url mysql+pymysql://root:pw@localhost/2ncodes_bench --clients 2000
+
+The database is dropped and recreated: never point it at real data.
+"""
+import argparse
+import asyncio
+import time
+from collections import defaultdict
+
+from benchmarks.common import (
+    BENCH_DUREE, BENCH_PASSWORD, make_app, seed, start_server, process_cpu_seconds, percentile
+)
+
+# Events that count as "the notification arrived" for each action
+EXPECTED_EVENTS = {
+    'update_solde': {'user_updated'},
+    'acheter': {'user_updated'},
+    'message': {'new_message'},
+    'approval': {'updated_demande', 'update_en_cours_count'},
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.current = None  # (action, started at)
+        self.latencies = defaultdict(list)
+        self.frames = 0
+
+    def received(self, event):
+        self.frames += 1
+        if self.current:
+            action, started = self.current
+            if event in EXPECTED_EVENTS[action]:
+                self.latencies[action].append(time.perf_counter() - started)
+
+
+async def connect_clients(base_url, user_ids, recorder, concurrency):
+    import socketio
+
+    clients = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def connect(user_id):
+        client = socketio.AsyncClient(reconnection=False)
+
+        @client.on('*')
+        async def catch_all(event, data=None):
+            recorder.received(event)
+
+        async with semaphore:
+            await client.connect(f"{base_url}?userId={user_id}", transports=['websocket'])
+        clients.append(client)
+
+    await asyncio.gather(*(connect(uid) for uid in user_ids))
+    return clients
+
+
+async def login(http, base_url, email):
+    async with http.post(f"{base_url}/api/users/login", json={"email": email, "password": BENCH_PASSWORD}) as resp:
+        return (await resp.json())["token"]
+
+
+async def run(args):
+    import aiohttp
+
+    app = make_app(args.database_url)
+    with app.app_context():
+        seeded = seed(
+            n_admins=args.admins,
+            n_revendeurs=args.clients,
+            n_codes=args.rounds,
+            n_demandes=args.rounds
+        )
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = start_server(args.database_url, args.port)
+    recorder = Recorder()
+    clients = []
+    try:
+        user_ids = [seeded["manager"].id] + [u.id for u in seeded["admins"]] + [u.id for u in seeded["revendeurs"]]
+        started = time.perf_counter()
+        clients = await connect_clients(base_url, user_ids, recorder, args.connect_concurrency)
+        print(f"Connected {len(clients)} clients in {time.perf_counter() - started:.1f}s")
+
+        async with aiohttp.ClientSession() as http:
+            manager_token = await login(http, base_url, seeded["manager"].email)
+            buyers = seeded["revendeurs"][:args.rounds]
+            buyer_tokens = [await login(http, base_url, u.email) for u in buyers]
+            manager_headers = {"Authorization": f"Bearer {manager_token}"}
+
+            async def update_solde(i):
+                target = seeded["admins"][i % len(seeded["admins"])]
+                return await http.put(f"{base_url}/api/users/update_solde/{target.id}", headers=manager_headers,
+                                      json={"montant": 1, "etat": "paye"})
+
+            async def acheter(i):
+                headers = {"Authorization": f"Bearer {buyer_tokens[i % len(buyer_tokens)]}"}
+                return await http.post(f"{base_url}/api/historique/acheter", headers=headers,
+                                       json={"produit_id": seeded["produit_id"], "quantite": 1, "duree": BENCH_DUREE})
+
+            async def message(i):
+                form = aiohttp.FormData({"text": f"bench message {i}", "to": "all"})
+                return await http.post(f"{base_url}/api/gest_message/add", headers=manager_headers, data=form)
+
+            async def approval(i):
+                demande_id = seeded["demande_ids"][i]
+                return await http.put(f"{base_url}/api/demande_solde/update/{demande_id}", headers=manager_headers,
+                                      json={"etat": "confirmé"})
+
+            actions = {'update_solde': update_solde, 'acheter': acheter, 'message': message, 'approval': approval}
+
+            recorder.frames = 0
+            cpu_before = process_cpu_seconds(server.pid)
+            phase_started = time.perf_counter()
+            for i in range(args.rounds):
+                for name, action in actions.items():
+                    recorder.current = (name, time.perf_counter())
+                    resp = await action(i)
+                    if resp.status >= 400:
+                        print(f"{name} #{i} failed with HTTP {resp.status}: {await resp.text()}")
+                    resp.release()
+                    await asyncio.sleep(args.settle)
+                    recorder.current = None
+            elapsed = time.perf_counter() - phase_started
+            cpu_used = process_cpu_seconds(server.pid) - cpu_before
+    finally:
+        await asyncio.gather(*(c.disconnect() for c in clients), return_exceptions=True)
+        server.terminate()
+        server.wait()
+
+    print(f"\n{'action':<14}{'deliveries':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for name in EXPECTED_EVENTS:
+        values = recorder.latencies.get(name, [])
+        p50, p99 = percentile(values, 50), percentile(values, 99)
+        print(f"{name:<14}{len(values):>12}"
+              f"{(p50 or 0) * 1000:>10.1f}{(p99 or 0) * 1000:>10.1f}")
+    print(f"\nserver CPU: {cpu_used:.2f}s over {elapsed:.1f}s ({100 * cpu_used / elapsed:.0f}% of one core)")
+    print(f"frames received: {recorder.frames} ({recorder.frames / elapsed:.0f}/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure Socket.IO notification fan-out")
+    parser.add_argument('--database-url', required=True, help="Scratch database, it is dropped and reseeded")
+    parser.add_argument('--clients', type=int, default=1000, help="Number of connected revendeurs")
+    parser.add_argument('--admins', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=20, help="How many times each action is performed")
+    parser.add_argument('--settle', type=float, default=1.0, help="Seconds to wait for notifications after each action")
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--connect-concurrency', type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Worker time spent on static files: direct serving vs X-Accel-Redirect.
+
+Writes --images files of --image-kb KB under app/static/media/_bench, then for
+each STATIC_DELIVERY mode starts the app in a child process and runs an
+image-heavy storefront load for --duration seconds: --concurrency clients
+downloading images in a loop while one client calls the catalog API. Reports
+image requests/s, bytes the app process had to send, server CPU per 1000 image
+requests and the API latency under that load.
+
+No nginx runs in front of the app, so in x-accel mode the clients receive the
+empty offloaded responses: what is measured is exactly the work left to the
+Flask worker, i.e. how much of it the front server would take over.
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.static_delivery \\
+        --database-url mysql+pymysql://root:pw@localhost/2ncodes_bench --concurrency 100
+
+The database is dropped and recreated: never point it at real data.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import time
+
+from benchmarks.common import make_app, seed, start_server, process_cpu_seconds, percentile
+
+MODES = ('direct', 'x-accel')
+API_URL = '/api/categories/get_category'
+
+
+def write_images(static_folder, count, size_kb):
+    folder = os.path.join(static_folder, 'media', '_bench')
+    os.makedirs(folder, exist_ok=True)
+    for i in range(count):
+        with open(os.path.join(folder, f"{i}.jpg"), 'wb') as f:
+            f.write(os.urandom(size_kb * 1024))
+    return folder, [f"/static/media/_bench/{i}.jpg" for i in range(count)]
+
+
+async def load(base_url, image_urls, args):
+    import aiohttp
+
+    stats = {'images': 0, 'bytes': 0, 'api': []}
+    deadline = time.perf_counter() + args.duration
+
+    async def images(http, offset):
+        i = offset
+        while time.perf_counter() < deadline:
+            async with http.get(base_url + image_urls[i % len(image_urls)]) as resp:
+                stats['bytes'] += len(await resp.read())
+                stats['images'] += 1
+            i += args.concurrency
+
+    async def api(http):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            async with http.get(base_url + API_URL) as resp:
+                await resp.read()
+            stats['api'].append(time.perf_counter() - started)
+            await asyncio.sleep(0.05)
+
+    connector = aiohttp.TCPConnector(limit=args.concurrency + 1)
+    async with aiohttp.ClientSession(connector=connector) as http:
+        await asyncio.gather(api(http), *(images(http, i) for i in range(args.concurrency)))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare direct and offloaded static file delivery")
+    parser.add_argument('--database-url', required=True, help="Scratch database, it is dropped and reseeded")
+    parser.add_argument('--images', type=int, default=200)
+    parser.add_argument('--image-kb', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=15.0)
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+
+    app = make_app(args.database_url)
+    with app.app_context():
+        seed(n_admins=5, n_revendeurs=10, n_codes=10, n_demandes=0)
+    folder, image_urls = write_images(app.static_folder, args.images, args.image_kb)
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    results = {}
+    try:
+        for mode in MODES:
+            server = start_server(args.database_url, args.port, env={'STATIC_DELIVERY': mode})
+            try:
+                cpu_before = process_cpu_seconds(server.pid)
+                started = time.perf_counter()
+                stats = asyncio.run(load(base_url, image_urls, args))
+                elapsed = time.perf_counter() - started
+                results[mode] = (stats, elapsed, process_cpu_seconds(server.pid) - cpu_before)
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    print(f"{'mode':<10}{'images/s':>10}{'app MB/s':>10}{'CPU s/1k':>10}{'API p50 ms':>12}{'API p99 ms':>12}")
+    for mode, (stats, elapsed, cpu) in results.items():
+        print(f"{mode:<10}{stats['images'] / elapsed:>10.0f}"
+              f"{stats['bytes'] / elapsed / 1e6:>10.1f}"
+              f"{1000 * cpu / max(stats['images'], 1):>10.2f}"
+              f"{(percentile(stats['api'], 50) or 0) * 1000:>12.1f}"
+              f"{(percentile(stats['api'], 99) or 0) * 1000:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput of gunicorn sync workers against one eventlet worker, started
+through the production entry point (gunicorn -c gunicorn.conf.py wsgi:app).
+
+Each configuration serves --duration seconds of load from --concurrency
+clients, each looping over a login (password hash, offloaded to tpool under
+eventlet) and --catalog-calls catalog requests (database I/O). Reports
+requests/s and latency percentiles per worker class. Sync workers only serve
+one request each at a time, so past --sync-workers clients requests queue in
+the listen backlog; the eventlet worker overlaps them.
+
+    python -m benchmarks.workers \\
+        --database-url mysql+pymysql://root:pw@localhost/2ncodes_bench --concurrency 200
+
+The database is dropped and recreated: never point it at real data.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import time
+
+from benchmarks.common import BENCH_PASSWORD, make_app, seed, percentile
+
+CATALOG_URL = '/api/product/get_products'
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_gunicorn(database_url, port, worker_class, workers):
+    process = subprocess.Popen(
+        ['gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+        env={
+            **os.environ,
+            'DATABASE_URL': database_url,
+            'GUNICORN_BIND': f"127.0.0.1:{port}",
+            'GUNICORN_WORKER_CLASS': worker_class,
+            'GUNICORN_WORKERS': str(workers),
+            'GUNICORN_ACCESS_LOG': '/dev/null',
+        },
+        cwd=ROOT
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("gunicorn exited during startup")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start within 30 seconds")
+
+
+async def load(base_url, emails, args):
+    import aiohttp
+
+    latencies = {'login': [], 'catalog': []}
+    errors = 0
+    deadline = time.perf_counter() + args.duration
+
+    async def timed(kind, request):
+        nonlocal errors
+        started = time.perf_counter()
+        async with request as resp:
+            await resp.read()
+            if resp.status != 200:
+                errors += 1
+        latencies[kind].append(time.perf_counter() - started)
+
+    async def client(http, i):
+        email = emails[i % len(emails)]
+        while time.perf_counter() < deadline:
+            await timed('login', http.post(base_url + '/api/users/login', json={"email": email, "password": BENCH_PASSWORD}))
+            for _ in range(args.catalog_calls):
+                await timed('catalog', http.get(base_url + CATALOG_URL))
+
+    timeout = aiohttp.ClientTimeout(total=None)
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as http:
+        await asyncio.gather(*(client(http, i) for i in range(args.concurrency)))
+    return latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare gunicorn sync workers with an eventlet worker")
+    parser.add_argument('--database-url', required=True, help="Scratch database, it is dropped and reseeded")
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--catalog-calls', type=int, default=5)
+    parser.add_argument('--sync-workers', type=int, default=(os.cpu_count() or 1) * 2 + 1)
+    parser.add_argument('--port', type=int, default=5056)
+    args = parser.parse_args()
+
+    app = make_app(args.database_url)
+    with app.app_context():
+        seeded = seed(n_admins=20, n_revendeurs=200, n_codes=10, n_demandes=0)
+    emails = [u.email for u in seeded["revendeurs"]]
+
+    configurations = (('sync', args.sync_workers), ('eventlet', 1))
+    results = {}
+    for worker_class, workers in configurations:
+        server = start_gunicorn(args.database_url, args.port, worker_class, workers)
+        try:
+            started = time.perf_counter()
+            latencies, errors = asyncio.run(load(f"http://127.0.0.1:{args.port}", emails, args))
+            results[(worker_class, workers)] = (latencies, errors, time.perf_counter() - started)
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"{args.concurrency} clients, {args.duration:.0f}s, 1 login + {args.catalog_calls} catalog calls per loop")
+    print(f"{'workers':<14}{'req/s':>8}{'errors':>8}{'login p50':>11}{'login p99':>11}{'catalog p50':>13}{'catalog p99':>13}")
+    for (worker_class, workers), (latencies, errors, elapsed) in results.items():
+        total = len(latencies['login']) + len(latencies['catalog'])
+        print(f"{f'{workers} x {worker_class}':<14}{total / elapsed:>8.0f}{errors:>8}"
+              f"{(percentile(latencies['login'], 50) or 0) * 1000:>11.1f}"
+              f"{(percentile(latencies['login'], 99) or 0) * 1000:>11.1f}"
+              f"{(percentile(latencies['catalog'], 50) or 0) * 1000:>13.1f}"
+              f"{(percentile(latencies['catalog'], 99) or 0) * 1000:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
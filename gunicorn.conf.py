@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+gunicorn settings, read from the environment:
+
+    GUNICORN_BIND=0.0.0.0:5000 GUNICORN_WORKERS=1 gunicorn -c gunicorn.conf.py wsgi:app
+
+Socket.IO keeps its connections (and app.utils.socket_state) in the memory of
+one process: run more than one eventlet worker only behind a load balancer
+with sticky sessions and a Socket.IO message queue. One eventlet worker serves
+GUNICORN_WORKER_CONNECTIONS clients at once; size DB_WEB_POOL_SIZE and
+DB_WEB_MAX_OVERFLOW for the queries they run concurrently, not for the
+connection count.
+
+GUNICORN_WORKER_CLASS=sync runs classic one-request-per-process workers, with
+no Socket.IO long-polling or websockets (only used to compare throughput,
+see benchmarks/workers.py).
+"""
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'eventlet')
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
@@ -0,0 +1,48 @@
+"""add normalized produit_key / duree_key to gest_prix with a unique index
+
+Revision ID: 336de9737e49
+Revises: 93c514620665
+Create Date: 2026-10-19 15:40:12.104387
+
+Duplicate snapshots of the same (produit, duree) are merged by keeping the
+most recently updated row.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '336de9737e49'
+down_revision = '93c514620665'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('gest_prix', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('produit_key', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('duree_key', sa.String(length=50), nullable=True))
+
+    op.execute("UPDATE gest_prix SET produit_key = LOWER(TRIM(produit_name)), duree_key = LOWER(TRIM(duree))")
+
+    op.execute("""
+        DELETE older FROM gest_prix older
+        JOIN gest_prix newer
+          ON newer.produit_key = older.produit_key
+         AND newer.duree_key = older.duree_key
+         AND (newer.updated_at > older.updated_at
+              OR (newer.updated_at = older.updated_at AND newer.id > older.id))
+    """)
+
+    with op.batch_alter_table('gest_prix', schema=None) as batch_op:
+        batch_op.alter_column('produit_key', existing_type=sa.String(length=255), nullable=False)
+        batch_op.alter_column('duree_key', existing_type=sa.String(length=50), nullable=False)
+        batch_op.create_unique_constraint('uq_gest_prix_key', ['produit_key', 'duree_key'])
+
+
+def downgrade():
+    with op.batch_alter_table('gest_prix', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_gest_prix_key', type_='unique')
+        batch_op.drop_column('duree_key')
+        batch_op.drop_column('produit_key')
@@ -0,0 +1,51 @@
+"""add denormalized min_prix / max_prix to produits
+
+Revision ID: 5b0e4c7d2a91
+Revises: 336de9737e49
+Create Date: 2026-10-19 16:20:41.538102
+
+Backfilled from duree_avec_stock.prix_1; kept up to date by
+app/utils/produit_prices.py afterwards.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b0e4c7d2a91'
+down_revision = '336de9737e49'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('produits', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('min_prix', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('max_prix', sa.Float(), nullable=True))
+
+    op.execute("""
+        UPDATE produits p
+        JOIN (
+            SELECT produit_id, MIN(prix_1) AS min_prix, MAX(prix_1) AS max_prix
+            FROM duree_avec_stock
+            GROUP BY produit_id
+        ) d ON d.produit_id = p.id
+        SET p.min_prix = d.min_prix, p.max_prix = d.max_prix
+    """)
+
+    with op.batch_alter_table('produits', schema=None) as batch_op:
+        batch_op.create_index('ix_produits_sous_category_min_prix', ['sous_category_id', 'min_prix'], unique=False)
+        batch_op.create_index('ix_produits_sous_category_max_prix', ['sous_category_id', 'max_prix'], unique=False)
+        batch_op.create_index('ix_produits_min_prix', ['min_prix'], unique=False)
+        batch_op.create_index('ix_produits_max_prix', ['max_prix'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('produits', schema=None) as batch_op:
+        batch_op.drop_index('ix_produits_max_prix')
+        batch_op.drop_index('ix_produits_min_prix')
+        batch_op.drop_index('ix_produits_sous_category_max_prix')
+        batch_op.drop_index('ix_produits_sous_category_min_prix')
+        batch_op.drop_column('max_prix')
+        batch_op.drop_column('min_prix')
@@ -0,0 +1,37 @@
+"""add media_files table
+
+Revision ID: 8d2a6f31c9e4
+Revises: c41f8e2b7d63
+Create Date: 2026-10-19 18:02:37.410256
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2a6f31c9e4'
+down_revision = 'c41f8e2b7d63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('media_files',
+    sa.Column('digest', sa.String(length=64), nullable=False),
+    sa.Column('path', sa.String(length=255), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('status', sa.Enum('pending', 'ready', 'failed', name='media_status'), nullable=False),
+    sa.Column('error', sa.String(length=255), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('processed_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('digest')
+    )
+    with op.batch_alter_table('media_files', schema=None) as batch_op:
+        batch_op.create_index('ix_media_files_status', ['status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('media_files', schema=None) as batch_op:
+        batch_op.drop_index('ix_media_files_status')
+    op.drop_table('media_files')
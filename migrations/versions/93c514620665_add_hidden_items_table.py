@@ -0,0 +1,79 @@
+"""add hidden_items table: catalog visible by default with per-user exclusions
+
+Revision ID: 93c514620665
+Revises: e206cb867c6b
+Create Date: 2026-10-19 11:02:17.553090
+
+Existing visibility is converted: for admins and revendeurs, every category,
+sous category, boutique and application without a visible_items row becomes
+a hidden_items row. visible_items is left in place but no longer written.
+The downgrade rebuilds it from hidden_items the same way in reverse.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '93c514620665'
+down_revision = 'e206cb867c6b'
+branch_labels = None
+depends_on = None
+
+ITEM_TABLES = {
+    'category': 'categories',
+    'sous_category': 'sous_categories',
+    'boutique': 'boutiques',
+    'application': 'applications',
+}
+
+
+def upgrade():
+    op.create_table('hidden_items',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('item_type', sa.Enum('product', 'category', 'sous_category', 'boutique', 'article', 'application', name='itemtype'), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'item_type', 'item_id', name='uq_hidden_items_user_item')
+    )
+    with op.batch_alter_table('hidden_items', schema=None) as batch_op:
+        batch_op.create_index('ix_hidden_items_item', ['item_type', 'item_id'], unique=False)
+
+    for item_type, table in ITEM_TABLES.items():
+        op.execute(f"""
+            INSERT INTO hidden_items (user_id, item_type, item_id, created_at)
+            SELECT u.id, '{item_type}', t.id, NOW()
+            FROM users u CROSS JOIN {table} t
+            WHERE u.role IN ('admin', 'revendeur')
+              AND NOT EXISTS (
+                  SELECT 1 FROM visible_items v
+                  WHERE v.user_id = u.id AND v.item_type = '{item_type}' AND v.item_id = t.id
+              )
+        """)
+
+
+def downgrade():
+    for item_type, table in ITEM_TABLES.items():
+        op.execute(f"""
+            DELETE v FROM visible_items v
+            JOIN users u ON u.id = v.user_id
+            WHERE u.role IN ('admin', 'revendeur') AND v.item_type = '{item_type}'
+        """)
+        op.execute(f"""
+            INSERT INTO visible_items (user_id, item_type, item_id, created_at)
+            SELECT u.id, '{item_type}', t.id, NOW()
+            FROM users u CROSS JOIN {table} t
+            WHERE u.role IN ('admin', 'revendeur')
+              AND NOT EXISTS (
+                  SELECT 1 FROM hidden_items h
+                  WHERE h.user_id = u.id AND h.item_type = '{item_type}' AND h.item_id = t.id
+              )
+        """)
+
+    with op.batch_alter_table('hidden_items', schema=None) as batch_op:
+        batch_op.drop_index('ix_hidden_items_item')
+
+    op.drop_table('hidden_items')
@@ -0,0 +1,29 @@
+"""add table_versions table
+
+Revision ID: c41f8e2b7d63
+Revises: 5b0e4c7d2a91
+Create Date: 2026-10-19 17:05:13.772940
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41f8e2b7d63'
+down_revision = '5b0e4c7d2a91'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('table_versions',
+    sa.Column('table_name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+
+
+def downgrade():
+    op.drop_table('table_versions')
@@ -0,0 +1,44 @@
+"""add pending_counts table
+
+Revision ID: e206cb867c6b
+Revises: eafebe726415
+Create Date: 2026-10-19 09:12:41.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e206cb867c6b'
+down_revision = 'eafebe726415'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('pending_counts',
+    sa.Column('scope', sa.String(length=32), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('scope')
+    )
+
+    # Seed the counters from the demandes currently waiting
+    op.execute("""
+        INSERT INTO pending_counts (scope, count, updated_at)
+        SELECT 'managers', COUNT(d.id), NOW()
+        FROM demandes_solde d JOIN users u ON u.id = d.envoyee_par
+        WHERE d.etat = 'en cours' AND u.role = 'admin'
+    """)
+    op.execute("""
+        INSERT INTO pending_counts (scope, count, updated_at)
+        SELECT CONCAT('admin:', u.responsable), COUNT(d.id), NOW()
+        FROM demandes_solde d JOIN users u ON u.id = d.envoyee_par
+        WHERE d.etat = 'en cours' AND u.role = 'revendeur' AND u.responsable IS NOT NULL
+        GROUP BY u.responsable
+    """)
+
+
+def downgrade():
+    op.drop_table('pending_counts')
@@ -0,0 +1,75 @@
+"""add indexes for the hot query predicates
+
+Revision ID: f3a9c17d5b20
+Revises: 8d2a6f31c9e4
+Create Date: 2026-10-19 17:05:12.294811
+
+Each index serves a query of the routes (benchmarks/full_scans.py reports the
+route queries MySQL can only answer with a full scan):
+
+- stock (produit_id, duree): codes picked by POST /api/historique/acheter,
+  stock recounts, /api/statistics/duree/<id>
+- duree_avec_stock (produit_id, duree): purchase and return lookups of the
+  duree row
+- historiques (user_id, date): /api/historique/get and get_my_history for
+  admins and revendeurs, newest first
+- historiques (date): the manager listing and exports, statistics date ranges
+- transaction_paye / transaction_impaye (recue_par, date_transaction) and
+  (envoyee_par, date_transaction): the /transactions/*/mine and per-user
+  listings, newest first, and the reminder scan
+- demandes_solde (envoyee_par, etat, date_demande): pending counters and the
+  weekly confirmed / cancelled summary
+- users (responsable, role): revendeurs and sub-admins of an admin
+- users (role): the managers notified of a purchase, /api/users/get_admins
+- return_requests (historique_id, status, created_at): pending returns joined
+  to the historique listing and the latest return of each row
+
+The leading column of every composite index is a foreign key, so InnoDB may
+drop its own foreign key index once these exist; downgrade() puts a
+single-column index back before dropping them.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a9c17d5b20'
+down_revision = '8d2a6f31c9e4'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('stock', 'ix_stock_produit_duree', ['produit_id', 'duree']),
+    ('duree_avec_stock', 'ix_duree_avec_stock_produit_duree', ['produit_id', 'duree']),
+    ('historiques', 'ix_historiques_user_date', ['user_id', 'date']),
+    ('historiques', 'ix_historiques_date', ['date']),
+    ('transaction_paye', 'ix_transaction_paye_recue_par_date', ['recue_par', 'date_transaction']),
+    ('transaction_paye', 'ix_transaction_paye_envoyee_par_date', ['envoyee_par', 'date_transaction']),
+    ('transaction_impaye', 'ix_transaction_impaye_recue_par_date', ['recue_par', 'date_transaction']),
+    ('transaction_impaye', 'ix_transaction_impaye_envoyee_par_date', ['envoyee_par', 'date_transaction']),
+    ('demandes_solde', 'ix_demandes_solde_envoyee_par_etat_date', ['envoyee_par', 'etat', 'date_demande']),
+    ('users', 'ix_users_responsable_role', ['responsable', 'role']),
+    ('users', 'ix_users_role', ['role']),
+    ('return_requests', 'ix_return_requests_historique_status_created', ['historique_id', 'status', 'created_at']),
+]
+
+
+def upgrade():
+    for table, name, columns in INDEXES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.create_index(name, columns, unique=False)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table, name, columns in reversed(INDEXES):
+        others = [
+            index for index in inspector.get_indexes(table)
+            if index['name'] != name and index['column_names'][:1] == columns[:1]
+        ]
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            if len(columns) > 1 and not others:
+                # Still needed by the foreign key on the leading column
+                batch_op.create_index(f"ix_{table}_{columns[0]}", columns[:1], unique=False)
+            batch_op.drop_index(name)
@@ -1,7 +1,9 @@
 from app import create_app, socketio
+from app.utils import pending_counters
 
 
 app = create_app()  # ✅ Call the factory function
 
 if __name__ == "__main__":
+    pending_counters.start_reconciler(app)
     socketio.run(app, host="0.0.0.0", port=5000, debug=True)
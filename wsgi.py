@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+Production entry point:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+With the eventlet worker (the default), eventlet.monkey_patch() has to run
+before anything imports socket, threading, select or time: a module imported
+earlier (Flask, SQLAlchemy, PyMySQL, ...) would keep the blocking versions,
+and one slow query would stall every green thread of the worker. PyMySQL is
+pure Python, so once socket is patched a query waiting on MySQL yields to the
+other requests. CPU-bound calls go through app.utils.green.offload().
+
+server.py stays the development entry point. Both start the pending counts
+reconciler (app/utils/pending_counters.py) themselves, so `flask` commands
+and scripts that call create_app() do not.
+"""
+import os
+
+if os.getenv('GUNICORN_WORKER_CLASS', 'eventlet') == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+
+from app import create_app  # noqa: E402
+from app.utils import pending_counters  # noqa: E402
+
+app = create_app()
+pending_counters.start_reconciler(app)